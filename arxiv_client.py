@@ -1,57 +1,156 @@
 import arxiv
-from typing import List, Optional
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from matcher import get_matchers
+
+_VERSIONED_ID = re.compile(r"^(?P<base>.+?)v(?P<version>\d+)$")
+
+
+def split_arxiv_id(short_id: str) -> Tuple[str, int]:
+    """
+    Splits a versioned arXiv ID into its base ID and version number,
+    e.g. '2506.01234v2' -> ('2506.01234', 2). An ID without a version counts as v1.
+    """
+    match = _VERSIONED_ID.match(short_id)
+    if not match:
+        return short_id, 1
+    return match.group("base"), int(match.group("version"))
+
 
 class ArxivClient:
     """
     A client to interact with the arXiv API.
     It encapsulates the logic for searching and initial filtering of papers.
     """
-    def __init__(self, config):
+    def __init__(self, config, client: Optional[arxiv.Client] = None):
         """
         Initializes the ArxivClient with a configuration object.
+        An existing arxiv.Client (or a stand-in with the same `results` method) may be passed in.
         """
         self.config = config
-        self._client = arxiv.Client()
+        self._client = client or arxiv.Client(
+            page_size=config.HARVEST_PAGE_SIZE,
+            delay_seconds=config.HARVEST_PAGE_DELAY_SECONDS,
+        )
+        self._keyword_matcher = get_matchers(config).keywords
+        # arxiv.Client enforces its delay between requests without locking, so
+        # concurrent callers sharing this client take turns, one page at a time.
+        self._lock = threading.Lock()
+
+    def _matches_keywords(self, result: arxiv.Result) -> bool:
+        # Filter by keywords from the config (one pass over all keywords per text)
+        return self._keyword_matcher.contains_any(result.title) or \
+               self._keyword_matcher.contains_any(result.summary)
 
-    def search_and_filter_papers(self, date_start_str: str, date_end_str: str, max_results: Optional[int] = 200) -> List[arxiv.Result]:
+    @staticmethod
+    def harvest_position(result: arxiv.Result) -> Tuple[datetime, str]:
         """
-        Searches arXiv for a specific date range and filters by keywords.
+        The (updated, arxiv_id) position of a result in the harvest order, with
+        `updated` as a naive UTC datetime (the way it is stored in the database).
+        """
+        updated = result.updated
+        if updated.tzinfo is not None:
+            updated = updated.astimezone(timezone.utc).replace(tzinfo=None)
+        return updated, result.get_short_id()
+
+    def iter_filtered_pages(self, date_start_str: str, date_end_str: str, max_results: Optional[int] = None,
+                            raise_on_error: bool = False, after: Optional[Tuple[datetime, str]] = None,
+                            on_page: Optional[Callable[[List[arxiv.Result]], None]] = None) -> Iterator[List[arxiv.Result]]:
+        """
+        Pages through every CS paper updated in a date range and yields the
+        keyword-matching papers of each page as soon as that page arrives, so
+        downstream work can start while later pages are still being fetched.
+
+        Pages hold Config.HARVEST_PAGE_SIZE results, and the arxiv.Client waits
+        Config.HARVEST_PAGE_DELAY_SECONDS between requests.
 
         Args:
             date_start_str (str): The start date for the query in 'YYYYMMDDHHMMSS' format.
             date_end_str (str): The end date for the query in 'YYYYMMDDHHMMSS' format.
-            max_results (int, optional): The maximum number of results to fetch from arXiv. Defaults to 200.
+            max_results (int, optional): Stop after this many results. Defaults to
+                Config.HARVEST_MAX_RESULTS (None means no cap).
+            raise_on_error (bool): Re-raise query errors instead of ending the harvest early,
+                so callers that track progress (e.g. backfills) don't record a failed query as done.
+            after (tuple, optional): An (updated, arxiv_id) high-water mark. Results at or
+                before it were handled by an earlier run and are skipped.
+            on_page (callable, optional): Called with every fetched page (after the `after`
+                filter, before keyword filtering), e.g. to track the newest result seen.
 
-        Returns:
-            List[arxiv.Result]: A list of paper objects that match the criteria.
+        Yields:
+            List[arxiv.Result]: The keyword-matching papers of one page (possibly empty).
         """
+        if max_results is None:
+            max_results = self.config.HARVEST_MAX_RESULTS
+        page_size = self.config.HARVEST_PAGE_SIZE
         print(f"\n--- Searching arXiv for date range: {date_start_str} to {date_end_str} ---")
-        
+
         # Construct the query string dynamically based on the provided date range.
         query_string = f"cat:cs.* AND lastUpdatedDate:[{date_start_str} TO {date_end_str}]"
-        
-        search = arxiv.Search(
-            query=query_string,
-            max_results=max_results,
-            sort_by=arxiv.SortCriterion.LastUpdatedDate,
-            sort_order=arxiv.SortOrder.Descending
-        )
-        
-        filtered_papers = []
+
+        pages_fetched = fetched = matched = skipped = 0
+        truncated = False
         try:
-            results_generator = self._client.results(search)
-            for result in results_generator:
-                title_lower = result.title.lower()
-                summary_lower = result.summary.lower()
-                
-                # Filter by keywords from the config
-                if any(keyword in title_lower for keyword in self.config.KEYWORDS_LOWER) or \
-                   any(keyword in summary_lower for keyword in self.config.KEYWORDS_LOWER):
-                    filtered_papers.append(result)
-            
-            print(f"Found {len(filtered_papers)} CS papers matching keywords for the given date range.")
-            return filtered_papers
-            
+            while True:
+                this_page_size = page_size if max_results is None else min(page_size, max_results - fetched)
+                # max_results counts from the start of the result set, offset skips what we already have.
+                search = arxiv.Search(
+                    query=query_string,
+                    max_results=fetched + this_page_size,
+                    sort_by=arxiv.SortCriterion.LastUpdatedDate,
+                    sort_order=arxiv.SortOrder.Descending
+                )
+                with self._lock:
+                    page = list(self._client.results(search, offset=fetched))
+                pages_fetched += 1
+                fetched += len(page)
+
+                fresh = page if after is None else [r for r in page if self.harvest_position(r) > after]
+                skipped += len(page) - len(fresh)
+                if on_page is not None:
+                    on_page(fresh)
+                page_matches = [result for result in fresh if self._matches_keywords(result)]
+                matched += len(page_matches)
+                yield page_matches
+
+                if len(page) < this_page_size:
+                    break  # A short page is the last page.
+                if max_results is not None and fetched >= max_results:
+                    # A full page at the cap means there are (probably) more results we did not fetch.
+                    truncated = True
+                    break
+
         except Exception as e:
             print(f"Error: An error occurred during arXiv query: {e}")
-            return []
\ No newline at end of file
+            if raise_on_error:
+                raise
+
+        print(f"Fetched {fetched} CS papers in {pages_fetched} pages; {matched} match the keywords.")
+        if skipped:
+            print(f"Skipped {skipped} papers at or before the high-water mark.")
+        if truncated:
+            print(f"[Warning] Stopped at HARVEST_MAX_RESULTS={max_results}: results beyond it were truncated.")
+
+    def search_and_filter_papers(self, date_start_str: str, date_end_str: str, max_results: Optional[int] = None,
+                                 raise_on_error: bool = False) -> List[arxiv.Result]:
+        """
+        Searches arXiv for a specific date range and filters by keywords.
+        Collects every page of iter_filtered_pages() into one list.
+
+        Args:
+            date_start_str (str): The start date for the query in 'YYYYMMDDHHMMSS' format.
+            date_end_str (str): The end date for the query in 'YYYYMMDDHHMMSS' format.
+            max_results (int, optional): The maximum number of results to fetch from arXiv.
+                Defaults to Config.HARVEST_MAX_RESULTS (None means no cap).
+            raise_on_error (bool): Re-raise query errors instead of returning what was found so far.
+
+        Returns:
+            List[arxiv.Result]: A list of paper objects that match the criteria.
+        """
+        filtered_papers = []
+        for page in self.iter_filtered_pages(date_start_str, date_end_str, max_results, raise_on_error):
+            filtered_papers.extend(page)
+        print(f"Found {len(filtered_papers)} CS papers matching keywords for the given date range.")
+        return filtered_papers
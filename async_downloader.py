@@ -0,0 +1,276 @@
+import asyncio
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Union
+
+import httpx
+
+import metrics
+from rate_limit import AsyncTokenBucket
+
+
+@dataclass
+class DownloadedPdf:
+    """
+    A downloaded PDF, held either in memory (`data`) or on disk (`path`).
+    A PDF served from the local PDF store has keep=True: its file belongs
+    to the store and is never deleted by cleanup(), which instead releases it
+    so the store may evict it again.
+    """
+    filename: str
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+    keep: bool = False
+    content_sha256: Optional[str] = None
+    store: Optional["PdfStore"] = None
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        """The bytes if the PDF is in memory, otherwise its file path."""
+        return self.data if self.data is not None else self.path
+
+    def sha256(self) -> str:
+        """The hex SHA-256 of the PDF content."""
+        if self.content_sha256:
+            return self.content_sha256
+        digest = hashlib.sha256()
+        if self.data is not None:
+            digest.update(self.data)
+        else:
+            with open(self.path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        self.content_sha256 = digest.hexdigest()
+        return self.content_sha256
+
+    def cleanup(self):
+        """Deletes the on-disk copy, if there is one (and it is not in the PDF store)."""
+        if self.path and not self.keep:
+            _remove_quietly(self.path)
+        if self.store is not None:
+            self.store.release(self.content_sha256)
+            self.store = None
+
+
+class AsyncPdfDownloader:
+    """
+    An asyncio-based PDF downloader for arXiv papers.
+
+    All downloads share one pooled HTTP client with keep-alive, so consecutive
+    requests reuse the same connection. Requests are paced by a token bucket
+    (Config.DOWNLOAD_RATE_PER_SECOND / DOWNLOAD_BURST) instead of a fixed sleep,
+    and the PDF bytes are streamed in chunks, either into memory or to disk.
+
+    With a PdfStore, stored versions are served from local disk without any
+    request, and every downloaded PDF is added to the store.
+    """
+    def __init__(self, config, client: Optional[httpx.AsyncClient] = None, store=None):
+        """
+        Initializes the downloader. An existing httpx.AsyncClient may be passed in;
+        otherwise one is created lazily on first use. `store` is an optional pdf_store.PdfStore.
+        """
+        self.config = config
+        self.min_pdf_size_kb = self.config.MIN_PDF_SIZE_KB
+        self.store = store
+        self._client = client
+        self._bucket: Optional[AsyncTokenBucket] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={"User-Agent": self.config.HTTP_USER_AGENT},
+                timeout=self.config.DOWNLOAD_TIMEOUT_SECONDS,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.config.DOWNLOAD_WORKERS,
+                    max_keepalive_connections=self.config.DOWNLOAD_WORKERS,
+                ),
+            )
+        return self._client
+
+    def _get_bucket(self) -> AsyncTokenBucket:
+        if self._bucket is None:
+            self._bucket = AsyncTokenBucket(self.config.DOWNLOAD_RATE_PER_SECOND, self.config.DOWNLOAD_BURST)
+        return self._bucket
+
+    def pdf_url(self, paper: 'arxiv.Result') -> str:
+        """
+        Builds the PDF URL for a paper on the configured arXiv host.
+        """
+        return f"{self.config.ARXIV_PDF_BASE_URL.rstrip('/')}/pdf/{paper.get_short_id()}"
+
+    async def fetch(self, paper: 'arxiv.Result', download_dir: str, max_memory_bytes: Optional[int] = None) -> Optional["DownloadedPdf"]:
+        """
+        Downloads a single paper's PDF, keeping it in memory when possible.
+
+        The bytes are buffered in memory until they exceed max_memory_bytes
+        (defaults to Config.PDF_IN_MEMORY_MAX_BYTES); only then are they
+        spilled to a file in download_dir. Pass 0 to always write to disk.
+
+        Returns:
+            DownloadedPdf: The downloaded PDF, or None on failure.
+        """
+        if max_memory_bytes is None:
+            max_memory_bytes = self.config.PDF_IN_MEMORY_MAX_BYTES if self.config.PDF_IN_MEMORY else 0
+        try:
+            # Keep the version in the filename, so a cached v1 file is never mistaken for v2.
+            full_id_with_version = paper.get_short_id()
+            filename = f"{full_id_with_version.replace('/', '_')}.pdf"
+            filepath = os.path.join(download_dir, filename)
+        except Exception as e:
+            print(f"  -> [Error] Could not process paper metadata for download: {e}")
+            return None
+
+        if self.store is not None:
+            stored = await asyncio.to_thread(self.store.get, full_id_with_version, True)
+            if stored is not None:
+                print(f"  -> '{filename}' found in the local PDF store. Skipping download.")
+                metrics.DOWNLOADS.inc(source="store")
+                return DownloadedPdf(filename=filename, path=stored[0], keep=True, content_sha256=stored[1],
+                                     store=self.store)
+
+        if os.path.exists(filepath):
+            try:
+                if os.path.getsize(filepath) >= self.min_pdf_size_kb * 1024:
+                    print(f"  -> File '{filename}' already exists and is valid. Skipping download.")
+                    return DownloadedPdf(filename=filename, path=filepath)
+            except OSError:
+                pass
+
+        url = self.pdf_url(paper)
+        partial_path = filepath + ".part"
+        for attempt in range(self.config.DOWNLOAD_MAX_RETRIES):
+            await self._get_bucket().acquire()
+            buffer = bytearray()
+            spill_file = None
+            try:
+                async with self._get_client().stream("GET", url) as response:
+                    if response.status_code in (429, 503):
+                        retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+                        print(f"  -> [Info] Server asked us to slow down ({response.status_code}). "
+                              f"Pausing downloads for {retry_after:.0f}s... (Attempt {attempt + 1}/{self.config.DOWNLOAD_MAX_RETRIES})")
+                        self._get_bucket().penalize(retry_after)
+                        continue
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes(self.config.DOWNLOAD_CHUNK_SIZE):
+                        if spill_file is None and len(buffer) + len(chunk) <= max_memory_bytes:
+                            buffer.extend(chunk)
+                            continue
+                        if spill_file is None:
+                            # The PDF is larger than the in-memory limit: move it to disk.
+                            os.makedirs(download_dir, exist_ok=True)
+                            spill_file = open(partial_path, "wb")
+                            spill_file.write(buffer)
+                            buffer = bytearray()
+                        spill_file.write(chunk)
+            except Exception as e:
+                print(f"  -> [Error] An error occurred while downloading '{filename}': {e}")
+                if spill_file is not None:
+                    spill_file.close()
+                _remove_quietly(partial_path)
+                return None
+            if spill_file is not None:
+                spill_file.close()
+
+            size_bytes = os.path.getsize(partial_path) if spill_file is not None else len(buffer)
+            file_size_kb = size_bytes / 1024
+            if file_size_kb < self.min_pdf_size_kb:
+                print(f"  -> [Error] Downloaded file '{filename}' is too small ({file_size_kb:.1f} KB). Deleting invalid file.")
+                _remove_quietly(partial_path)
+                return None
+            metrics.DOWNLOADS.inc(source="arxiv")
+            metrics.DOWNLOAD_BYTES.inc(size_bytes)
+            if spill_file is None:
+                print(f"  -> Success. Downloaded '{filename}' ({file_size_kb:.1f} KB) into memory.")
+                pdf = DownloadedPdf(filename=filename, data=bytes(buffer))
+                if self.store is not None:
+                    stored = await asyncio.to_thread(self.store.put, full_id_with_version, pdf.data)
+                    if stored is not None:
+                        pdf.content_sha256 = stored[1]
+                return pdf
+            os.replace(partial_path, filepath)
+            print(f"  -> Success. Downloaded '{filename}' ({file_size_kb:.1f} KB).")
+            if self.store is not None:
+                stored = await asyncio.to_thread(self.store.put, full_id_with_version, filepath, True, True)
+                if stored is not None:
+                    return DownloadedPdf(filename=filename, path=stored[0], keep=True, content_sha256=stored[1],
+                                         store=self.store)
+                if not os.path.isfile(filepath):
+                    print(f"  -> [Error] '{filename}' could not be stored and is gone from {download_dir}.")
+                    return None
+            return DownloadedPdf(filename=filename, path=filepath)
+
+        print(f"  -> [Error] Giving up on '{filename}' after {self.config.DOWNLOAD_MAX_RETRIES} throttled attempts.")
+        return None
+
+    async def fetch_batch(self, papers: Iterable['arxiv.Result'], download_dir: str) -> List[Optional["DownloadedPdf"]]:
+        """
+        Fetches a batch of papers concurrently (at most Config.DOWNLOAD_WORKERS
+        at a time, and never faster than the token bucket allows).
+
+        Returns:
+            list: One DownloadedPdf (or None on failure) per paper, in input order.
+        """
+        semaphore = asyncio.Semaphore(self.config.DOWNLOAD_WORKERS)
+
+        async def _bounded(paper):
+            async with semaphore:
+                return await self.fetch(paper, download_dir)
+
+        return await asyncio.gather(*(_bounded(paper) for paper in papers))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class BackgroundPdfDownloader:
+    """
+    Runs an AsyncPdfDownloader on a dedicated event-loop thread and exposes a
+    blocking `fetch`, so the thread-based pipeline stages can use the shared
+    client and rate limiter.
+    """
+    def __init__(self, config):
+        store = None
+        if config.PDF_STORE_ENABLED:
+            from pdf_store import PdfStore
+            store = PdfStore(config)
+        self._downloader = AsyncPdfDownloader(config, store=store)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="download-loop", daemon=True)
+        self._thread.start()
+
+    @property
+    def store(self):
+        """The PdfStore in use, or None."""
+        return self._downloader.store
+
+    def fetch(self, paper: 'arxiv.Result', download_dir: str) -> Optional[DownloadedPdf]:
+        future = asyncio.run_coroutine_threadsafe(self._downloader.fetch(paper, download_dir), self._loop)
+        return future.result()
+
+    def close(self):
+        if self.store is not None:
+            self.store.flush_access_times()
+        asyncio.run_coroutine_threadsafe(self._downloader.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def _parse_retry_after(value: Optional[str], default: float = 30.0) -> float:
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+def _remove_quietly(path: str):
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
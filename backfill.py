@@ -0,0 +1,191 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from config import Config
+from database import SessionLocal, engine, write_lock
+import models
+
+GRANULARITIES = {"day": timedelta(days=1), "hour": timedelta(hours=1)}
+
+
+def plan_shards(start_date: str, end_date: str, granularity: str = "day") -> List[Tuple[str, str]]:
+    """
+    Splits an inclusive date range into per-day or per-hour shards.
+
+    Args:
+        start_date (str): The first day in 'YYYYMMDD' format.
+        end_date (str): The last day in 'YYYYMMDD' format (inclusive).
+        granularity (str): 'day' or 'hour'.
+
+    Returns:
+        list: (shard_start, shard_end) tuples in 'YYYYMMDDHHMMSS' format, oldest first.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {sorted(GRANULARITIES)}, not {granularity!r}.")
+    start = datetime.strptime(start_date, "%Y%m%d")
+    end = datetime.strptime(end_date, "%Y%m%d") + timedelta(days=1)
+    if end <= start:
+        raise ValueError("end_date must not be before start_date.")
+
+    step = GRANULARITIES[granularity]
+    shards = []
+    current = start
+    while current < end:
+        shard_end = current + step - timedelta(seconds=1)
+        shards.append((current.strftime("%Y%m%d%H%M%S"), shard_end.strftime("%Y%m%d%H%M%S")))
+        current += step
+    return shards
+
+
+def make_backfill_id(start_date: str, end_date: str, granularity: str) -> str:
+    """
+    The default backfill ID. Re-running the same range resumes the same backfill.
+    """
+    return f"{start_date}-{end_date}-{granularity}"
+
+
+def _register_shards(db: Session, backfill_id: str, shards: List[Tuple[str, str]]) -> List[models.BackfillShard]:
+    """
+    Creates the shard rows that don't exist yet and returns all shards of the backfill.
+    """
+    with write_lock:
+        known = {
+            row.shard_start
+            for row in db.query(models.BackfillShard.shard_start).filter(models.BackfillShard.backfill_id == backfill_id)
+        }
+        for shard_start, shard_end in shards:
+            if shard_start not in known:
+                db.add(models.BackfillShard(backfill_id=backfill_id, shard_start=shard_start, shard_end=shard_end))
+        db.commit()
+    return get_shards(db, backfill_id)
+
+
+def get_shards(db: Session, backfill_id: str) -> List[models.BackfillShard]:
+    return (
+        db.query(models.BackfillShard)
+        .filter(models.BackfillShard.backfill_id == backfill_id)
+        .order_by(models.BackfillShard.shard_start)
+        .all()
+    )
+
+
+def _update_shard(shard_id: int, **fields):
+    db = SessionLocal()
+    try:
+        with write_lock:
+            db.query(models.BackfillShard).filter(models.BackfillShard.id == shard_id).update(fields)
+            db.commit()
+    finally:
+        db.close()
+
+
+def _run_shard(shard_id: int, shard_start: str, shard_end: str, arxiv_client, downloader, parse_workers: int):
+    from tasks import process_date_range
+
+    _update_shard(shard_id, status="running", started_at=datetime.utcnow(), error=None)
+    print(f"--- Backfill shard {shard_start}-{shard_end} started ---")
+    try:
+        stats = process_date_range(shard_start, shard_end, arxiv_client=arxiv_client, downloader=downloader, strict=True,
+                                   parse_workers=parse_workers)
+    except Exception as e:
+        print(f"  -> [Error] Backfill shard {shard_start}-{shard_end} failed: {e}")
+        _update_shard(shard_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+        return
+    _update_shard(
+        shard_id, status="done", finished_at=datetime.utcnow(),
+        candidates=stats.candidates, downloads=stats.downloads, llm_calls=stats.llm_calls, saved=stats.saved,
+    )
+    print(f"--- Backfill shard {shard_start}-{shard_end} done ---")
+
+
+def print_summary(shards: List[models.BackfillShard]):
+    print("\n--- Backfill summary ---")
+    print(f"{'shard start':<16}{'status':<9}{'candidates':>11}{'downloads':>11}{'llm calls':>11}{'saved':>7}")
+    for shard in shards:
+        print(f"{shard.shard_start:<16}{shard.status:<9}{shard.candidates or 0:>11}{shard.downloads or 0:>11}"
+              f"{shard.llm_calls or 0:>11}{shard.saved or 0:>7}")
+    totals = [sum(getattr(s, field) or 0 for s in shards) for field in ("candidates", "downloads", "llm_calls", "saved")]
+    print(f"{'total':<16}{'':<9}{totals[0]:>11}{totals[1]:>11}{totals[2]:>11}{totals[3]:>7}")
+
+
+def run_backfill(start_date: str, end_date: str, granularity: str = "day",
+                 concurrency: Optional[int] = None, backfill_id: Optional[str] = None) -> str:
+    """
+    Processes every shard of a date range, up to `concurrency` shards at a time.
+
+    Shard progress is stored in the 'backfill_shards' table. Running the same
+    backfill again (same ID) skips the shards that are already done, so a
+    crashed backfill resumes where it stopped.
+
+    Returns:
+        str: The backfill ID.
+
+    Raises:
+        RuntimeError: If any shard failed (after all shards ran), so a job
+            running the backfill is marked failed. Running it again retries them.
+    """
+    from arxiv_client import ArxivClient
+    from async_downloader import BackgroundPdfDownloader
+
+    backfill_id = backfill_id or make_backfill_id(start_date, end_date, granularity)
+    concurrency = concurrency or Config.BACKFILL_CONCURRENCY
+    models.BackfillShard.__table__.create(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        shards = _register_shards(db, backfill_id, plan_shards(start_date, end_date, granularity))
+        todo = [(s.id, s.shard_start, s.shard_end) for s in shards if s.status != "done"]
+    finally:
+        db.close()
+    print(f"--- Backfill {backfill_id}: {len(shards)} shards, {len(shards) - len(todo)} already done, "
+          f"{len(todo)} to run with concurrency {concurrency} ---")
+
+    # All shards share one arXiv client and one downloader, so the arXiv rate
+    # limits apply to the backfill as a whole, not to each shard separately.
+    config_instance = Config()
+    arxiv_client = ArxivClient(config_instance)
+    downloader = BackgroundPdfDownloader(config_instance)
+    # Every running shard has its own parse pool; together they use Config.PARSE_WORKERS processes.
+    parse_workers = max(1, Config.PARSE_WORKERS // min(concurrency, max(len(todo), 1)))
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for shard in todo:
+                pool.submit(_run_shard, *shard, arxiv_client, downloader, parse_workers)
+    finally:
+        downloader.close()
+
+    db = SessionLocal()
+    try:
+        shards = get_shards(db, backfill_id)
+    finally:
+        db.close()
+    print_summary(shards)
+    failed = [shard.shard_start for shard in shards if shard.status == "failed"]
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(shards)} shards of backfill {backfill_id} failed "
+                           f"(first: {failed[0]}). Run it again to retry them.")
+    return backfill_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process a range of past days, resuming any unfinished shards.")
+    parser.add_argument("start_date", help="First day, YYYYMMDD.")
+    parser.add_argument("end_date", help="Last day (inclusive), YYYYMMDD.")
+    parser.add_argument("--granularity", choices=sorted(GRANULARITIES), default="day", help="Shard size.")
+    parser.add_argument("--concurrency", type=int, default=None, help="Shards processed at the same time (default: Config.BACKFILL_CONCURRENCY).")
+    parser.add_argument("--backfill-id", default=None, help="Resume a specific backfill (default: derived from the range).")
+    args = parser.parse_args()
+    Config.check_llm_settings()
+    try:
+        run_backfill(args.start_date, args.end_date, args.granularity, args.concurrency, args.backfill_id)
+    except RuntimeError as e:
+        print(f"  -> [Error] {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
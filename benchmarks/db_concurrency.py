@@ -0,0 +1,170 @@
+"""
+Concurrency check: API-style reads against a bulk ingest into SQLite.
+
+A writer process (standing in for the job worker) saves papers in batches
+the way the pipeline's persist stage does, while reader threads in this
+process (standing in for the API) page through /api/papers-style queries on
+the read-only connection pool (database.get_read_db). Read latency is measured
+twice: on the idle database, then during the ingest. Reports lock errors
+("database is locked") and read latency percentiles for both phases, and
+exits with 1 if any read or write failed.
+
+Runs on a temporary database. Compare with SQLite's rollback journal by
+running it again with --journal-mode DELETE, and with commits per paper
+with --batch-size 1.
+
+Usage (from the project root):
+    python -m benchmarks.db_concurrency [--papers 20000] [--readers 8] [--batch-size 50] [--journal-mode WAL]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+INSTITUTIONS = ["Stanford", "CMU", "MIT", "Google", "Meta", "NVIDIA", "Microsoft", "UC Berkeley"]
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _rows(start: int, count: int):
+    import schemas
+
+    rows = []
+    for i in range(start, start + count):
+        paper = schemas.PaperCreate(
+            arxiv_id=f"2506.{i:05d}v1", base_id=f"2506.{i:05d}", version=1,
+            title=f"Scaling language models, part {i}", abstract="We study scaling. " * 40,
+            publish_date=date(2025, 1, 1) + timedelta(days=i % 180), llm_summary=f"Paper {i} scales models.",
+        )
+        rows.append((paper, [INSTITUTIONS[i % len(INSTITUTIONS)]]))
+    return rows
+
+
+def _read_loop(stop: threading.Event, latencies: list, errors: list):
+    import crud
+    from database import ReadSessionLocal
+
+    while not stop.is_set():
+        db = ReadSessionLocal()
+        started = time.perf_counter()
+        try:
+            papers = crud.list_papers(db, limit=51)
+            if papers:
+                crud.list_papers(db, limit=51, after=(papers[-1].publish_date, papers[-1].id),
+                                 institution=INSTITUTIONS[len(latencies) % len(INSTITUTIONS)])
+            latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            errors.append(str(e).splitlines()[0])
+        finally:
+            db.close()
+
+
+def measure_reads(readers: int, duration: float = None, until: threading.Event = None):
+    """Runs reader threads for `duration` seconds, or until `until` is set."""
+    stop = threading.Event()
+    latencies, errors = [], []
+    threads = [threading.Thread(target=_read_loop, args=(stop, latencies, errors), daemon=True) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    if until is not None:
+        until.wait()
+    else:
+        time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+def ingest(start: int, count: int, batch_size: int) -> list:
+    """The writer process: saves papers in batches like the persist stage, returns the errors."""
+    import crud
+    from database import SessionLocal, write_lock
+
+    errors = []
+    db = SessionLocal()
+    try:
+        for batch_start in range(start, start + count, batch_size):
+            try:
+                with write_lock:
+                    crud.bulk_create_papers(db, _rows(batch_start, min(batch_size, start + count - batch_start)))
+            except Exception as e:
+                db.rollback()
+                errors.append(str(e).splitlines()[0])
+    finally:
+        db.close()
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=20000, help="Papers to ingest.")
+    parser.add_argument("--readers", type=int, default=8, help="Concurrent reader threads.")
+    parser.add_argument("--batch-size", type=int, default=50, help="Papers per write transaction.")
+    parser.add_argument("--seed-papers", type=int, default=2000, help="Papers stored before the readers start.")
+    parser.add_argument("--journal-mode", default="WAL", help="SQLITE_JOURNAL_MODE for this run (WAL or DELETE).")
+    parser.add_argument("--ingest", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.ingest:
+        print(json.dumps({"errors": ingest(args.seed_papers, args.papers, args.batch_size)}))
+        return 0
+
+    workdir = tempfile.mkdtemp(prefix="db-concurrency-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'papers.db')}"
+    os.environ["SQLITE_JOURNAL_MODE"] = args.journal_mode
+    os.environ["DB_READ_POOL_SIZE"] = str(args.readers)
+
+    import crud
+    from database import Base, SessionLocal, engine
+    import models  # noqa: F401  (registers the tables)
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    crud.bulk_create_papers(db, _rows(0, args.seed_papers))
+
+    print(f"Database: {workdir}, journal_mode={args.journal_mode}, {args.readers} readers")
+    idle_latencies, idle_errors = measure_reads(args.readers, duration=3.0)
+
+    db.close()
+    command = [sys.executable, "-m", "benchmarks.db_concurrency", "--ingest", "--papers", str(args.papers),
+               "--seed-papers", str(args.seed_papers), "--batch-size", str(args.batch_size)]
+    started = time.perf_counter()
+    writer = subprocess.Popen(command, stdout=subprocess.PIPE, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    done = threading.Event()
+    output = []
+    threading.Thread(target=lambda: (output.append(writer.communicate()[0]), done.set()), daemon=True).start()
+    busy_latencies, busy_errors = measure_reads(args.readers, until=done)
+    elapsed = time.perf_counter() - started
+    if writer.returncode != 0:
+        print(f"The writer process failed (exit code {writer.returncode}).")
+        return 1
+    write_errors = json.loads(output[0].strip().splitlines()[-1])["errors"]
+
+    print(f"Ingested {args.papers} papers in {elapsed:.1f}s ({args.papers / elapsed:.0f} papers/s), "
+          f"{len(write_errors)} failed batches")
+    print(f"{'phase':<14}{'reads':>8}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for phase, latencies, errors in (("idle", idle_latencies, idle_errors), ("during ingest", busy_latencies, busy_errors)):
+        print(f"{phase:<14}{len(latencies):>8}{len(errors):>8}"
+              + "".join(f"{_percentile(latencies, q) * 1000:>9.1f}" for q in (0.5, 0.95, 0.99))
+              + f"{max(latencies, default=float('nan')) * 1000:>9.1f}")
+    for error in sorted(set(idle_errors + busy_errors + write_errors))[:5]:
+        print(f"  error: {error}")
+    return 1 if idle_errors or busy_errors or write_errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+Benchmark: the whole pipeline (harvest, download, parse, LLM, persist) run
+offline against stand-ins from benchmarks/fakes.py:
+
+- arXiv search: synthetic arxiv.Results passed to ArxivClient,
+- the PDF host: a local HTTP server (ARXIV_PDF_BASE_URL) serving generated papers,
+- Gemini: a fake genai.Client with a configurable latency and 429 rate.
+
+Each size runs in a fresh process with an empty SQLite database (response
+cache and PDF store off), and reports papers/sec, the p50/p95 time per paper
+of every stage, the LLM calls and 429s, and the peak RSS of the run (the main
+process and, separately, the largest parse worker). The download rate limit
+is lifted; the Gemini limits are the configured ones unless --rpm is given.
+
+Percentiles come from the pipeline's histogram buckets (metrics.py), so they
+are bucket upper bounds, not exact values.
+
+Save a run with --save-baseline and compare a later run (e.g. after a change)
+with --compare; the settings of both runs should match.
+
+Usage (from the project root):
+    python -m benchmarks.e2e [--sizes 100 1000 10000] [--llm-latency 0.5] [--throttle-rate 0.02]
+                             [--rpm 0] [--save-baseline base.json] [--compare base.json]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DAY = datetime(2025, 6, 1, tzinfo=timezone.utc)
+STAGES = ("download", "parse", "llm", "persist")
+
+
+def _peak_rss_mb(who) -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_child(args) -> dict:
+    """Runs the pipeline once in this process; the environment was set up by the parent."""
+    from unittest import mock
+
+    from benchmarks.fakes import FakeArxivClient, FakeGenaiClient, make_results
+    from arxiv_client import ArxivClient
+    from config import Config
+    import llm_summarizer
+    import metrics
+    import tasks
+
+    import create_db  # noqa: F401  (creates the tables of the empty database)
+
+    Config.DOWNLOAD_RATE_PER_SECOND = 1000.0
+    Config.DOWNLOAD_BURST = 100
+    Config.HARVEST_PAGE_DELAY_SECONDS = 0
+    Config.TEMP_DOWNLOAD_DIR = os.path.join(args.workdir, "downloads")
+
+    fake_arxiv = FakeArxivClient(make_results(args.child, DAY, keyword_ratio=args.keyword_ratio, seed=args.seed))
+    fake_gemini = FakeGenaiClient(latency=args.llm_latency, throttle_rate=args.throttle_rate,
+                                  retry_delay=args.retry_delay, seed=args.seed)
+    day = DAY.strftime("%Y%m%d")
+    before = metrics.REGISTRY.snapshot()
+    started = time.perf_counter()
+    with mock.patch.object(llm_summarizer.genai, "Client", lambda **_: fake_gemini):
+        run_stats = tasks.process_date_range(f"{day}000000", f"{day}235959",
+                                             arxiv_client=ArxivClient(Config(), client=fake_arxiv))
+    elapsed = time.perf_counter() - started
+    summary = metrics.run_summary(before, metrics.REGISTRY.snapshot())
+
+    stage_seconds = summary.get("digest_stage_seconds", {})
+    return {
+        "papers": args.child,
+        "candidates": run_stats.candidates,
+        "saved": run_stats.saved,
+        "seconds": round(elapsed, 2),
+        "papers_per_second": round(args.child / elapsed, 2),
+        "stages": {stage: {key: stage_seconds.get(f"stage={stage}", {}).get(key) for key in ("p50", "p95")}
+                   for stage in STAGES},
+        "llm_calls": fake_gemini.calls,
+        "llm_throttled": fake_gemini.throttled,
+        "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF),
+        "peak_worker_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def run_size(size: int, pdf_url: str, args) -> dict:
+    with tempfile.TemporaryDirectory(prefix="e2e-") as workdir:
+        result_path = os.path.join(workdir, "result.json")
+        env = dict(os.environ,
+                   DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'papers.db')}",
+                   ARXIV_PDF_BASE_URL=pdf_url,
+                   GOOGLE_API_KEY="fake",
+                   LLM_CACHE_ENABLED="false",
+                   PDF_STORE_ENABLED="false",
+                   AFFILIATION_DECISION_LOG="")
+        if args.rpm is not None:
+            env["LLM_RPM_LIMIT"] = str(args.rpm)
+        command = [sys.executable, "-m", "benchmarks.e2e", "--child", str(size), "--workdir", workdir,
+                   "--result-file", result_path] + _settings_argv(args)
+        log = None if args.verbose else subprocess.DEVNULL
+        completed = subprocess.run(command, env=env, stdout=log, cwd=os.path.dirname(os.path.dirname(__file__)) or ".")
+        if completed.returncode != 0 or not os.path.exists(result_path):
+            raise RuntimeError(f"The run with {size} papers failed (exit code {completed.returncode}).")
+        with open(result_path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def _settings(args) -> dict:
+    return {"llm_latency": args.llm_latency, "throttle_rate": args.throttle_rate, "retry_delay": args.retry_delay,
+            "rpm": args.rpm, "keyword_ratio": args.keyword_ratio, "match_ratio": args.match_ratio,
+            "pdf_latency": args.pdf_latency, "seed": args.seed}
+
+
+def _settings_argv(args) -> list:
+    argv = []
+    for name, value in _settings(args).items():
+        if value is not None and name not in ("match_ratio", "pdf_latency", "rpm"):
+            argv += [f"--{name.replace('_', '-')}", str(value)]
+    return argv
+
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:g}"
+
+
+def print_results(results: list):
+    header = f"{'papers':>7}{'saved':>7}{'seconds':>9}{'papers/s':>10}"
+    header += "".join(f"{stage + ' p50/p95':>20}" for stage in STAGES)
+    header += f"{'LLM calls':>11}{'429s':>6}{'RSS MB':>8}{'worker MB':>11}"
+    print(header)
+    for r in results:
+        line = f"{r['papers']:>7}{r['saved']:>7}{r['seconds']:>9.1f}{r['papers_per_second']:>10.1f}"
+        line += "".join(f"{_fmt(r['stages'][s]['p50']) + ' / ' + _fmt(r['stages'][s]['p95']):>20}" for s in STAGES)
+        line += f"{r['llm_calls']:>11}{r['llm_throttled']:>6}{r['peak_rss_mb']:>8.0f}{r['peak_worker_rss_mb']:>11.0f}"
+        print(line)
+
+
+def compare(results: list, baseline: dict, settings: dict):
+    if baseline.get("settings") != settings:
+        print(f"[Warning] The baseline was run with different settings: {baseline.get('settings')}")
+    by_size = {r["papers"]: r for r in baseline.get("results", [])}
+    print(f"\nCompared with the baseline from {baseline.get('created', '?')}:")
+    print(f"{'papers':>7}{'papers/s':>20}{'peak RSS MB':>22}")
+    for r in results:
+        old = by_size.get(r["papers"])
+        if old is None:
+            print(f"{r['papers']:>7}  not in the baseline")
+            continue
+        speed = r["papers_per_second"] / old["papers_per_second"] - 1 if old["papers_per_second"] else 0
+        rss = r["peak_rss_mb"] - old["peak_rss_mb"]
+        print(f"{r['papers']:>7}{old['papers_per_second']:>8.1f} -> {r['papers_per_second']:<6.1f}{speed:+.0%}"
+              f"{old['peak_rss_mb']:>10.0f} -> {r['peak_rss_mb']:<6.0f}{rss:+.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000], help="Numbers of arXiv results per run.")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Average seconds per fake Gemini call.")
+    parser.add_argument("--throttle-rate", type=float, default=0.02, help="Fraction of Gemini calls answered with a 429.")
+    parser.add_argument("--retry-delay", type=float, default=1.0, help="The retryDelay of injected 429s, in seconds.")
+    parser.add_argument("--rpm", type=int, help="Override LLM_RPM_LIMIT (0 = no limit).")
+    parser.add_argument("--keyword-ratio", type=float, default=0.8, help="Fraction of results matching the keywords.")
+    parser.add_argument("--match-ratio", type=float, default=0.5, help="Fraction of PDFs with a target affiliation.")
+    parser.add_argument("--pdf-latency", type=float, default=0.05, help="Seconds the PDF server waits per request.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write the results to a JSON file.")
+    parser.add_argument("--compare", metavar="PATH", help="Compare the results with a saved baseline.")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's output.")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        result = run_child(args)
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return 0
+
+    from benchmarks.fakes import PdfServer
+
+    results = []
+    with PdfServer(match_ratio=args.match_ratio, latency=args.pdf_latency, seed=args.seed) as server:
+        for size in args.sizes:
+            print(f"Running the pipeline on {size} papers...")
+            results.append(run_size(size, server.url, args))
+    print()
+    print_results(results)
+
+    settings = _settings(args)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f), settings)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"created": datetime.now().isoformat(timespec="seconds"), "settings": settings,
+                       "results": results}, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+Offline stand-ins for arXiv, the arXiv PDF host and Gemini, used by the
+end-to-end benchmark (benchmarks/e2e.py). Everything is deterministic for a
+given seed, so repeated runs process the same papers.
+
+- make_results() / FakeArxivClient: synthetic arxiv.Result pages for ArxivClient.
+- PdfServer: a local HTTP server for AsyncPdfDownloader (point
+  Config.ARXIV_PDF_BASE_URL at it) serving generated papers with author,
+  affiliation and email headers, an abstract and an introduction.
+- FakeGenaiClient: a genai.Client with configurable latency and 429 injection
+  for LLMSummarizer.
+"""
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import arxiv
+import fitz  # PyMuPDF
+from google.genai import errors
+
+_WORDS = ("model training language data results method attention transformer scaling benchmark "
+          "evaluation efficient sparse retrieval reasoning alignment inference tokens layers").split()
+_TITLE_TOPICS = ("Large Language Models", "Transformers", "Foundation Models", "Generative AI", "Language Model Agents")
+_FIRST_NAMES = ("Alice", "Bob", "Carol", "Dan", "Eve", "Frank", "Grace", "Heidi", "Ivan", "Judy")
+_LAST_NAMES = ("Smith", "Jones", "Chen", "Garcia", "Kim", "Müller", "Rossi", "Tanaka", "Singh", "Novak")
+# (affiliation line, email domain); the first ones are on the target lists in config.py.
+_TARGET_AFFILIATIONS = (("Stanford University", "stanford.edu"), ("Carnegie Mellon University", "cs.cmu.edu"),
+                        ("Google DeepMind", "google.com"), ("NVIDIA Research", "nvidia.com"))
+_OTHER_AFFILIATIONS = (("University of Nowhere", "nowhere.edu"), ("Example Institute of Technology", "eit.ac"),
+                       ("Acme AI Lab", "acme.ai"))
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(_sentence(rng, rng.randint(8, 18)) for _ in range(sentences))
+
+
+
+def make_results(count: int, updated_start: datetime, keyword_ratio: float = 1.0, seed: int = 0) -> List[arxiv.Result]:
+    """
+    Builds `count` arxiv.Results updated within one day of updated_start,
+    newest first (the order ArxivClient asks arXiv for). keyword_ratio of
+    them mention an LLM keyword in the title.
+    """
+    rng = random.Random(seed)
+    results = []
+    for i in range(count):
+        updated = updated_start + timedelta(seconds=(count - i) * 86000 // max(count, 1))
+        if rng.random() < keyword_ratio:
+            title = f"Efficient {rng.choice(_TITLE_TOPICS)} with {rng.choice(_WORDS).capitalize()} {i}"
+        else:
+            title = f"A Study of Graph Coloring {i}"
+        results.append(arxiv.Result(
+            entry_id=f"http://arxiv.org/abs/2506.{i:05d}v1", title=title,
+            summary=_paragraph(rng, 4), published=updated, updated=updated, links=[],
+        ))
+    return results
+
+
+class FakeArxivClient:
+    """Serves pages of make_results() like arxiv.Client.results, with an optional delay per page."""
+    def __init__(self, results: List[arxiv.Result], page_delay: float = 0.0):
+        self.all_results = results
+        self.page_delay = page_delay
+        self.requests = 0
+
+    def results(self, search, offset: int = 0):
+        self.requests += 1
+        if self.page_delay:
+            time.sleep(self.page_delay)
+        return iter(self.all_results[offset:search.max_results])
+
+
+def make_pdf(short_id: str, match_ratio: float = 0.5, email_ratio: float = 0.6, seed: int = 0) -> bytes:
+    """
+    Generates a 3-page paper. match_ratio of the papers list a target
+    institution; email_ratio of those also give an email on its domain.
+    """
+    rng = random.Random(f"{seed}-{short_id}")
+    doc = fitz.open()
+    page = doc.new_page()
+    y = 60.0
+
+    def put(text: str, size: float = 9.0):
+        nonlocal page, y
+        height = (len(text) * size * 0.5 // 470 + 1) * (size + 3)
+        if y + height > 780:
+            page, y = doc.new_page(), 60.0
+        page.insert_textbox(fitz.Rect(60, y, 540, y + height + 12), text, fontsize=size)
+        y += height + 14
+
+    target = rng.random() < match_ratio
+    affiliation, domain = rng.choice(_TARGET_AFFILIATIONS if target else _OTHER_AFFILIATIONS)
+    authors = [f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}" for _ in range(rng.randint(2, 6))]
+    put(f"Efficient {rng.choice(_TITLE_TOPICS)} via {rng.choice(_WORDS).capitalize()} {short_id}", 15)
+    put(", ".join(f"{name}{n % 2 + 1}" for n, name in enumerate(authors)), 11)
+    put(f"1 {affiliation}   2 {rng.choice(_OTHER_AFFILIATIONS)[0]}")
+    if not target or rng.random() < email_ratio:
+        put(f"{authors[0].split()[0].lower()}@{domain}")
+    put("Abstract", 11)
+    put(_paragraph(rng, 8))
+    put("1 Introduction", 11)
+    put(_paragraph(rng, 7))
+    put("In this paper we propose a new method. Our main contributions are: " + _paragraph(rng, 4))
+    put(_paragraph(rng, 7))
+    put("2 Related Work", 11)
+    for _ in range(8):
+        put(_paragraph(rng, 7))
+    put("References", 11)
+    for _ in range(10):
+        put(_sentence(rng, 14), 8)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+class PdfServer:
+    """
+    Serves make_pdf() papers at /pdf/<arxiv id> from a background thread, with
+    an optional per-request latency.
+    """
+    def __init__(self, match_ratio: float = 0.5, email_ratio: float = 0.6, latency: float = 0.0, seed: int = 0):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if not self.path.startswith("/pdf/"):
+                    self.send_error(404)
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                data = make_pdf(self.path[len("/pdf/"):], server.match_ratio, server.email_ratio, server.seed)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.match_ratio, self.email_ratio, self.latency, self.seed = match_ratio, email_ratio, latency, seed
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="pdf-server", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class _FakeResponse:
+    def __init__(self, text: str, prompt: str):
+        self.text = text
+        self.usage_metadata = type("Usage", (), {"total_token_count": len(prompt) // 4 + len(text) // 4})()
+
+
+class _FakeModels:
+    def __init__(self, client: "FakeGenaiClient"):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None):
+        client = self._client
+        with client.lock:
+            client.calls += 1
+            throttled = client.rng.random() < client.throttle_rate
+            latency = client.latency * client.rng.uniform(0.5, 1.5)
+        time.sleep(latency)
+        if throttled:
+            with client.lock:
+                client.throttled += 1
+            raise errors.ClientError(429, {"error": {
+                "code": 429, "status": "RESOURCE_EXHAUSTED", "message": "Quota exceeded (injected).",
+                "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{client.retry_delay:g}s"}],
+            }})
+        summary = "The paper proposes an efficient method and shows consistent gains on standard benchmarks."
+        if config:
+            ids = re.findall(r"--- Paper (\S+) ---", contents)
+            return _FakeResponse(json.dumps([{"arxiv_id": i, "decision": "MATCH", "summary": summary} for i in ids]), contents)
+        if contents.lstrip().startswith("Summarize"):
+            return _FakeResponse(summary, contents)
+        return _FakeResponse(f"MATCH\n{summary}", contents)
+
+
+class FakeGenaiClient:
+    """
+    A genai.Client stand-in: every call takes about `latency` seconds and
+    throttle_rate of the calls fail with a 429 carrying a retryDelay. Every
+    paper is confirmed as a match.
+    """
+    def __init__(self, latency: float = 0.5, throttle_rate: float = 0.0, retry_delay: float = 1.0, seed: int = 0, **_):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_delay = retry_delay
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+        self.models = _FakeModels(self)
@@ -0,0 +1,85 @@
+"""
+Import-time budget check for the API's cold start.
+
+Imports a module (by default `main`, what every uvicorn worker loads) in a
+fresh interpreter with `python -X importtime`, and checks that:
+- none of the pipeline's heavy dependencies (PyMuPDF, arxiv, google-genai,
+  httpx) or the modules that use them were imported: they must only load
+  when a processing job runs;
+- the cumulative import time stays under the budget (best of --repeat runs,
+  since the first run also pays for cold disk caches).
+
+Prints the slowest imports and exits with 1 if a check fails, so it can run in CI.
+
+Usage (from the project root):
+    python -m benchmarks.import_time [--module main] [--budget-ms 1500] [--repeat 3] [--top 15]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Modules the API must not load: the pipeline's dependencies and the project
+# modules that import them at module level.
+FORBIDDEN_MODULES = (
+    "fitz", "pymupdf", "arxiv", "google.genai", "httpx",
+    "tasks", "pdf_processor", "async_downloader", "arxiv_client", "llm_summarizer",
+)
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure(module: str):
+    """
+    Imports `module` in a new interpreter.
+
+    Returns:
+        tuple: (total microseconds of the top-level imports, {module: cumulative microseconds}).
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=PROJECT_ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    total, modules = 0, {}
+    for line in completed.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), match.group(3), match.group(4)
+        modules[name] = max(cumulative, modules.get(name, 0))
+        if len(indent) == 1:  # Imported directly by the interpreter (site) or by the -c statement.
+            total += cumulative
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="The module to import.")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="Maximum cumulative import time.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs; the fastest one is checked.")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to show.")
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(max(args.repeat, 1))]
+    total, modules = min(runs, key=lambda run: run[0])
+
+    print(f"Slowest imports of `{args.module}` (cumulative):")
+    for name, cumulative in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {cumulative / 1000:>8.1f} ms  {name}")
+
+    failed = False
+    loaded = [name for name in FORBIDDEN_MODULES if name in modules]
+    if loaded:
+        failed = True
+        print(f"\n[FAIL] `{args.module}` imports pipeline-only modules: {', '.join(loaded)}")
+    status = "OK" if total / 1000 <= args.budget_ms else "FAIL"
+    failed = failed or status == "FAIL"
+    print(f"\n[{status}] Import time {total / 1000:.0f} ms (best of {len(runs)}), budget {args.budget_ms:.0f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Evaluation: LLM input size and summary quality of the "sections" text mode
+against the original "pages" mode (first 3 pages, cut at 8000 characters).
+
+Without --llm, only the estimated input tokens per paper are compared. With
+--llm, each paper is also sent to Gemini in both modes (GOOGLE_API_KEY must be
+set; the response cache is not used), and the decisions and summaries are
+scored against a labels file, or against the "pages" results when a paper has
+no label. Summary quality is the ROUGE-1 F1 (unigram overlap) with the
+reference summary.
+
+The labels file is a JSON object keyed by PDF file name:
+    {"2506.01234v1.pdf": {"match": true, "summary": "The paper introduces ..."}}
+
+Usage (from the project root):
+    python -m benchmarks.llm_input /path/to/folder/of/pdfs [--labels labels.json] [--llm] [--budget 1200]
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import Config
+from pdf_processor import PdfProcessor
+
+
+def rouge1_f1(candidate: str, reference: str) -> float:
+    candidate_words = Counter(re.findall(r"\w+", (candidate or "").lower()))
+    reference_words = Counter(re.findall(r"\w+", (reference or "").lower()))
+    overlap = sum((candidate_words & reference_words).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(candidate_words.values())
+    recall = overlap / sum(reference_words.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", help="A folder containing PDF files.")
+    parser.add_argument("--labels", help="A JSON file with the expected decision and a reference summary per PDF.")
+    parser.add_argument("--llm", action="store_true", help="Also call Gemini in both modes and score the results.")
+    parser.add_argument("--budget", type=int, default=Config.LLM_INPUT_TOKEN_BUDGET, help="Token budget of the sections mode.")
+    args = parser.parse_args()
+
+    pdf_paths = sorted(glob.glob(os.path.join(args.folder, "*.pdf")))
+    if not pdf_paths:
+        print(f"No PDF files found in {args.folder}.")
+        return 1
+    labels = {}
+    if args.labels:
+        with open(args.labels, encoding="utf-8") as f:
+            labels = json.load(f)
+
+    class PagesConfig(Config):
+        LLM_TEXT_MODE = "pages"
+
+    class SectionsConfig(Config):
+        LLM_TEXT_MODE = "sections"
+        LLM_INPUT_TOKEN_BUDGET = args.budget
+
+    pages_processor = PdfProcessor(PagesConfig())
+    sections_processor = PdfProcessor(SectionsConfig())
+    summarizer = None
+    if args.llm:
+        from llm_summarizer import LLMSummarizer
+        summarizer = LLMSummarizer(Config())
+
+    totals = Counter()
+    scores = {"pages": [], "sections": []}
+    agreement = {"pages": 0, "sections": 0}
+    print(f"{'PDF':<32}{'pages':>8}{'sections':>10}{'cut':>7}")
+    for path in pdf_paths:
+        name = os.path.basename(path)
+        pages = pages_processor.analyze(path, name)
+        sections = sections_processor.analyze(path, name)
+        if pages is None or sections is None or not pages.llm_text:
+            print(f"{name:<32}  could not be parsed")
+            continue
+        totals["papers"] += 1
+        totals["pages"] += pages.llm_tokens
+        totals["sections"] += sections.llm_tokens
+        cut = 1 - sections.llm_tokens / pages.llm_tokens
+        print(f"{name[:31]:<32}{pages.llm_tokens:>8}{sections.llm_tokens:>10}{cut:>7.0%}")
+
+        if summarizer:
+            results = {"pages": summarizer.process_text(pages.llm_text),
+                       "sections": summarizer.process_text(sections.llm_text)}
+            label = labels.get(name)
+            expected_match = label["match"] if label else results["pages"][0]
+            reference = label.get("summary") if label else results["pages"][1]
+            for mode, (is_match, summary) in results.items():
+                agreement[mode] += is_match == expected_match
+                if expected_match and reference and (label or mode == "sections"):
+                    scores[mode].append(rouge1_f1(summary, reference))
+
+    if not totals["papers"]:
+        return 1
+    print(f"\nPapers:             {totals['papers']}")
+    print(f"Avg input tokens:   pages {totals['pages'] / totals['papers']:.0f}, "
+          f"sections {totals['sections'] / totals['papers']:.0f} "
+          f"({1 - totals['sections'] / totals['pages']:.0%} fewer)")
+    if summarizer:
+        for mode in ("pages", "sections"):
+            avg = sum(scores[mode]) / len(scores[mode]) if scores[mode] else float("nan")
+            print(f"{mode:<9} decisions agree: {agreement[mode]}/{totals['papers']}, "
+                  f"summary ROUGE-1 F1: {avg:.3f} over {len(scores[mode])} papers")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Benchmark: PDF parsing throughput of ParseService with 1 worker process
+against N worker processes, fed by N threads as in the pipeline's parse stage.
+
+Usage (from the project root):
+    python -m benchmarks.parse_service /path/to/folder/of/pdfs [--workers 8] [--in-memory]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import Config
+from pdf_processor import ParseService
+
+
+def run(sources, workers: int) -> float:
+    with ParseService(Config(), workers=workers) as service:
+        # Warm up every worker process (imports, matcher tables) before timing.
+        with ThreadPoolExecutor(max_workers=workers) as threads:
+            list(threads.map(lambda s: service.parse(s[1], s[0]), sources[:workers]))
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as threads:
+            list(threads.map(lambda s: service.parse(s[1], s[0]), sources))
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", help="A folder containing PDF files.")
+    parser.add_argument("--workers", type=int, default=Config.PARSE_WORKERS, help="Worker processes to compare against 1.")
+    parser.add_argument("--in-memory", action="store_true", help="Pass PDF bytes instead of file paths.")
+    args = parser.parse_args()
+
+    pdf_paths = sorted(glob.glob(os.path.join(args.folder, "*.pdf")))
+    if not pdf_paths:
+        print(f"No PDF files found in {args.folder}.")
+        return 1
+    sources = []
+    for path in pdf_paths:
+        if args.in_memory:
+            with open(path, "rb") as f:
+                sources.append((os.path.basename(path), f.read()))
+        else:
+            sources.append((os.path.basename(path), path))
+
+    single = run(sources, 1)
+    multi = run(sources, args.workers)
+    print(f"PDFs:                 {len(sources)} ({'bytes' if args.in_memory else 'paths'})")
+    print(f"1 worker:             {single:8.3f}s ({len(sources) / single:7.1f} pdf/s)")
+    print(f"{args.workers} workers:{'':<{12 - len(str(args.workers))}}{multi:8.3f}s ({len(sources) / multi:7.1f} pdf/s)")
+    print(f"Speedup:              {single / multi if multi else float('inf'):8.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Micro-benchmark: the single-pass PdfProcessor.analyze() against the original
+two-method path (check_affiliation_single_pdf + extract_text).
+
+Usage (from the project root):
+    python -m benchmarks.pdf_analyze /path/to/folder/of/pdfs [--repeat 3]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import Config
+from pdf_processor import PdfProcessor
+
+
+def two_method_path(processor: PdfProcessor, pdf_path: str):
+    match_reason = processor.check_affiliation_single_pdf(pdf_path)
+    text = processor.extract_text(pdf_path) if match_reason else None
+    return match_reason, text
+
+
+def single_pass_path(processor: PdfProcessor, pdf_path: str):
+    analysis = processor.analyze(pdf_path, os.path.basename(pdf_path))
+    if analysis is None or not analysis.match_reason:
+        return None, None
+    return analysis.match_reason, analysis.llm_text
+
+
+def time_path(func, processor: PdfProcessor, pdf_paths, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for pdf_path in pdf_paths:
+            func(processor, pdf_path)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", help="A folder containing PDF files.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions; the best run is reported.")
+    args = parser.parse_args()
+
+    pdf_paths = sorted(glob.glob(os.path.join(args.folder, "*.pdf")))
+    if not pdf_paths:
+        print(f"No PDF files found in {args.folder}.")
+        return 1
+
+    processor = PdfProcessor(Config())
+    agree = sum(two_method_path(processor, p)[0] == single_pass_path(processor, p)[0] for p in pdf_paths)
+
+    old = time_path(two_method_path, processor, pdf_paths, args.repeat)
+    new = time_path(single_pass_path, processor, pdf_paths, args.repeat)
+
+    print(f"PDFs:                 {len(pdf_paths)}")
+    print(f"Match reasons agree:  {agree}/{len(pdf_paths)}")
+    print(f"Two-method path:      {old:8.3f}s ({old / len(pdf_paths) * 1000:7.2f} ms/pdf)")
+    print(f"Single-pass analyze:  {new:8.3f}s ({new / len(pdf_paths) * 1000:7.2f} ms/pdf)")
+    print(f"Speedup:              {old / new if new else float('inf'):8.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,19 @@
 # (可以放在一个临时文件如 create_db.py 中运行一次)
 from database import engine, Base
-from models import Paper, Institution # 确保所有模型都被导入
+from models import Paper, Institution, LLMCacheEntry, BackfillShard, HarvestState, Job, JobItem, PdfStoreEntry, MetricsSnapshot, Digest # 确保所有模型都被导入
+import search_index
+import schema_upgrades
 
 print("Creating database and tables...")
 Base.metadata.create_all(bind=engine)
+# Columns added to existing tables (create_all() never alters a table).
+schema_upgrades.upgrade_papers_table(engine)
+schema_upgrades.upgrade_jobs_table(engine)
+# create_all() skips tables that already exist, so add any indexes that were
+# introduced after the database was first created.
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+# The full-text search index (SQLite only) and the triggers that keep it in sync.
+search_index.ensure_fts_index(engine)
 print("Database and tables created successfully.")
\ No newline at end of file
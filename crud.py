@@ -1,5 +1,10 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional  # <--- 1. 导入 Optional
+import base64
+from datetime import date
+
+from sqlalchemy import and_, or_
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session, defer, selectinload
+from typing import Dict, Iterable, List, Optional, Tuple  # <--- 1. 导入 Optional
 
 import models
 import schemas
@@ -61,4 +66,244 @@ def create_paper(db: Session, paper: schemas.PaperBase, institution_names: List[
     db.add(db_paper)
     db.commit()
     db.refresh(db_paper)
-    return db_paper
\ No newline at end of file
+    return db_paper
+
+# --- Batch CRUD Functions ---
+# These replace per-paper round trips on the write path: one IN (...) query per
+# batch for lookups, and one transaction for all inserts of a batch.
+
+# Keep IN (...) lists and multi-row VALUES well below SQLite's bound-parameter limit.
+_CHUNK_SIZE = 500
+
+def _chunks(items: List, size: int = _CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _dialect_insert(db: Session):
+    """
+    Returns the dialect-specific insert() that supports ON CONFLICT clauses,
+    or None if the database dialect has no such support.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    return None
+
+def get_or_create_institutions(db: Session, names: Iterable[str]) -> Dict[str, int]:
+    """
+    Resolves many institution names to IDs, inserting the missing ones in bulk.
+    Does not commit; the caller owns the transaction.
+
+    Returns:
+        dict: institution name -> institution id.
+    """
+    unique_names = list(dict.fromkeys(names))
+    ids = {}
+    for chunk in _chunks(unique_names):
+        rows = db.query(models.Institution.id, models.Institution.name).filter(models.Institution.name.in_(chunk)).all()
+        ids.update({row.name: row.id for row in rows})
+
+    missing = [name for name in unique_names if name not in ids]
+    if missing:
+        insert = _dialect_insert(db)
+        for chunk in _chunks(missing):
+            if insert is not None:
+                db.execute(insert(models.Institution.__table__).values([{"name": n} for n in chunk]).on_conflict_do_nothing())
+            else:
+                db.execute(models.Institution.__table__.insert(), [{"name": n} for n in chunk])
+        for chunk in _chunks(missing):
+            rows = db.query(models.Institution.id, models.Institution.name).filter(models.Institution.name.in_(chunk)).all()
+            ids.update({row.name: row.id for row in rows})
+    return ids
+
+def get_known_versions(db: Session, base_ids: Iterable[str]) -> Dict[str, Row]:
+    """
+    Looks up the stored version of many papers by base arXiv ID (one IN (...)
+    query per chunk).
+
+    Returns:
+        dict: base_id -> row with `id`, `arxiv_id`, `version`, `pdf_sha256` and `text_sha256`.
+    """
+    unique_ids = list(dict.fromkeys(base_ids))
+    known = {}
+    Paper = models.Paper
+    for chunk in _chunks(unique_ids):
+        rows = (
+            db.query(Paper.id, Paper.base_id, Paper.arxiv_id, Paper.version, Paper.pdf_sha256, Paper.text_sha256)
+            .filter(Paper.base_id.in_(chunk))
+            .all()
+        )
+        known.update({row.base_id: row for row in rows})
+    return known
+
+def bulk_create_papers(db: Session, papers: List[Tuple[schemas.PaperCreate, List[str]]]) -> int:
+    """
+    Inserts many papers, their institutions and the paper/institution links in
+    a single transaction, with upsert semantics: a paper whose base arXiv ID
+    already exists (e.g. an earlier version) is updated instead of duplicated,
+    and its institution links are replaced by the new ones.
+
+    Args:
+        papers (list): (paper, institution_names) tuples.
+
+    Returns:
+        int: The number of papers written (inserted or updated).
+    """
+    if not papers:
+        return 0
+
+    # Later entries for the same paper win, as they would with one upsert each.
+    by_base_id = {paper.base_id: (paper, institution_names) for paper, institution_names in papers}
+    try:
+        institution_ids = get_or_create_institutions(
+            db, (name for _, names in by_base_id.values() for name in names)
+        )
+
+        insert = _dialect_insert(db)
+        paper_rows = [paper.model_dump() for paper, _ in by_base_id.values()]
+        if insert is not None:
+            for chunk in _chunks(paper_rows):
+                stmt = insert(models.Paper.__table__).values(chunk)
+                update_columns = {key: stmt.excluded[key] for key in chunk[0] if key != "base_id"}
+                db.execute(stmt.on_conflict_do_update(index_elements=["base_id"], set_=update_columns))
+        else:
+            existing = set(get_known_versions(db, by_base_id))
+            new_rows = [row for row in paper_rows if row["base_id"] not in existing]
+            if new_rows:
+                db.execute(models.Paper.__table__.insert(), new_rows)
+            for row in paper_rows:
+                if row["base_id"] in existing:
+                    db.query(models.Paper).filter(models.Paper.base_id == row["base_id"]).update(row, synchronize_session=False)
+
+        paper_ids = {}
+        for chunk in _chunks(list(by_base_id)):
+            rows = db.query(models.Paper.id, models.Paper.base_id).filter(models.Paper.base_id.in_(chunk)).all()
+            paper_ids.update({row.base_id: row.id for row in rows})
+
+        links = list(dict.fromkeys(
+            (paper_ids[base_id], institution_ids[name])
+            for base_id, (_, names) in by_base_id.items() for name in names
+        ))
+        association = models.paper_institution_association
+        # A new version may list other institutions: drop the old links of every written paper.
+        for chunk in _chunks(list(paper_ids.values())):
+            db.execute(association.delete().where(association.c.paper_id.in_(chunk)))
+        for chunk in _chunks(links):
+            db.execute(association.insert(), [{"paper_id": p, "institution_id": i} for p, i in chunk])
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(by_base_id)
+
+def update_paper_versions(db: Session, updates: List[dict]) -> int:
+    """
+    Moves stored papers to a newer arXiv version without touching their LLM
+    summary or institutions, for new versions whose inputs did not change.
+    All updates run in one transaction.
+
+    Args:
+        updates (list): dicts with `base_id` plus the columns to set
+            (e.g. arxiv_id, version, title, abstract, pdf_sha256).
+
+    Returns:
+        int: The number of papers updated.
+    """
+    updated = 0
+    try:
+        for fields in updates:
+            values = {key: value for key, value in fields.items() if key != "base_id"}
+            updated += db.query(models.Paper).filter(models.Paper.base_id == fields["base_id"]).update(
+                values, synchronize_session=False
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return updated
+
+
+# --- Paper Listing (keyset pagination) ---
+
+def encode_paper_cursor(paper: models.Paper) -> str:
+    """
+    Encodes the (publish_date, id) position of a paper as an opaque cursor string.
+    """
+    raw = f"{paper.publish_date.isoformat() if paper.publish_date else ''}|{paper.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_paper_cursor(cursor: str) -> Tuple[Optional[date], int]:
+    """
+    Decodes a cursor produced by encode_paper_cursor().
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        date_part, id_part = raw.split("|")
+        return (date.fromisoformat(date_part) if date_part else None), int(id_part)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+def list_papers(
+    db: Session,
+    limit: int,
+    after: Optional[Tuple[Optional[date], int]] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    institution: Optional[str] = None,
+    keyword: Optional[str] = None,
+    include_text: bool = True,
+) -> List[models.Paper]:
+    """
+    Returns one page of papers, newest first, ordered by (publish_date, id).
+
+    Uses keyset pagination: `after` is the (publish_date, id) of the last paper
+    of the previous page, so each page is an index range scan no matter how
+    deep into the list it is. Institutions are loaded with one extra SELECT
+    for the whole page instead of one per paper.
+
+    Args:
+        limit (int): The page size.
+        after (tuple, optional): The decoded cursor of the previous page.
+        date_from, date_to (date, optional): Inclusive publish_date range.
+        institution (str, optional): Only papers linked to this institution name.
+        keyword (str, optional): Only papers whose title or abstract contains this text.
+        include_text (bool): If False, abstract and llm_summary are not loaded.
+    """
+    Paper = models.Paper
+    query = db.query(Paper).options(selectinload(Paper.institutions))
+    if not include_text:
+        query = query.options(defer(Paper.abstract), defer(Paper.llm_summary))
+
+    if date_from:
+        query = query.filter(Paper.publish_date >= date_from)
+    if date_to:
+        query = query.filter(Paper.publish_date <= date_to)
+    if institution:
+        query = query.filter(Paper.institutions.any(models.Institution.name == institution))
+    if keyword:
+        pattern = f"%{keyword}%"
+        query = query.filter(or_(Paper.title.ilike(pattern), Paper.abstract.ilike(pattern)))
+
+    if after is not None:
+        after_date, after_id = after
+        if after_date is None:
+            # Papers without a publish_date sort last; continue within them.
+            query = query.filter(Paper.publish_date.is_(None), Paper.id < after_id)
+        else:
+            query = query.filter(or_(
+                Paper.publish_date < after_date,
+                and_(Paper.publish_date == after_date, Paper.id < after_id),
+                Paper.publish_date.is_(None),
+            ))
+
+    return (
+        query.order_by(Paper.publish_date.desc().nulls_last(), Paper.id.desc())
+        .limit(limit)
+        .all()
+    )
@@ -1,22 +1,78 @@
-from sqlalchemy import create_engine
+import threading
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import Config  # Import the refactored Config class
 
-# --- 1. Create the Database Engine ---
+_IS_SQLITE = Config.DATABASE_URL.startswith("sqlite")
+
+
+def _configure_sqlite_connection(dbapi_connection, read_only: bool):
+    """
+    Applies the SQLite settings from Config to a new connection:
+    - journal_mode=WAL: readers see the last committed state and never block
+      on (or block) the writer, so API reads keep working during a run.
+    - synchronous=NORMAL: in WAL mode a commit no longer waits for fsync;
+      only the last commits may be lost on power failure, never consistency.
+    - busy_timeout: wait for a lock instead of failing with "database is locked".
+    - cache_size / mmap_size: keep hot pages in memory for the read queries.
+    Read-only connections additionally set query_only, so any write through
+    them fails instead of competing for the writer's lock.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {int(Config.SQLITE_BUSY_TIMEOUT_MS)}")
+        if ":memory:" not in Config.DATABASE_URL:
+            cursor.execute(f"PRAGMA journal_mode = {Config.SQLITE_JOURNAL_MODE}")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.execute(f"PRAGMA cache_size = -{int(Config.SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute(f"PRAGMA mmap_size = {int(Config.SQLITE_MMAP_SIZE_BYTES)}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+    finally:
+        cursor.close()
+
+
+def _create_engine(read_only: bool = False, **kwargs):
+    if not _IS_SQLITE:
+        return create_engine(Config.DATABASE_URL, **kwargs)
+    new_engine = create_engine(Config.DATABASE_URL, connect_args={"check_same_thread": False}, **kwargs)
+    event.listen(new_engine, "connect",
+                 lambda dbapi_connection, _: _configure_sqlite_connection(dbapi_connection, read_only))
+    return new_engine
+
+
+# --- 1. Create the Database Engines ---
 # create_engine establishes a connection to the database based on the DATABASE_URL.
-# The `connect_args` dictionary is a special configuration required for SQLite.
-# It allows multiple threads to share the same connection, which is necessary
-# for FastAPI's asynchronous nature. This argument is not needed for PostgreSQL.
-engine = create_engine(
-    Config.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in Config.DATABASE_URL else {}
-)
-
-# --- 2. Create a Session Factory ---
+# For SQLite, `check_same_thread=False` allows a connection to be used by
+# another thread than the one that created it (FastAPI runs endpoints in a
+# thread pool), and every connection is configured by _configure_sqlite_connection.
+#
+# `engine` is the read-write engine used by the pipeline, the job worker and
+# every endpoint that changes data. `read_engine` is a pool of read-only
+# connections for the API's read endpoints (see get_read_db). With PostgreSQL,
+# both are the same engine.
+engine = _create_engine()
+# (An in-memory SQLite database exists once per connection, so it keeps one engine too.)
+read_engine = engine
+if _IS_SQLITE and ":memory:" not in Config.DATABASE_URL:
+    read_engine = _create_engine(read_only=True, pool_size=Config.DB_READ_POOL_SIZE)
+
+# SQLite allows a single writer at a time. Every writer in this process (the
+# persist stage of concurrent runs, digest rebuilds, the LLM cache, the PDF
+# store, job and job item updates, heartbeats, metrics snapshots, backfill
+# shards and the harvest mark) takes this lock around its transaction, so they
+# queue up here instead of failing on SQLite's lock; busy_timeout covers
+# writers in other processes.
+write_lock = threading.RLock()
+
+# --- 2. Create the Session Factories ---
 # sessionmaker creates a SessionLocal class. Instances of this class will be the
 # actual database sessions. You can think of it as a "session template".
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 # --- 3. Create a Declarative Base ---
 # Base is a class that our ORM models will inherit from.
@@ -24,17 +80,29 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # and associate them with their corresponding database tables.
 Base = declarative_base()
 
-# --- 4. Create a Database Session Dependency ---
-# This is a crucial function that will be used as a dependency in your API endpoints.
-# It ensures that each request gets an independent database session and that
-# the session is always closed after the request is finished.
+# --- 4. Create the Database Session Dependencies ---
+# These are used as dependencies in your API endpoints. They ensure that each
+# request gets an independent database session and that the session is always
+# closed after the request is finished.
 def get_db():
     """
-    A dependency function for FastAPI to get a database session.
+    A dependency function for FastAPI to get a (read-write) database session.
     It ensures the database session is always closed after the request is finished.
     """
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db():
+    """
+    Like get_db, but the session uses a read-only connection from the reader pool.
+    For endpoints that only read.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+
+
+class AffiliationDecisionLog:
+    """
+    An append-only JSON-lines log of affiliation decisions: for every paper
+    that reaches the LLM stage, the matcher's confidence, whether the LLM was
+    asked to verify the match, and what it answered. Reading it back with
+    `python decision_log.py` shows how often the LLM rejects matches at each
+    confidence level, which is what AFFILIATION_CONFIDENCE_THRESHOLD is tuned on.
+    """
+    def __init__(self, path: Optional[str]):
+        self.path = path or None
+        self._lock = threading.Lock()
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    def record(self, arxiv_id: str, match_reason: str, confidence: float, threshold: float,
+               verified: bool, decision: Optional[str]):
+        """
+        Appends one decision.
+
+        Args:
+            verified (bool): Whether the LLM was asked to confirm the affiliation
+                (False means the summary-only prompt was used).
+            decision (str): "MATCH", "NO_MATCH", or None if the LLM call failed.
+        """
+        if not self.path:
+            return
+        line = json.dumps({
+            "time": datetime.utcnow().isoformat(timespec="seconds"),
+            "arxiv_id": arxiv_id,
+            "match_reason": match_reason,
+            "confidence": confidence,
+            "threshold": threshold,
+            "tier": "verify" if verified else "summary_only",
+            "llm_decision": decision,
+        })
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"  -> [Warning] Could not write the affiliation decision log: {e}")
+
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Summarize the affiliation decision log per confidence level.")
+    parser.add_argument("path", nargs="?", default=Config.AFFILIATION_DECISION_LOG, help="The JSON-lines log file.")
+    args = parser.parse_args()
+
+    # confidence -> tier -> counts
+    buckets = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    with open(args.path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            buckets[entry["confidence"]][entry["tier"]][entry["llm_decision"] or "failed"] += 1
+
+    print(f"{'confidence':>10}  {'tier':<13}{'MATCH':>7}{'NO_MATCH':>10}{'failed':>8}  rejected")
+    for confidence in sorted(buckets, reverse=True):
+        for tier, counts in sorted(buckets[confidence].items()):
+            decided = counts["MATCH"] + counts["NO_MATCH"]
+            rejected = f"{counts['NO_MATCH'] / decided:.0%}" if tier == "verify" and decided else "-"
+            print(f"{confidence:>10.2f}  {tier:<13}{counts['MATCH']:>7}{counts['NO_MATCH']:>10}{counts['failed']:>8}  {rejected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import hashlib
+import html
+import json
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+
+from sqlalchemy.orm import Session, selectinload
+
+import models
+from database import engine, write_lock
+
+# --- Materialized daily digests ---
+# A digest is the list of papers published on one day, grouped by institution,
+# with their LLM summaries. It is built once when a run saves papers of that
+# day (see tasks.run_work_items) and stored as JSON, Markdown and HTML in the
+# 'digests' table, so serving it is a single primary-key lookup.
+
+ARXIV_ABS_URL = "https://arxiv.org/abs/"
+
+
+def ensure_table():
+    models.Digest.__table__.create(bind=engine, checkfirst=True)
+
+
+def build_digest(db: Session, day: date) -> dict:
+    """
+    Builds the digest document of a day from the stored papers.
+
+    Institutions are ordered by their number of papers (then by name), papers
+    by arXiv ID. A paper with several institutions is listed under each of them.
+    """
+    papers = (db.query(models.Paper)
+              .options(selectinload(models.Paper.institutions))
+              .filter(models.Paper.publish_date == day)
+              .order_by(models.Paper.arxiv_id)
+              .all())
+    groups = {}
+    for paper in papers:
+        entry = {"arxiv_id": paper.arxiv_id, "title": paper.title, "summary": paper.llm_summary,
+                 "url": ARXIV_ABS_URL + paper.arxiv_id}
+        for name in sorted(inst.name for inst in paper.institutions) or ["Other"]:
+            groups.setdefault(name, []).append(entry)
+    return {
+        "date": day.isoformat(),
+        "paper_count": len(papers),
+        "institutions": [{"name": name, "paper_count": len(entries), "papers": entries}
+                         for name, entries in sorted(groups.items(), key=lambda g: (-len(g[1]), g[0]))],
+    }
+
+
+def render_markdown(content: dict) -> str:
+    lines = [f"# LLM research digest: {content['date']}", "",
+             f"{content['paper_count']} papers from {len(content['institutions'])} institutions.", ""]
+    for institution in content["institutions"]:
+        lines.append(f"## {institution['name']} ({institution['paper_count']})")
+        lines.append("")
+        for paper in institution["papers"]:
+            summary = f": {paper['summary']}" if paper["summary"] else ""
+            lines.append(f"- [{paper['title']}]({paper['url']}){summary}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def render_html(content: dict) -> str:
+    title = f"LLM research digest: {content['date']}"
+    parts = [f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title></head><body>",
+             f"<h1>{html.escape(title)}</h1>",
+             f"<p>{content['paper_count']} papers from {len(content['institutions'])} institutions.</p>"]
+    for institution in content["institutions"]:
+        parts.append(f"<h2>{html.escape(institution['name'])} ({institution['paper_count']})</h2>\n<ul>")
+        for paper in institution["papers"]:
+            summary = f": {html.escape(paper['summary'])}" if paper["summary"] else ""
+            parts.append(f"<li><a href=\"{html.escape(paper['url'])}\">{html.escape(paper['title'])}</a>{summary}</li>")
+        parts.append("</ul>")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def refresh_digests(db: Session, days: Iterable[date]) -> int:
+    """
+    Rebuilds the digests of the given days (the days whose papers changed).
+    A digest whose content comes out the same keeps its etag and updated_at.
+    Days without papers get no digest.
+
+    Returns:
+        int: The number of digests created or changed.
+    """
+    ensure_table()
+    changed = 0
+    # Digests of the same day may be rebuilt by concurrent runs (e.g. hourly
+    # backfill shards); one rebuild at a time keeps the last write the newest.
+    with write_lock:
+        for day in sorted(set(days)):
+            content = build_digest(db, day)
+            if not content["paper_count"]:
+                continue
+            serialized = json.dumps(content, ensure_ascii=False)
+            etag = hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+            digest = db.get(models.Digest, day)
+            if digest is not None and digest.etag == etag:
+                continue
+            if digest is None:
+                digest = models.Digest(day=day)
+                db.add(digest)
+            digest.paper_count = content["paper_count"]
+            digest.content = serialized
+            digest.markdown = render_markdown(content)
+            digest.html = render_html(content)
+            digest.etag = etag
+            digest.updated_at = datetime.utcnow().replace(microsecond=0)
+            db.commit()
+            changed += 1
+    return changed
+
+
+def get_digest(db: Session, day: date) -> Optional[models.Digest]:
+    return db.get(models.Digest, day)
+
+
+# --- HTTP caching ---
+
+def last_modified(digest: models.Digest) -> str:
+    """The digest's updated_at as an HTTP date."""
+    return format_datetime(digest.updated_at.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def is_not_modified(etag: str, updated_at: datetime, if_none_match: Optional[str],
+                    if_modified_since: Optional[str]) -> bool:
+    """
+    Evaluates a conditional GET (RFC 9110): If-None-Match wins over
+    If-Modified-Since when both are sent.
+
+    Args:
+        etag (str): The quoted ETag of the representation.
+        updated_at (datetime): Its last modification, naive UTC.
+    """
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # GET compares weakly: W/"x" matches "x".
+        return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return updated_at.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+
+def main():
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rebuild the daily digests of a date range (e.g. after an upgrade).")
+    parser.add_argument("start_date", help="First day, YYYYMMDD.")
+    parser.add_argument("end_date", nargs="?", help="Last day, YYYYMMDD (defaults to start_date).")
+    args = parser.parse_args()
+
+    start = datetime.strptime(args.start_date, "%Y%m%d").date()
+    end = datetime.strptime(args.end_date, "%Y%m%d").date() if args.end_date else start
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    db = SessionLocal()
+    try:
+        changed = refresh_digests(db, days)
+    finally:
+        db.close()
+    print(f"Rebuilt {changed} of {len(days)} daily digests.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from config import Config
+from database import SessionLocal, engine, write_lock
+import models
+
+# The harvest_state row used by the cat:cs.* harvest.
+STATE_NAME = "cs"
+ARXIV_DATE_FORMAT = "%Y%m%d%H%M%S"
+
+# Only one incremental harvest may run at a time in this process, otherwise
+# two runs would start from the same mark and process the same papers.
+_run_lock = threading.Lock()
+
+
+def get_mark(name: str = STATE_NAME) -> Optional[Tuple[datetime, str]]:
+    """
+    Returns the stored (updated, arxiv_id) high-water mark, or None before the first run.
+    """
+    models.HarvestState.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        state = db.get(models.HarvestState, name)
+        return (state.last_updated, state.last_arxiv_id) if state else None
+    finally:
+        db.close()
+
+
+def save_mark(mark: Tuple[datetime, str], name: str = STATE_NAME):
+    db = SessionLocal()
+    try:
+        with write_lock:
+            db.merge(models.HarvestState(
+                name=name, last_updated=mark[0], last_arxiv_id=mark[1], last_run_at=datetime.utcnow(),
+            ))
+            db.commit()
+    finally:
+        db.close()
+
+
+def next_mark(stats, now: datetime) -> Optional[Tuple[datetime, str]]:
+    """
+    The mark to save after a run: the newest paper seen, but no further than
+    the oldest paper that failed, so the next run processes it again. Papers
+    that have been failing for more than HARVEST_FAILED_RETRY_HOURS are given up.
+    """
+    mark = stats.newest_seen
+    if mark is None:
+        return None
+    cutoff = now - timedelta(hours=Config.HARVEST_FAILED_RETRY_HOURS)
+    retryable = [position for position in stats.failed.values() if position[0] >= cutoff]
+    given_up = len(stats.failed) - len(retryable)
+    if given_up:
+        print(f"  -> [Warning] Giving up on {given_up} papers that failed more than "
+              f"{Config.HARVEST_FAILED_RETRY_HOURS}h after their update.")
+    if retryable:
+        # Just before the failed paper: the `after` filter keeps positions > mark.
+        oldest = min(retryable)
+        print(f"  -> {len(retryable)} papers failed; holding the mark before {oldest[1]} to retry them.")
+        mark = min(mark, (oldest[0], ""))
+    return mark
+
+
+def run_incremental_harvest(arxiv_client=None, downloader=None, run=None):
+    """
+    Processes the papers updated since the last run and moves the high-water
+    mark forward to the newest paper seen, or to just before the oldest paper
+    that failed (see next_mark).
+
+    The first run starts HARVEST_INITIAL_LOOKBACK_HOURS ago. Later runs query
+    arXiv from the stored mark (minus HARVEST_LOOKBACK_HOURS) up to now, so a
+    run every HARVEST_INTERVAL_MINUTES only fetches a few new papers. The mark
+    is only saved after a complete run; a failed run is simply repeated.
+
+    Args:
+        run (callable, optional): Processes the window, as run(date_start_str, date_end_str, after)
+            returning RunStats. Queued jobs pass one that records the papers as retryable
+            job items. Defaults to tasks.process_date_range.
+
+    Returns:
+        RunStats: The counts of the run, or None if another harvest was already running.
+    """
+    from tasks import process_date_range
+
+    if run is None:
+        def run(date_start_str, date_end_str, after):
+            return process_date_range(date_start_str, date_end_str, arxiv_client=arxiv_client,
+                                      downloader=downloader, strict=True, after=after)
+
+    if not _run_lock.acquire(blocking=False):
+        print("  -> [Warning] An incremental harvest is already running. Skipping this one.")
+        return None
+    try:
+        mark = get_mark()
+        now = datetime.utcnow()
+        if mark is None:
+            start = now - timedelta(hours=Config.HARVEST_INITIAL_LOOKBACK_HOURS)
+            after = None
+            print(f"--- Incremental harvest: no high-water mark yet, starting at {start:%Y-%m-%d %H:%M:%S} UTC ---")
+        else:
+            start = mark[0] - timedelta(hours=Config.HARVEST_LOOKBACK_HOURS)
+            # With a lookback, papers before the mark must not be skipped: that is the point of re-scanning.
+            after = None if Config.HARVEST_LOOKBACK_HOURS else mark
+            print(f"--- Incremental harvest: high-water mark {mark[0]:%Y-%m-%d %H:%M:%S} UTC ({mark[1]}) ---")
+
+        stats = run(start.strftime(ARXIV_DATE_FORMAT), now.strftime(ARXIV_DATE_FORMAT), after)
+
+        new_mark = next_mark(stats, now)
+        if new_mark is not None and (mark is None or new_mark > mark):
+            save_mark(new_mark)
+            print(f"--- High-water mark moved to {new_mark[0]:%Y-%m-%d %H:%M:%S} UTC ({new_mark[1] or 'before the failed papers'}) ---")
+        elif stats.failed:
+            print("--- High-water mark kept: failed papers will be retried ---")
+        else:
+            print("--- No new papers since the last harvest ---")
+        return stats
+    finally:
+        _run_lock.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process the arXiv papers updated since the last harvest.")
+    parser.add_argument("--loop", action="store_true", help="Keep harvesting at a fixed interval.")
+    parser.add_argument("--interval", type=int, default=None,
+                        help="Minutes between harvests with --loop (default: Config.HARVEST_INTERVAL_MINUTES).")
+    args = parser.parse_args()
+    Config.check_llm_settings()
+
+    if not args.loop:
+        run_incremental_harvest()
+        return
+
+    interval_seconds = (args.interval or Config.HARVEST_INTERVAL_MINUTES) * 60
+    while True:
+        started = time.monotonic()
+        try:
+            run_incremental_harvest()
+        except Exception as e:
+            # The mark was not moved, so the next run retries the same window.
+            print(f"  -> [Error] Incremental harvest failed: {e}")
+        time.sleep(max(interval_seconds - (time.monotonic() - started), 0))
+
+
+if __name__ == "__main__":
+    main()
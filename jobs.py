@@ -0,0 +1,433 @@
+import argparse
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import Config
+from database import SessionLocal, engine, write_lock
+import metrics
+import models
+import schema_upgrades
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def ensure_tables():
+    """Creates the job tables if they are missing (also for databases created before the queue existed)."""
+    models.Job.__table__.create(bind=engine, checkfirst=True)
+    models.JobItem.__table__.create(bind=engine, checkfirst=True)
+    schema_upgrades.upgrade_jobs_table(engine)
+
+
+# --- Queue operations (used by the API) ---
+
+def enqueue_job(db: Session, kind: str, params: dict, dedup_key: str) -> Tuple[models.Job, bool]:
+    """
+    Adds a job to the queue, unless a job with the same dedup_key is already
+    queued or running. The unique index on active dedup keys settles two
+    triggers that race: the second insert fails and returns the first job.
+
+    Returns:
+        tuple: (job, created). created is False when an existing job was returned.
+    """
+    existing = _active_job(db, dedup_key)
+    if existing:
+        return existing, False
+    job = models.Job(kind=kind, dedup_key=dedup_key, params=json.dumps(params), status="queued")
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing = _active_job(db, dedup_key)
+        if existing is None:
+            raise
+        return existing, False
+    db.refresh(job)
+    return job, True
+
+
+def _active_job(db: Session, dedup_key: str) -> Optional[models.Job]:
+    return (
+        db.query(models.Job)
+        .filter(models.Job.dedup_key == dedup_key, models.Job.status.in_(ACTIVE_STATUSES))
+        .order_by(models.Job.id)
+        .first()
+    )
+
+
+def get_job_progress(db: Session, job_id: int) -> Optional[dict]:
+    """
+    Returns the job's fields plus the number of its papers in each status, or None if there is no such job.
+    """
+    job = db.get(models.Job, job_id)
+    if job is None:
+        return None
+    counts = dict(
+        db.query(models.JobItem.status, func.count())
+        .filter(models.JobItem.job_id == job_id)
+        .group_by(models.JobItem.status)
+        .all()
+    )
+    return dict(
+        id=job.id, kind=job.kind, params=json.loads(job.params), status=job.status, attempts=job.attempts,
+        candidates=job.candidates or 0, downloads=job.downloads or 0, llm_calls=job.llm_calls or 0, saved=job.saved or 0,
+        items={status: counts.get(status, 0) for status in ("pending", "done", "dropped", "failed")},
+        error=job.error, summary=json.loads(job.summary) if job.summary else None, created_at=job.created_at, started_at=job.started_at,
+        heartbeat_at=job.heartbeat_at, finished_at=job.finished_at,
+    )
+
+
+# --- Worker side ---
+
+def _update_job(job_id: int, **fields):
+    db = SessionLocal()
+    try:
+        with write_lock:
+            db.query(models.Job).filter(models.Job.id == job_id).update(fields)
+            db.commit()
+    finally:
+        db.close()
+
+
+def requeue_stale_jobs() -> int:
+    """
+    Puts running jobs whose worker stopped sending heartbeats (e.g. it crashed
+    or was restarted) back into the queue, or fails them after JOB_MAX_ATTEMPTS runs.
+
+    Returns:
+        int: The number of jobs requeued or failed.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=Config.JOB_STALE_SECONDS)
+    db = SessionLocal()
+    try:
+        with write_lock:
+            stale = db.query(models.Job).filter(models.Job.status == "running", models.Job.heartbeat_at < cutoff).all()
+            for job in stale:
+                if job.attempts >= Config.JOB_MAX_ATTEMPTS:
+                    job.status, job.finished_at = "failed", datetime.utcnow()
+                    job.error = f"Worker {job.worker_id} stopped responding ({job.attempts} attempts)."
+                else:
+                    print(f"  -> [Warning] Job {job.id} lost its worker {job.worker_id}. Requeuing it.")
+                    job.status, job.worker_id = "queued", None
+            db.commit()
+        return len(stale)
+    finally:
+        db.close()
+
+
+def claim_next_job(worker_id: str) -> Optional[int]:
+    """
+    Atomically moves the oldest queued job to 'running' for this worker.
+    Several worker processes may poll the same queue.
+
+    Returns:
+        int: The claimed job ID, or None if the queue is empty.
+    """
+    db = SessionLocal()
+    try:
+        while True:
+            candidate = (
+                db.query(models.Job.id).filter(models.Job.status == "queued").order_by(models.Job.id).first()
+            )
+            if candidate is None:
+                return None
+            now = datetime.utcnow()
+            with write_lock:
+                claimed = (
+                    db.query(models.Job)
+                    .filter(models.Job.id == candidate.id, models.Job.status == "queued")
+                    .update(dict(status="running", worker_id=worker_id, started_at=now, heartbeat_at=now,
+                                 attempts=models.Job.attempts + 1), synchronize_session=False)
+                )
+                db.commit()
+            if claimed:
+                return candidate.id
+            # Another worker took it first; try the next one.
+    finally:
+        db.close()
+
+
+class _Heartbeat:
+    """
+    Updates a running job's heartbeat_at from a background thread, and
+    publishes the worker's metrics at the same interval.
+    """
+    def __init__(self, job_id: int, worker_id: str):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"job-{job_id}-heartbeat", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(Config.JOB_HEARTBEAT_SECONDS):
+            try:
+                _update_job(self.job_id, heartbeat_at=datetime.utcnow())
+                metrics.publish_snapshot(self.worker_id)
+            except Exception as e:
+                print(f"  -> [Warning] Could not update the heartbeat of job {self.job_id}: {e}")
+
+
+# --- Per-paper work items ---
+
+def _paper_to_json(paper) -> str:
+    return json.dumps(dict(
+        entry_id=paper.entry_id, title=paper.title, summary=paper.summary,
+        published=paper.published.isoformat(), updated=paper.updated.isoformat(),
+    ))
+
+
+def _paper_from_json(data: str):
+    import arxiv
+
+    fields = json.loads(data)
+    return arxiv.Result(
+        entry_id=fields["entry_id"], title=fields["title"], summary=fields["summary"],
+        published=datetime.fromisoformat(fields["published"]), updated=datetime.fromisoformat(fields["updated"]),
+        links=[],
+    )
+
+
+class JobItemTracker:
+    """
+    Records the papers of a job in the 'job_items' table and their outcome in
+    the pipeline, so that failed papers can be retried on their own.
+    """
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+
+    def record(self, work_items: Iterable["PaperWorkItem"]) -> Iterator["PaperWorkItem"]:
+        """
+        Stores each harvested paper as a job item and passes it on, unless an
+        earlier run of the job already finished it.
+        """
+        for item in work_items:
+            db = SessionLocal()
+            try:
+                with write_lock:
+                    row = (
+                        db.query(models.JobItem)
+                        .filter(models.JobItem.job_id == self.job_id, models.JobItem.arxiv_id == item.short_id)
+                        .first()
+                    )
+                    if row is None:
+                        row = models.JobItem(job_id=self.job_id, arxiv_id=item.short_id, paper=_paper_to_json(item.paper))
+                        db.add(row)
+                    elif row.status in ("done", "dropped") or row.attempts >= Config.JOB_ITEM_MAX_ATTEMPTS:
+                        continue
+                    row.status, row.attempts, row.updated_at = "pending", (row.attempts or 0) + 1, datetime.utcnow()
+                    db.commit()
+                item.job_item_id = row.id
+            except IntegrityError:
+                db.rollback()
+                continue
+            finally:
+                db.close()
+            yield item
+
+    def retryable_items(self) -> List["PaperWorkItem"]:
+        """
+        Builds fresh work items for the job's failed (or never finished) papers
+        that still have attempts left, and counts the new attempt.
+        """
+        from arxiv_client import split_arxiv_id
+        from tasks import PaperWorkItem
+        import crud
+
+        db = SessionLocal()
+        try:
+            with write_lock:
+                rows = (
+                    db.query(models.JobItem)
+                    .filter(models.JobItem.job_id == self.job_id,
+                            models.JobItem.status.in_(("pending", "failed")),
+                            models.JobItem.attempts < Config.JOB_ITEM_MAX_ATTEMPTS)
+                    .all()
+                )
+                ids = {row.arxiv_id: split_arxiv_id(row.arxiv_id) for row in rows}
+                known = crud.get_known_versions(db, (base_id for base_id, _ in ids.values()))
+                items = []
+                for row in rows:
+                    base_id, version = ids[row.arxiv_id]
+                    previous = known.get(base_id)
+                    if previous is not None and (previous.version or 0) >= version:
+                        row.status, row.error = "done", None  # Saved by another run in the meantime
+                        continue
+                    row.status, row.attempts, row.updated_at = "pending", row.attempts + 1, datetime.utcnow()
+                    items.append(PaperWorkItem(paper=_paper_from_json(row.paper), short_id=row.arxiv_id, base_id=base_id,
+                                               version=version, previous=previous, job_item_id=row.id))
+                db.commit()
+            return items
+        finally:
+            db.close()
+
+    def item_done(self, item: "PaperWorkItem", outcome: str, error: Optional[str]):
+        """The pipeline's on_item_done callback."""
+        if item.job_item_id is None:
+            return
+        if outcome == "dropped" and item.error:
+            outcome, error = "failed", item.error
+        db = SessionLocal()
+        try:
+            with write_lock:
+                db.query(models.JobItem).filter(models.JobItem.id == item.job_item_id).update(
+                    dict(status=outcome, error=error, updated_at=datetime.utcnow())
+                )
+                db.commit()
+        finally:
+            db.close()
+
+
+# --- Running jobs ---
+
+def _run_tracked_range(job: models.Job, date_start: str, date_end: str,
+                       after: Optional[Tuple[datetime, str]] = None) -> "RunStats":
+    """
+    Harvests and processes one date range, recording every paper as a job item,
+    then retries the failed papers up to JOB_ITEM_MAX_ATTEMPTS times in total.
+    A job that was interrupted skips the papers that already finished.
+    Used by date jobs and incremental jobs.
+
+    Returns:
+        RunStats: The counts of this attempt; `failed` holds the papers that are still failing.
+    """
+    from arxiv_client import ArxivClient
+    from async_downloader import BackgroundPdfDownloader
+    from tasks import RunStats, harvest_work_items, prepare_database, run_work_items
+
+    prepare_database()
+    config_instance = Config()
+    tracker = JobItemTracker(job.id)
+    run_stats = RunStats(candidates=job.candidates or 0)
+    # Each job gets its own download directory, so concurrent jobs never share temp files.
+    job_dir = os.path.join(Config.TEMP_DOWNLOAD_DIR, f"job-{job.id}")
+    downloader = BackgroundPdfDownloader(config_instance)
+    try:
+        if not job.harvested:
+            run_stats.candidates = 0
+            work_items = harvest_work_items(ArxivClient(config_instance), date_start, date_end,
+                                            run_stats, strict=True, after=after)
+            run_work_items(tracker.record(work_items), run_stats, downloader=downloader, download_dir=job_dir,
+                           on_item_done=tracker.item_done)
+            _update_job(job.id, harvested=True, candidates=run_stats.candidates)
+
+        for _ in range(Config.JOB_ITEM_MAX_ATTEMPTS):
+            retry_items = tracker.retryable_items()
+            if not retry_items:
+                break
+            print(f"--- Job {job.id}: retrying {len(retry_items)} papers ---")
+            run_work_items(retry_items, run_stats, downloader=downloader, download_dir=job_dir,
+                           on_item_done=tracker.item_done)
+    finally:
+        downloader.close()
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+    _update_job(job.id, downloads=(job.downloads or 0) + run_stats.downloads,
+                llm_calls=(job.llm_calls or 0) + run_stats.llm_calls, saved=(job.saved or 0) + run_stats.saved)
+    return run_stats
+
+
+def run_job(job_id: int):
+    """
+    Runs a claimed job to completion and records whether it succeeded.
+    """
+    db = SessionLocal()
+    try:
+        job = db.get(models.Job, job_id)
+        db.expunge(job)
+    finally:
+        db.close()
+
+    params = json.loads(job.params)
+    print(f"--- Job {job.id} ({job.kind}, attempt {job.attempts}) started: {params} ---")
+    metrics_before = metrics.REGISTRY.snapshot()
+    started = time.monotonic()
+    try:
+        with _Heartbeat(job.id, job.worker_id):
+            if job.kind == "date":
+                _run_tracked_range(job, params["date_start"], params["date_end"])
+            elif job.kind == "incremental":
+                import harvester
+                # Failed papers are retried as job items; any still failing hold the mark back.
+                harvester.run_incremental_harvest(run=lambda start, end, after: _run_tracked_range(job, start, end, after))
+            elif job.kind == "backfill":
+                import backfill
+                backfill.run_backfill(params["start_date"], params["end_date"], params["granularity"])
+            else:
+                raise ValueError(f"Unknown job kind {job.kind!r}.")
+    except Exception as e:
+        print(f"  -> [Error] Job {job.id} failed: {e}")
+        summary = _run_summary(job, "failed", started, metrics_before)
+        _update_job(job.id, status="failed", error=str(e), finished_at=datetime.utcnow(), summary=summary)
+        return
+    summary = _run_summary(job, "done", started, metrics_before)
+    _update_job(job.id, status="done", error=None, finished_at=datetime.utcnow(), summary=summary)
+    print(f"--- Job {job.id} done ---")
+
+
+def _run_summary(job: models.Job, status: str, started: float, metrics_before: dict) -> str:
+    """
+    Builds the JSON run summary of a job attempt, prints it as one line (for
+    log collectors) and publishes the worker's metrics.
+    """
+    summary = json.dumps(dict(
+        job_id=job.id, kind=job.kind, attempt=job.attempts, status=status,
+        duration_seconds=round(time.monotonic() - started, 3),
+        metrics=metrics.run_summary(metrics_before, metrics.REGISTRY.snapshot()),
+    ))
+    print(f"RUN SUMMARY {summary}")
+    try:
+        metrics.publish_snapshot(job.worker_id)
+    except Exception as e:
+        print(f"  -> [Warning] Could not publish the worker metrics: {e}")
+    return summary
+
+
+def run_worker(worker_id: Optional[str] = None, once: bool = False):
+    """
+    Polls the queue and runs jobs one at a time until interrupted (or, with
+    once=True, until the queue is empty).
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    ensure_tables()
+    metrics.ensure_table()
+    print(f"--- Worker {worker_id} polling the job queue every {Config.JOB_POLL_SECONDS:g}s ---")
+    while True:
+        requeue_stale_jobs()
+        job_id = claim_next_job(worker_id)
+        if job_id is None:
+            if once:
+                return
+            time.sleep(Config.JOB_POLL_SECONDS)
+            continue
+        run_job(job_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued processing jobs (start one or more of these next to the API).")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty instead of polling.")
+    parser.add_argument("--worker-id", default=None, help="Name shown in job status (default: host-pid).")
+    args = parser.parse_args()
+    Config.check_llm_settings()
+    run_worker(args.worker_id, once=args.once)
+
+
+if __name__ == "__main__":
+    main()
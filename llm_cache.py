@@ -0,0 +1,217 @@
+import argparse
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from database import SessionLocal, engine, write_lock
+import models
+
+
+class LLMResponseCache:
+    """
+    A persistent, content-addressed cache of LLM decisions, stored in the
+    'llm_cache' table of the application database.
+
+    Entries are keyed by a hash of the extracted text, Config.MODEL_NAME,
+    Config.PROMPT_VERSION and Config.TARGET_INSTITUTIONS (which the prompts
+    list), so re-runs and backfills that see the same text again make no LLM
+    call. Entries expire after LLM_CACHE_TTL_DAYS, and the least recently used
+    entries are evicted once there are more than LLM_CACHE_MAX_ENTRIES.
+    Bumping PROMPT_VERSION, or changing the institutions, invalidates all older entries.
+    """
+    # Run the (comparatively expensive) eviction pass once every N writes.
+    EVICT_EVERY_N_PUTS = 100
+    # Write the access times of cache hits once every N hits (and before an eviction).
+    TOUCH_EVERY_N_HITS = 50
+
+    def __init__(self, config, session_factory=SessionLocal):
+        self.config = config
+        self.model_name = config.MODEL_NAME
+        self.prompt_version = config.PROMPT_VERSION
+        self.ttl = timedelta(days=config.LLM_CACHE_TTL_DAYS)
+        self.max_entries = config.LLM_CACHE_MAX_ENTRIES
+        self.institutions_hash = hashlib.sha256("\0".join(config.TARGET_INSTITUTIONS).encode("utf-8")).hexdigest()
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self._touched = {}  # key -> last access not yet written
+        self.hits = 0
+        self.misses = 0
+        # Make sure the table exists, also for databases created before the cache was added.
+        models.LLMCacheEntry.__table__.create(bind=engine, checkfirst=True)
+
+    def make_key(self, paper_text: str, prompt_kind: str = "verify_and_summarize") -> str:
+        """
+        Builds the cache key for a text under the current model, prompt version and institution list.
+        """
+        digest = hashlib.sha256()
+        for part in (self.model_name, self.prompt_version, self.institutions_hash, prompt_kind, paper_text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, paper_text: str, prompt_kind: str = "verify_and_summarize") -> Optional[Tuple[bool, Optional[str]]]:
+        """
+        Returns the cached (is_match, summary) for a text, or None on a miss.
+        A hit only records its access time in memory (see flush_access_times).
+        """
+        key = self.make_key(paper_text, prompt_kind)
+        db = self._session_factory()
+        try:
+            entry = db.get(models.LLMCacheEntry, key)
+            now = datetime.utcnow()
+            if entry is None or entry.created_at < now - self.ttl:
+                with self._lock:
+                    self.misses += 1
+                return None
+            with self._lock:
+                self.hits += 1
+                self._touched[key] = now
+                flush = len(self._touched) >= self.TOUCH_EVERY_N_HITS
+            if flush:
+                self.flush_access_times()
+            return entry.is_match, entry.summary
+        except SQLAlchemyError as e:
+            # The cache must never break processing: treat errors as a miss.
+            print(f"  -> [Warning] LLM cache lookup failed: {e}")
+            db.rollback()
+            with self._lock:
+                self.misses += 1
+            return None
+        finally:
+            db.close()
+
+    def put(self, paper_text: str, result: Tuple[bool, Optional[str]], prompt_kind: str = "verify_and_summarize"):
+        """
+        Stores an (is_match, summary) result for a text. Only successful LLM
+        decisions should be cached, never failed calls.
+        """
+        is_match, summary = result
+        now = datetime.utcnow()
+        db = self._session_factory()
+        try:
+            with write_lock:
+                db.merge(models.LLMCacheEntry(
+                    key=self.make_key(paper_text, prompt_kind),
+                    model_name=self.model_name,
+                    prompt_version=self.prompt_version,
+                    is_match=is_match,
+                    summary=summary,
+                    created_at=now,
+                    last_accessed_at=now,
+                ))
+                db.commit()
+        except IntegrityError:
+            # Another worker stored the same text at the same time; keep its entry.
+            db.rollback()
+        except SQLAlchemyError as e:
+            print(f"  -> [Warning] Could not store LLM response in the cache: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+        with self._lock:
+            self._puts_since_evict += 1
+            run_eviction = self._puts_since_evict >= self.EVICT_EVERY_N_PUTS
+            if run_eviction:
+                self._puts_since_evict = 0
+        if run_eviction:
+            self.evict()
+
+    def flush_access_times(self):
+        """Writes the access times of the hits since the last flush, in one transaction."""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return
+        db = self._session_factory()
+        try:
+            with write_lock:
+                Entry = models.LLMCacheEntry
+                for key, accessed_at in touched.items():
+                    db.query(Entry).filter(Entry.key == key).update(
+                        {Entry.last_accessed_at: accessed_at}, synchronize_session=False)
+                db.commit()
+        except SQLAlchemyError as e:
+            print(f"  -> [Warning] Could not record LLM cache access times: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    def evict(self) -> int:
+        """
+        Deletes expired entries, then the least recently used entries beyond
+        the size limit.
+
+        Returns:
+            int: The number of deleted entries.
+        """
+        self.flush_access_times()
+        db = self._session_factory()
+        try:
+            Entry = models.LLMCacheEntry
+            with write_lock:
+                deleted = db.query(Entry).filter(Entry.created_at < datetime.utcnow() - self.ttl).delete(synchronize_session=False)
+                overflow = db.query(Entry).count() - self.max_entries
+                if overflow > 0:
+                    oldest_keys = db.query(Entry.key).order_by(Entry.last_accessed_at.asc()).limit(overflow).subquery()
+                    deleted += db.query(Entry).filter(Entry.key.in_(oldest_keys.select())).delete(synchronize_session=False)
+                db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    def invalidate(self, prompt_version: Optional[str] = None, all_entries: bool = False) -> int:
+        """
+        Deletes cached entries. By default removes every entry that was not
+        produced by the current prompt version; pass prompt_version to remove
+        one specific version, or all_entries=True to clear the cache.
+
+        Returns:
+            int: The number of deleted entries.
+        """
+        db = self._session_factory()
+        try:
+            query = db.query(models.LLMCacheEntry)
+            if not all_entries:
+                if prompt_version is None:
+                    query = query.filter(models.LLMCacheEntry.prompt_version != self.prompt_version)
+                else:
+                    query = query.filter(models.LLMCacheEntry.prompt_version == prompt_version)
+            with write_lock:
+                deleted = query.delete(synchronize_session=False)
+                db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    def stats_line(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total else 0.0
+        return f"LLM cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate)"
+
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Manage the persistent LLM response cache.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    invalidate_parser = subparsers.add_parser("invalidate", help="Delete cached entries (default: all entries from older prompt versions).")
+    invalidate_parser.add_argument("--prompt-version", help="Only delete entries produced by this prompt version.")
+    invalidate_parser.add_argument("--all", action="store_true", help="Delete every cached entry.")
+    subparsers.add_parser("evict", help="Delete expired entries and enforce the size limit.")
+    args = parser.parse_args()
+
+    cache = LLMResponseCache(Config())
+    if args.command == "invalidate":
+        deleted = cache.invalidate(prompt_version=args.prompt_version, all_entries=args.all)
+    else:
+        deleted = cache.evict()
+    print(f"Deleted {deleted} cache entries.")
+
+
+if __name__ == "__main__":
+    main()
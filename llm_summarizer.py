@@ -1,22 +1,79 @@
 from google import genai
+import json
 import sys
+import threading
 import time
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+from rate_limit import FATAL, THROTTLED, classify_error, get_rate_controller
+
+# JSON schema for batched responses: one object per paper, keyed by arXiv ID.
+BATCH_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "arxiv_id": {"type": "STRING"},
+            "decision": {"type": "STRING", "enum": ["MATCH", "NO_MATCH"]},
+            "summary": {"type": "STRING"},
+        },
+        "required": ["arxiv_id", "decision"],
+    },
+}
+
+# JSON schema for batched summary-only responses (see SUMMARIZE).
+BATCH_SUMMARY_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "arxiv_id": {"type": "STRING"},
+            "summary": {"type": "STRING"},
+        },
+        "required": ["arxiv_id", "summary"],
+    },
+}
+
+EMPTY_SUMMARY_PLACEHOLDER = "[LLM Summary generation failed or was empty]"
+
+# Prompt kinds. VERIFY_AND_SUMMARIZE asks the model to confirm the affiliation
+# and summarize; SUMMARIZE only asks for the summary, for papers whose
+# affiliation match is already certain (see PdfAnalysis.affiliation_confidence).
+VERIFY_AND_SUMMARIZE = "verify_and_summarize"
+SUMMARIZE = "summarize"
 
 class LLMSummarizer:
     """
     A client to interact with a Large Language Model (LLM) for summarization
-    and affiliation confirmation, with built-in retry logic for rate limiting.
+    and affiliation confirmation. All calls go through a shared, adaptive rate limiter.
     """
-    def __init__(self, config):
+    def __init__(self, config, llm_client=None, cache=None, rate_controller=None):
         """
         Initializes the LLMSummarizer with a configuration object and sets up the LLM client.
         
         Args:
             config: An instance of the Config class.
+            llm_client: An optional, already constructed client (e.g. a fake
+                genai.Client in tests). If omitted, a genai.Client is created.
+            cache: An optional LLMResponseCache. Texts found in it are not sent to the LLM.
+            rate_controller: The LLMRateController to call through. Defaults to
+                the one shared by the whole process.
         """
         self.config = config
-        self.llm_client = None
-        self._initialize_client()
+        self.llm_client = llm_client
+        self.cache = cache
+        self.rate_controller = rate_controller or get_rate_controller(config)
+        # Number of generate_content requests sent, including retries.
+        self.llm_calls = 0
+        # Estimated input tokens of those requests (prompts included).
+        self.input_tokens = 0
+        self._calls_lock = threading.Lock()
+        self.model_name_for_call = f"models/{self.config.MODEL_NAME}"
+        # The institution list is the same for every prompt, so build it once.
+        self._institutions_str = ", ".join([f'"{inst}"' for inst in self.config.TARGET_INSTITUTIONS])
+        if self.llm_client is None:
+            self._initialize_client()
 
     def _initialize_client(self):
         """
@@ -34,32 +91,15 @@ class LLMSummarizer:
             print(f"Fatal error: Failed to initialize Gemini Client within LLMSummarizer: {e}")
             sys.exit(1)
 
-    def process_text(self, paper_text, max_retries=3):
-        """
-        Processes a given text with the LLM to get a summary and an affiliation match decision.
-        Includes retry logic for handling API rate limits (429 errors).
-        
-        Args:
-            paper_text (str): The text extracted from a paper PDF.
-            max_retries (int): The maximum number of times to retry on failure.
-            
-        Returns:
-            tuple: A tuple containing (is_match (bool), summary (str or None)).
-        """
-        if not self.llm_client:
-            print("[Warning] LLM client is not initialized. Skipping processing.")
-            return False, None
-
-        institutions_str = ", ".join([f'"{inst}"' for inst in self.config.TARGET_INSTITUTIONS])
-        
-        prompt = f"""
+    def _build_prompt(self, paper_text: str) -> str:
+        return f"""
         Analyze the following paper text:
         --- Paper Text ---
         {paper_text}
         --- End Paper Text ---
 
         Please complete the following tasks:
-        1.  **Affiliation Check:** Does the text mention affiliations explicitly matching any of these institutions or their common variations: {institutions_str}? Respond ONLY with "MATCH" or "NO_MATCH".
+        1.  **Affiliation Check:** Does the text mention affiliations explicitly matching any of these institutions or their common variations: {self._institutions_str}? Respond ONLY with "MATCH" or "NO_MATCH".
         2.  **Summary:** If Task 1 is "MATCH", please provide a concise (3-5 sentences) summary in English of the paper's core idea and main contributions. If Task 1 is "NO_MATCH", omit this part.
 
         Output Format Requirements:
@@ -74,38 +114,288 @@ class LLMSummarizer:
 
         NO_MATCH
         """
-        
-        model_name_for_call = f"models/{self.config.MODEL_NAME}"
-        print(f"Call LLM (Model: {model_name_for_call})...")
 
+    def _build_summary_prompt(self, paper_text: str) -> str:
+        return f"""
+        Summarize the following paper in English in 3-5 concise sentences, covering its core idea and main contributions.
+        --- Paper Text ---
+        {paper_text}
+        --- End Paper Text ---
+
+        Output only the summary.
+        """
+
+    def _build_batch_summary_prompt(self, papers: List[Tuple[str, str]]) -> str:
+        paper_sections = "\n".join(
+            f"--- Paper {arxiv_id} ---\n{paper_text}\n--- End Paper {arxiv_id} ---" for arxiv_id, paper_text in papers
+        )
+        return f"""
+        Summarize each of the following {len(papers)} papers independently in English in 3-5 concise sentences,
+        covering its core idea and main contributions. Each paper is delimited by
+        "--- Paper <arxiv_id> ---" and "--- End Paper <arxiv_id> ---".
+
+        {paper_sections}
+
+        Output Format Requirements:
+        - Return a JSON array with exactly one object per paper: {{"arxiv_id": "<arxiv_id>", "summary": "<summary>"}}.
+        - Use the arxiv_id exactly as given in the paper delimiters.
+        """
+
+    def _build_batch_prompt(self, papers: List[Tuple[str, str]]) -> str:
+        paper_sections = "\n".join(
+            f"--- Paper {arxiv_id} ---\n{paper_text}\n--- End Paper {arxiv_id} ---" for arxiv_id, paper_text in papers
+        )
+        return f"""
+        Analyze each of the following {len(papers)} papers independently. Each paper is delimited by
+        "--- Paper <arxiv_id> ---" and "--- End Paper <arxiv_id> ---".
+
+        {paper_sections}
+
+        For EACH paper, complete the following tasks:
+        1.  **Affiliation Check:** Does the text mention affiliations explicitly matching any of these institutions or their common variations: {self._institutions_str}? Answer "MATCH" or "NO_MATCH".
+        2.  **Summary:** If Task 1 is "MATCH", provide a concise (3-5 sentences) summary in English of the paper's core idea and main contributions. If Task 1 is "NO_MATCH", leave the summary empty.
+
+        Output Format Requirements:
+        - Return a JSON array with exactly one object per paper: {{"arxiv_id": "<arxiv_id>", "decision": "MATCH" or "NO_MATCH", "summary": "<summary>"}}.
+        - Use the arxiv_id exactly as given in the paper delimiters.
+        """
+
+    def _generate(self, contents: str, max_retries: Optional[int], generation_config: Optional[dict] = None) -> Optional[str]:
+        """
+        Calls the model within the shared rate limiter and returns the stripped
+        response text. 429s, 5xx and network errors are retried with backoff
+        (up to max_retries attempts, default Config.LLM_MAX_RETRIES).
+        Returns None if the call failed.
+        """
+        max_retries = max_retries or self.config.LLM_MAX_RETRIES
+        estimated_tokens = len(contents) // 4 + 1
         for attempt in range(max_retries):
-            try:
-                response = self.llm_client.models.generate_content(
-                    model=model_name_for_call,
-                    contents=prompt
-                )
-                
-                response_text = response.text.strip()
-                parts = response_text.split('\n', 1)
-                decision = parts[0].strip().upper()
-
-                if decision == "MATCH":
-                    summary = parts[1].strip() if len(parts) > 1 and parts[1].strip() else "[LLM Summary generation failed or was empty]"
-                    return True, summary
-                elif decision == "NO_MATCH":
-                    return False, None
-                else:
-                    print(f"  -> [Warning] Unrecognized API response: {response_text[:50]}...")
-                    return False, None
-
-            except Exception as e:
-                # Check if it's a rate limit error and if we can still retry
-                if "429" in str(e) and attempt < max_retries - 1:
-                    # Exponential backoff: wait longer after each failed attempt
-                    delay = 5 * (2 ** attempt)  # 5s, 10s, 20s...
-                    print(f"  -> [Info] Rate limit hit. Retrying in {delay} seconds... (Attempt {attempt + 1}/{max_retries})")
-                    time.sleep(delay)
+            backoff = None
+            with self.rate_controller.slot(estimated_tokens) as ticket:
+                with self._calls_lock:
+                    self.llm_calls += 1
+                    self.input_tokens += estimated_tokens
+                metrics.LLM_CALLS.inc()
+                metrics.LLM_INPUT_CHARS.inc(len(contents))
+                try:
+                    kwargs = {"config": generation_config} if generation_config else {}
+                    with metrics.LLM_SECONDS.time():
+                        response = self.llm_client.models.generate_content(
+                            model=self.model_name_for_call,
+                            contents=contents,
+                            **kwargs
+                        )
+                    usage = getattr(response, "usage_metadata", None)
+                    self.rate_controller.on_success(ticket, getattr(usage, "total_token_count", None))
+                    return (response.text or "").strip()
+
+                except Exception as e:
+                    kind, retry_after = classify_error(e)
+                    metrics.LLM_ERRORS.inc(kind=kind)
+                    if kind == FATAL:
+                        print(f"[Warning] Gemini API call failed on attempt {attempt + 1}: {e}")
+                        return None
+                    if kind == THROTTLED:
+                        # Pauses every caller of the process, not just this one.
+                        delay = self.rate_controller.on_throttle(ticket, attempt, retry_after)
+                    else:
+                        delay = backoff = self.rate_controller.on_transient_error(attempt, retry_after)
+                    if attempt == max_retries - 1:
+                        print(f"[Warning] Gemini API call failed on attempt {attempt + 1}, giving up: {e}")
+                        return None
+                    if kind == THROTTLED:
+                        print(f"  -> [Info] Rate limit hit. All LLM calls paused for {delay:.1f} seconds... (Attempt {attempt + 1}/{max_retries})")
+                    else:
+                        print(f"  -> [Info] Gemini API error ({e}). Retrying in {delay:.1f} seconds... (Attempt {attempt + 1}/{max_retries})")
+            if backoff:
+                # Sleep outside the slot. Throttled calls wait in the limiter instead, together with everyone else.
+                time.sleep(backoff)
+        return None
+
+    def process_text(self, paper_text, max_retries=None, prompt_kind=VERIFY_AND_SUMMARIZE):
+        """
+        Processes a given text with the LLM to get a summary and an affiliation match decision.
+        Calls go through the shared rate limiter and are retried on 429s and
+        transient errors. Results
+        are served from / stored in the response cache when one is configured.
+        
+        Args:
+            paper_text (str): The text extracted from a paper PDF.
+            max_retries (int): The maximum number of attempts (default Config.LLM_MAX_RETRIES).
+            prompt_kind (str): VERIFY_AND_SUMMARIZE, or SUMMARIZE to skip the
+                affiliation check (the result is then always a match).
+            
+        Returns:
+            tuple: A tuple containing (is_match (bool), summary (str or None)).
+        """
+        if not self.llm_client:
+            print("[Warning] LLM client is not initialized. Skipping processing.")
+            return False, None
+
+        if self.cache:
+            cached = self.cache.get(paper_text, prompt_kind)
+            if cached is not None:
+                return cached
+        result = self._process_and_cache(paper_text, max_retries, prompt_kind)
+        return result if result is not None else (False, None)
+
+    def _process_and_cache(self, paper_text: str, max_retries: Optional[int],
+                           prompt_kind: str = VERIFY_AND_SUMMARIZE) -> Optional[Tuple[bool, Optional[str]]]:
+        """
+        Calls the LLM for a single paper and caches the decision if the call succeeded.
+        Returns None if the call failed.
+        """
+        result = self._process_uncached(paper_text, max_retries, prompt_kind)
+        if result is None:
+            return None
+        if self.cache:
+            self.cache.put(paper_text, result, prompt_kind)
+        return result
+
+    def _process_uncached(self, paper_text: str, max_retries: Optional[int],
+                          prompt_kind: str = VERIFY_AND_SUMMARIZE) -> Optional[Tuple[bool, Optional[str]]]:
+        """
+        Calls the LLM for a single paper. Returns None if the call failed or
+        the response was not understood (such results must not be cached).
+        """
+        print(f"Call LLM (Model: {self.model_name_for_call}, {prompt_kind})...")
+        if prompt_kind == SUMMARIZE:
+            response_text = self._generate(self._build_summary_prompt(paper_text), max_retries)
+            if response_text is None:
+                return None
+            return True, response_text or EMPTY_SUMMARY_PLACEHOLDER
+
+        response_text = self._generate(self._build_prompt(paper_text), max_retries)
+        if response_text is None:
+            return None
+
+        parts = response_text.split('\n', 1)
+        decision = parts[0].strip().upper()
+
+        if decision == "MATCH":
+            summary = parts[1].strip() if len(parts) > 1 and parts[1].strip() else EMPTY_SUMMARY_PLACEHOLDER
+            return True, summary
+        elif decision == "NO_MATCH":
+            return False, None
+        else:
+            print(f"  -> [Warning] Unrecognized API response: {response_text[:50]}...")
+            return None
+
+    def _split_into_batches(self, papers: List[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+        """
+        Groups papers into batches bounded by LLM_BATCH_MAX_PAPERS and by an
+        estimated input-token budget (about 4 characters per token).
+        """
+        batches, current, current_tokens = [], [], 0
+        for arxiv_id, paper_text in papers:
+            tokens = len(paper_text) // 4 + 1
+            if current and (len(current) >= self.config.LLM_BATCH_MAX_PAPERS or
+                            current_tokens + tokens > self.config.LLM_BATCH_TOKEN_BUDGET):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append((arxiv_id, paper_text))
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _parse_batch_response(self, response_text: Optional[str], expected_ids: List[str],
+                              prompt_kind: str = VERIFY_AND_SUMMARIZE) -> Dict[str, Tuple[bool, Optional[str]]]:
+        """
+        Splits a batched JSON response back into per-paper (is_match, summary) results.
+        Entries that are missing or malformed are left out.
+        """
+        if not response_text:
+            return {}
+        try:
+            entries = json.loads(response_text)
+        except ValueError:
+            print(f"  -> [Warning] Could not parse batched API response: {response_text[:50]}...")
+            return {}
+        if not isinstance(entries, list):
+            return {}
+
+        results = {}
+        for entry in entries:
+            if not isinstance(entry, dict) or entry.get("arxiv_id") not in expected_ids:
+                continue
+            if prompt_kind == SUMMARIZE:
+                results[entry["arxiv_id"]] = (True, str(entry.get("summary") or "").strip() or EMPTY_SUMMARY_PLACEHOLDER)
+                continue
+            decision = str(entry.get("decision", "")).strip().upper()
+            if decision == "MATCH":
+                summary = str(entry.get("summary") or "").strip() or EMPTY_SUMMARY_PLACEHOLDER
+                results[entry["arxiv_id"]] = (True, summary)
+            elif decision == "NO_MATCH":
+                results[entry["arxiv_id"]] = (False, None)
+        return results
+
+    def process_batch(self, papers: List[Tuple[str, str]], max_retries=None,
+                      prompt_kind=VERIFY_AND_SUMMARIZE) -> Dict[str, Tuple[bool, Optional[str]]]:
+        """
+        Processes several papers with as few LLM calls as possible. Papers are
+        packed into batches (bounded by Config.LLM_BATCH_TOKEN_BUDGET) and sent
+        as one request each, with a structured JSON output keyed by arXiv ID.
+        Papers whose result can't be recovered from a successful batch call
+        (malformed output, missing IDs) fall back to a single-paper call. If
+        the batch call itself fails (e.g. after repeated 429s), the whole batch
+        is reported as failed instead, so a quota problem doesn't turn into one
+        call per paper. Papers found in the response cache are not sent.
+
+        Args:
+            papers (list): (arxiv_id, paper_text) tuples.
+            max_retries (int): The maximum number of attempts per call (default Config.LLM_MAX_RETRIES).
+            prompt_kind (str): VERIFY_AND_SUMMARIZE, or SUMMARIZE for papers
+                whose affiliation needs no confirmation.
+
+        Returns:
+            dict: arxiv_id -> (is_match (bool), summary (str or None)). Papers
+            whose LLM call failed are left out, so callers can retry them later.
+        """
+        if not self.llm_client:
+            print("[Warning] LLM client is not initialized. Skipping processing.")
+            return {}
+
+        results = {}
+        uncached = []
+        for arxiv_id, paper_text in papers:
+            cached = self.cache.get(paper_text, prompt_kind) if self.cache else None
+            if cached is not None:
+                results[arxiv_id] = cached
+            else:
+                uncached.append((arxiv_id, paper_text))
+
+        for batch in self._split_into_batches(uncached):
+            if len(batch) == 1:
+                arxiv_id, paper_text = batch[0]
+                result = self._process_and_cache(paper_text, max_retries, prompt_kind)
+                if result is not None:
+                    results[arxiv_id] = result
+                continue
+
+            expected_ids = [arxiv_id for arxiv_id, _ in batch]
+            print(f"Call LLM (Model: {self.model_name_for_call}, {prompt_kind}) for a batch of {len(batch)} papers...")
+            if prompt_kind == SUMMARIZE:
+                prompt, schema = self._build_batch_summary_prompt(batch), BATCH_SUMMARY_SCHEMA
+            else:
+                prompt, schema = self._build_batch_prompt(batch), BATCH_RESPONSE_SCHEMA
+            response_text = self._generate(
+                prompt, max_retries,
+                generation_config={"response_mime_type": "application/json", "response_schema": schema},
+            )
+            if response_text is None:
+                print(f"  -> [Warning] The batch call failed. Leaving its {len(batch)} papers for a later retry.")
+                continue
+            batch_results = self._parse_batch_response(response_text, expected_ids, prompt_kind)
+
+            for arxiv_id, paper_text in batch:
+                if arxiv_id in batch_results:
+                    results[arxiv_id] = batch_results[arxiv_id]
+                    if self.cache:
+                        self.cache.put(paper_text, batch_results[arxiv_id], prompt_kind)
                 else:
-                    # If it's another type of error or we've run out of retries
-                    print(f"[Warning] Gemini API call failed on attempt {attempt + 1}: {e}")
-                    return False, None
\ No newline at end of file
+                    print(f"  -> [Info] No usable batch result for {arxiv_id}. Falling back to a single-paper call.")
+                    result = self._process_and_cache(paper_text, max_retries, prompt_kind)
+                    if result is not None:
+                        results[arxiv_id] = result
+        return results
@@ -1,15 +1,36 @@
-from fastapi import FastAPI, Depends, BackgroundTasks
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime, timedelta
+from typing import Optional
+from datetime import date, datetime, timedelta
 
 # --- Component Imports ---
 # Import all the components we have built
-from database import get_db
+from database import get_db, get_read_db, engine
+import crud
+import digests
 import models
 import schemas
-# Import the new task function that will run in the background
-from tasks import process_and_save_papers
+import search_index
+import backfill
+import jobs
+import metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Creates the tables the API uses once at startup (for databases created
+    before they existed), so no request runs DDL.
+    """
+    jobs.ensure_tables()
+    models.BackfillShard.__table__.create(bind=engine, checkfirst=True)
+    digests.ensure_table()
+    metrics.ensure_table()
+    yield
 
 
 # --- FastAPI App Instance ---
@@ -18,6 +39,7 @@ app = FastAPI(
     title="LLM Research Paper Digest API",
     description="An API to fetch and process LLM-related research papers from arXiv.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 
@@ -31,37 +53,212 @@ def read_root():
     return {"message": "Welcome to the LLM Research Paper Digest API!"}
 
 
-@app.get("/api/papers", response_model=List[schemas.Paper])
-def get_all_papers(db: Session = Depends(get_db)):
+@app.get("/api/papers", response_model=schemas.PaperPage, response_model_exclude_unset=True)
+def get_all_papers(
+    limit: int = Query(50, ge=1, le=200, description="Page size."),
+    cursor: Optional[str] = Query(None, description="The `next_cursor` of the previous page."),
+    date_from: Optional[date] = Query(None, description="Only papers published on or after this date."),
+    date_to: Optional[date] = Query(None, description="Only papers published on or before this date."),
+    institution: Optional[str] = Query(None, description="Only papers from this institution (exact name)."),
+    keyword: Optional[str] = Query(None, description="Only papers whose title or abstract contains this text."),
+    compact: bool = Query(False, description="Leave out `abstract` and `llm_summary`."),
+    db: Session = Depends(get_read_db),
+):
     """
-    Retrieves a list of all papers currently stored in the database.
+    Retrieves papers stored in the database, newest first, one page at a time.
     
-    This endpoint demonstrates reading data from the database and returning it
-    in a structured format defined by Pydantic schemas.
+    Pagination is keyset-based on (publish_date, id): pass the returned
+    `next_cursor` to get the following page. `next_cursor` is null on the last page.
     """
-    papers = db.query(models.Paper).order_by(models.Paper.publish_date.desc()).all()
-    return papers
+    try:
+        after = crud.decode_paper_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    papers = crud.list_papers(
+        db, limit=limit + 1, after=after, date_from=date_from, date_to=date_to,
+        institution=institution, keyword=keyword, include_text=not compact,
+    )
+    has_more = len(papers) > limit
+    papers = papers[:limit]
 
+    items = []
+    for paper in papers:
+        fields = dict(
+            id=paper.id,
+            arxiv_id=paper.arxiv_id,
+            title=paper.title,
+            publish_date=paper.publish_date,
+            institutions=[schemas.Institution.model_validate(inst) for inst in paper.institutions],
+        )
+        if not compact:
+            fields.update(abstract=paper.abstract, llm_summary=paper.llm_summary)
+        items.append(schemas.PaperListItem(**fields))
 
-# --- NEW ENDPOINT TO TRIGGER BACKGROUND TASK ---
-@app.post("/api/papers/trigger-processing", status_code=202)
-def trigger_daily_processing(background_tasks: BackgroundTasks):
+    return schemas.PaperPage(
+        items=items,
+        next_cursor=crud.encode_paper_cursor(papers[-1]) if has_more else None,
+    )
+
+
+@app.get("/api/papers/search", response_model=schemas.PaperSearchPage)
+def search_papers(
+    q: str = Query(..., min_length=1, description="Words to search for in title, abstract and summary. Append * for prefix matching."),
+    limit: int = Query(20, ge=1, le=100, description="Page size."),
+    offset: int = Query(0, ge=0, description="The `next_offset` of the previous page."),
+    db: Session = Depends(get_read_db),
+):
     """
-    Triggers the background task to fetch and process papers for yesterday.
-    
-    This endpoint immediately returns a 202 "Accepted" response while the 
-    actual processing happens in the background.
+    Full-text search over paper titles, abstracts and LLM summaries, ranked by BM25,
+    with matched terms highlighted.
     """
-    # Calculate yesterday's date in UTC, which is what arXiv uses.
-    """ yesterday_utc = datetime.now() - timedelta(days=1)
-    date_str_for_task = yesterday_utc.strftime('%Y%m%d') """
+    if not search_index.is_supported(engine):
+        raise HTTPException(status_code=501, detail="Full-text search requires the SQLite backend.")
+    try:
+        hits = search_index.search_papers(db, q, limit=limit + 1, offset=offset)
+    except OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+        raise HTTPException(status_code=503, detail="The search index has not been built yet "
+                                                    "(run `python search_index.py create`).")
+    has_more = len(hits) > limit
+    return schemas.PaperSearchPage(
+        items=[schemas.PaperSearchHit(**hit) for hit in hits[:limit]],
+        next_offset=offset + limit if has_more else None,
+    )
 
-    date_str_for_task = "20250626" 
-    
-    # Add the long-running function to be executed in the background
-    background_tasks.add_task(process_and_save_papers, date_str_for_task)
-    
-    return {
-        "message": "Processing task for yesterday's papers has been triggered.", 
-        "processing_date": date_str_for_task
-    }
\ No newline at end of file
+
+# Media type and ETag suffix of each digest rendering.
+_DIGEST_FORMATS = {
+    "json": ("application/json", ""),
+    "markdown": ("text/markdown; charset=utf-8", "-md"),
+    "html": ("text/html; charset=utf-8", "-html"),
+}
+
+
+@app.get("/api/digests/{day}", responses={200: {"content": {t: {} for t, _ in _DIGEST_FORMATS.values()}}, 304: {}})
+def get_digest(
+    day: date,
+    format: str = Query("json", pattern="^(json|markdown|html)$", description="json, markdown or html."),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db),
+):
+    """
+    The digest of a day: the papers published that day, grouped by institution,
+    with their LLM summaries. Digests are built when papers are saved, so this
+    is a single row lookup. Supports conditional requests (ETag and
+    Last-Modified); an unchanged digest is answered with 304 Not Modified.
+    """
+    digest = digests.get_digest(db, day)
+    if digest is None:
+        raise HTTPException(status_code=404, detail=f"No digest for {day.isoformat()}.")
+    media_type, suffix = _DIGEST_FORMATS[format]
+    headers = {
+        "ETag": f'"{digest.etag}{suffix}"',
+        "Last-Modified": digests.last_modified(digest),
+        # Cacheable, but revalidated on every use: a day's digest changes when new versions arrive.
+        "Cache-Control": "no-cache",
+    }
+    if digests.is_not_modified(headers["ETag"], digest.updated_at, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+    body = {"json": digest.content, "markdown": digest.markdown, "html": digest.html}[format]
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+# --- Endpoints that queue processing jobs ---
+# Processing runs are not executed in the API process: they are stored as jobs
+# and picked up by a separate worker (`python jobs.py`).
+
+@app.post("/api/papers/trigger-processing", status_code=202, response_model=schemas.JobTriggered)
+def trigger_daily_processing(date: Optional[str] = Query(None, description="Day to process, YYYYMMDD. Defaults to yesterday (UTC)."),
+                             db: Session = Depends(get_db)):
+    """
+    Queues a job that fetches and processes the papers of yesterday (or of
+    the given date). If a job for the same date is already queued or running,
+    that job is returned instead of starting a second one.
+
+    Follow the progress at /api/jobs/{job_id}.
+    """
+    if date is None:
+        # Calculate yesterday's date in UTC, which is what arXiv uses.
+        yesterday_utc = datetime.utcnow() - timedelta(days=1)
+        date_str_for_task = yesterday_utc.strftime('%Y%m%d')
+    else:
+        try:
+            date_str_for_task = datetime.strptime(date, '%Y%m%d').strftime('%Y%m%d')
+        except ValueError:
+            raise HTTPException(status_code=400, detail="date must be in YYYYMMDD format.")
+
+    job, created = jobs.enqueue_job(
+        db, "date", {"date_start": f"{date_str_for_task}000000", "date_end": f"{date_str_for_task}235959"},
+        dedup_key=f"date:{date_str_for_task}",
+    )
+    return schemas.JobTriggered(
+        job_id=job.id, status=job.status, created=created, processing_date=date_str_for_task,
+        message="Processing job has been queued." if created else "A job for this date is already queued or running.",
+    )
+
+
+@app.post("/api/papers/trigger-harvest", status_code=202, response_model=schemas.JobTriggered)
+def trigger_incremental_harvest(db: Session = Depends(get_db)):
+    """
+    Queues an incremental harvest: only the papers updated since the previous
+    harvest are fetched and processed. Meant to be called every
+    HARVEST_INTERVAL_MINUTES (e.g. by cron) instead of one daily batch.
+    """
+    job, created = jobs.enqueue_job(db, "incremental", {}, dedup_key="incremental")
+    return schemas.JobTriggered(
+        job_id=job.id, status=job.status, created=created,
+        message="Incremental harvest has been queued." if created else "An incremental harvest is already queued or running.",
+    )
+
+
+@app.get("/api/jobs/{job_id}", response_model=schemas.JobStatus)
+def get_job_status(job_id: int, db: Session = Depends(get_read_db)):
+    """
+    Shows a job's status, its run counts and how many of its papers are
+    pending, done, dropped by a filter, or failed.
+    """
+    progress = jobs.get_job_progress(db, job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return progress
+
+
+@app.post("/api/backfill", status_code=202, response_model=schemas.BackfillStatus)
+def trigger_backfill(request: schemas.BackfillRequest, db: Session = Depends(get_db)):
+    """
+    Queues (or resumes) a backfill over a date range. The range is split into
+    per-day or per-hour shards that the worker processes concurrently.
+    Shards that already finished in an earlier attempt are skipped.
+    """
+    try:
+        backfill.plan_shards(request.start_date, request.end_date, request.granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    backfill_id = backfill.make_backfill_id(request.start_date, request.end_date, request.granularity)
+    job, _ = jobs.enqueue_job(db, "backfill", request.model_dump(), dedup_key=f"backfill:{backfill_id}")
+    return schemas.BackfillStatus(backfill_id=backfill_id, shards=backfill.get_shards(db, backfill_id), job_id=job.id)
+
+
+@app.get("/api/backfill/{backfill_id}", response_model=schemas.BackfillStatus)
+def get_backfill_status(backfill_id: str, db: Session = Depends(get_read_db)):
+    """
+    Shows the per-shard progress and counts of a backfill.
+    """
+    shards = backfill.get_shards(db, backfill_id)
+    if not shards:
+        raise HTTPException(status_code=404, detail=f"Backfill {backfill_id} not found.")
+    return schemas.BackfillStatus(backfill_id=backfill_id, shards=shards)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(db: Session = Depends(get_read_db)):
+    """
+    Prometheus metrics: this process's, plus the latest ones published by each
+    job worker (labeled with process="<worker id>"), since the pipeline runs
+    in the workers.
+    """
+    sources = [({}, metrics.REGISTRY.snapshot())] + metrics.load_snapshots(db)
+    return PlainTextResponse(metrics.render_prometheus(sources), media_type="text/plain; version=0.0.4")
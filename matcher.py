@@ -0,0 +1,142 @@
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Match:
+    """
+    A single pattern occurrence found in a text.
+    """
+    canonical: str   # The name as written in Config (original casing)
+    index: int       # Position of the pattern in its watch list (lower = higher priority)
+    start: int
+    end: int
+
+
+class MultiPatternMatcher:
+    """
+    An Aho-Corasick automaton that finds every occurrence of a set of
+    case-insensitive substring patterns in a single pass over the text.
+
+    The cost of a scan grows with the length of the text and the number of
+    matches, not with the number of patterns, so watch lists can grow to
+    hundreds of entries without slowing down the per-text check.
+    """
+    def __init__(self, patterns: Iterable[str]):
+        """
+        Builds the automaton.
+
+        Args:
+            patterns: The patterns in priority order. Each one is matched
+                case-insensitively and reported under its original spelling.
+        """
+        self.patterns: List[str] = list(patterns)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[int]] = [[]]
+        for index, pattern in enumerate(self.patterns):
+            self._add(pattern.lower(), index)
+        self._build_failure_links()
+
+    def _add(self, pattern: str, index: int):
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = next_node
+        self._outputs[node].append(index)
+
+    def _build_failure_links(self):
+        # Breadth-first, so each node's failure target is finished before its children.
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                # Inherit the matches that end at the failure target (suffix patterns).
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+    def _scan(self, text: str):
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        node = 0
+        for position, char in enumerate(text.lower()):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index in outputs[node]:
+                yield index, position + 1
+
+    def find_all(self, text: str) -> List[Match]:
+        """
+        Returns every occurrence of every pattern in the text, in text order.
+        """
+        matches = []
+        for index, end in self._scan(text):
+            pattern = self.patterns[index]
+            matches.append(Match(canonical=pattern, index=index, start=end - len(pattern), end=end))
+        return matches
+
+    def matched_names(self, text: str) -> List[str]:
+        """
+        Returns the distinct patterns found in the text, ordered by their
+        position in the watch list (i.e. by priority).
+        """
+        indices = {index for index, _ in self._scan(text)}
+        return [self.patterns[index] for index in sorted(indices)]
+
+    def contains_any(self, text: str) -> bool:
+        """
+        True if at least one pattern occurs in the text. Stops at the first hit.
+        """
+        return next(self._scan(text), None) is not None
+
+
+class ConfigMatchers:
+    """
+    The keyword, institution and email-domain matchers built from a Config.
+    Use get_matchers() to get the shared, already-built instance.
+    """
+    def __init__(self, keywords: Tuple[str, ...], institutions: Tuple[str, ...], domains: Tuple[str, ...]):
+        self.keywords = MultiPatternMatcher(keywords)
+        self.institutions = MultiPatternMatcher(institutions)
+        self.domains = MultiPatternMatcher(domains)
+        self._institutions_lower = [inst.lower() for inst in institutions]
+
+    def institution_for_domain(self, domain: str) -> Optional[str]:
+        """
+        Finds the institution for an email domain: the first institution (in
+        Config order) whose name occurs in the domain or which contains the
+        domain. Returns None if there is none.
+        """
+        domain = domain.lower()
+        candidates = {m.index for m in self.institutions.find_all(domain)}
+        candidates.update(i for i, inst in enumerate(self._institutions_lower) if domain in inst)
+        if not candidates:
+            return None
+        return self.institutions.patterns[min(candidates)]
+
+
+@lru_cache(maxsize=8)
+def _build_matchers(keywords: Tuple[str, ...], institutions: Tuple[str, ...], domains: Tuple[str, ...]) -> ConfigMatchers:
+    return ConfigMatchers(keywords, institutions, domains)
+
+
+def get_matchers(config) -> ConfigMatchers:
+    """
+    Returns the matchers for the given config. They are compiled once and
+    cached, so every component (and every worker process) builds them only once.
+    """
+    return _build_matchers(tuple(config.KEYWORDS), tuple(config.TARGET_INSTITUTIONS), tuple(config.TARGET_DOMAINS))
@@ -0,0 +1,271 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from a fast DB commit to a slow Gemini call.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    """A monotonically increasing count, optionally split by labels."""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Histogram(_Metric):
+    """
+    Counts observations (e.g. durations) in fixed buckets, like a Prometheus
+    histogram. Observing is a bisect and three additions under a lock.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (the last one is +Inf), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the with-block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Dict[Tuple[str, ...], list]:
+        with self._lock:
+            return {key: [list(entry[0]), entry[1], entry[2]] for key, entry in self._values.items()}
+
+
+class Registry:
+    """All metrics of the process, by name."""
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def _register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> dict:
+        """
+        A JSON-serializable copy of all values, as stored by publish_snapshot()
+        and compared by run_summary().
+        """
+        result = {}
+        for name, metric in self._metrics.items():
+            entry = {"type": metric.kind, "help": metric.help, "labelnames": list(metric.labelnames),
+                     "samples": [[list(key), value] for key, value in metric.samples().items()]}
+            if isinstance(metric, Histogram):
+                entry["buckets"] = list(metric.buckets)
+            result[name] = entry
+        return result
+
+
+REGISTRY = Registry()
+
+# --- The pipeline's metrics ---
+STAGE_SECONDS = REGISTRY.histogram(
+    "digest_stage_seconds", "Time a pipeline stage spends per paper.", ("stage",))
+STAGE_ITEMS = REGISTRY.counter(
+    "digest_stage_items_total", "Papers handled per pipeline stage and outcome (passed, dropped, failed).",
+    ("stage", "outcome"))
+CANDIDATES = REGISTRY.counter("digest_candidates_total", "Keyword-matching papers returned by arXiv.")
+SKIPS = REGISTRY.counter("digest_papers_skipped_total", "Papers not (re)processed, by reason.", ("reason",))
+DOWNLOADS = REGISTRY.counter("digest_downloads_total", "PDFs fetched, from arXiv or the local store.", ("source",))
+DOWNLOAD_BYTES = REGISTRY.counter("digest_download_bytes_total", "Bytes of PDFs downloaded from arXiv.")
+PARSE_TIMEOUTS = REGISTRY.counter("digest_parse_timeouts_total", "PDFs given up after PARSE_TIMEOUT_SECONDS.")
+LLM_CALLS = REGISTRY.counter("digest_llm_calls_total", "Gemini requests sent, including retries.")
+LLM_ERRORS = REGISTRY.counter(
+    "digest_llm_errors_total", "Failed Gemini requests, by kind (throttled = 429, transient, fatal).", ("kind",))
+LLM_INPUT_CHARS = REGISTRY.counter("digest_llm_input_chars_total", "Characters of prompts sent to Gemini.")
+LLM_SECONDS = REGISTRY.histogram("digest_llm_call_seconds", "Latency of Gemini requests.")
+LLM_QUEUE_WAIT = REGISTRY.histogram(
+    "digest_llm_queue_wait_seconds", "Time Gemini requests wait in the rate limiter (including 429 pauses).")
+SAVES = REGISTRY.counter(
+    "digest_papers_saved_total",
+    "Papers written to the database, by kind (new, or version_only: moved to a new version with unchanged inputs).",
+    ("kind",))
+DB_COMMIT_SECONDS = REGISTRY.histogram("digest_db_commit_seconds", "Duration of the persist stage's transactions.")
+
+
+# --- Prometheus text format ---
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[dict] = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+               for name, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_prometheus(sources: List[Tuple[dict, dict]]) -> str:
+    """
+    Renders snapshots in the Prometheus text exposition format (version 0.0.4).
+
+    Args:
+        sources: (extra labels, snapshot) pairs, e.g. ({}, REGISTRY.snapshot()) for
+            this process and ({"process": "worker-1"}, <its published snapshot>).
+    """
+    lines = []
+    names = []
+    for _, snapshot in sources:
+        names.extend(name for name in snapshot if name not in names)
+    for name in names:
+        described = False
+        for extra, snapshot in sources:
+            entry = snapshot.get(name)
+            if entry is None:
+                continue
+            if not described:
+                lines.append(f"# HELP {name} {entry['help']}")
+                lines.append(f"# TYPE {name} {entry['type']}")
+                described = True
+            labelnames = entry["labelnames"]
+            for key, value in entry["samples"]:
+                if entry["type"] == "counter":
+                    lines.append(f"{name}{_format_labels(labelnames, key, extra)} {value:g}")
+                    continue
+                bucket_counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(entry["buckets"]) + ["+Inf"], bucket_counts):
+                    cumulative += bucket_count
+                    le = bound if bound == "+Inf" else f"{bound:g}"
+                    labels = _format_labels(list(labelnames) + ["le"], list(key) + [le], extra)
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labelnames, key, extra)} {total:g}")
+                lines.append(f"{name}_count{_format_labels(labelnames, key, extra)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Run summaries ---
+
+def _quantile(buckets: Sequence[float], counts: Sequence[int], q: float) -> Optional[float]:
+    """The upper bound of the bucket holding the q-quantile (None if it is the +Inf bucket)."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank, seen = q * total, 0
+    for bound, count in zip(buckets, counts):
+        seen += count
+        if seen >= rank:
+            return bound
+    return None
+
+
+def run_summary(before: dict, after: dict) -> dict:
+    """
+    What happened between two snapshots of the same process, in a compact,
+    JSON-serializable form: counter increases per label set, and count, total,
+    average and approximate p50/p95 per histogram label set. Metrics that did
+    not change are left out.
+    """
+    summary = {}
+    for name, entry in after.items():
+        previous = {tuple(key): value for key, value in before.get(name, {}).get("samples", [])}
+        values = {}
+        for key, value in entry["samples"]:
+            label = ",".join(f"{n}={v}" for n, v in zip(entry["labelnames"], key)) or "total"
+            old = previous.get(tuple(key))
+            if entry["type"] == "counter":
+                delta = value - (old or 0)
+                if delta:
+                    values[label] = delta
+                continue
+            counts = [c - (old[0][i] if old else 0) for i, c in enumerate(value[0])]
+            count = value[2] - (old[2] if old else 0)
+            if not count:
+                continue
+            total = value[1] - (old[1] if old else 0)
+            values[label] = {"count": count, "sum": round(total, 3), "avg": round(total / count, 3),
+                             "p50": _quantile(entry["buckets"], counts, 0.5),
+                             "p95": _quantile(entry["buckets"], counts, 0.95)}
+        if values:
+            summary[name] = values
+    return summary
+
+
+# --- Sharing metrics between processes ---
+# Jobs run in worker processes (jobs.py), but /metrics is served by the API.
+# Workers store their snapshot in the 'metrics_snapshots' table, and the API
+# renders those next to its own metrics, labeled with the worker's name.
+
+def ensure_table():
+    from database import engine
+    import models
+
+    models.MetricsSnapshot.__table__.create(bind=engine, checkfirst=True)
+
+
+def publish_snapshot(process_name: str):
+    """Stores this process's current snapshot for the API's /metrics endpoint."""
+    from database import SessionLocal, write_lock
+    import models
+
+    db = SessionLocal()
+    try:
+        with write_lock:
+            db.merge(models.MetricsSnapshot(process=process_name, snapshot=json.dumps(REGISTRY.snapshot()),
+                                            updated_at=datetime.utcnow()))
+            db.commit()
+    finally:
+        db.close()
+
+
+def load_snapshots(db) -> List[Tuple[dict, dict]]:
+    """The published snapshots of all worker processes, as render_prometheus() sources."""
+    import models
+
+    return [({"process": row.process}, json.loads(row.snapshot)) for row in db.query(models.MetricsSnapshot).all()]
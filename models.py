@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, Date, Table, ForeignKey
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Boolean, Table, ForeignKey, Index, UniqueConstraint, text
 from sqlalchemy.orm import relationship
 from database import Base  # Import Base from the database.py we just created
 
@@ -10,7 +11,9 @@ from database import Base  # Import Base from the database.py we just created
 paper_institution_association = Table(
     'paper_institution_association', Base.metadata,
     Column('paper_id', Integer, ForeignKey('papers.id'), primary_key=True),
-    Column('institution_id', Integer, ForeignKey('institutions.id'), primary_key=True)
+    Column('institution_id', Integer, ForeignKey('institutions.id'), primary_key=True),
+    # The primary key covers lookups by paper; this index covers "papers of an institution".
+    Index('ix_paper_institution_institution_id', 'institution_id', 'paper_id')
 )
 
 class Paper(Base):
@@ -19,9 +22,21 @@ class Paper(Base):
     This class defines the schema for storing paper-related information.
     """
     __tablename__ = 'papers'
+    # Composite index for the newest-first keyset pagination of /api/papers.
+    __table_args__ = (
+        Index('ix_papers_publish_date_id', 'publish_date', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
+    # The versioned ID of the stored version, e.g. '2506.01234v2'.
     arxiv_id = Column(String, unique=True, index=True, nullable=False)
+    # One row per paper: a new arXiv version updates the row of its base ID.
+    base_id = Column(String, unique=True, index=True)  # e.g. '2506.01234'
+    version = Column(Integer)
+    # Hashes of the stored version's inputs. A new version whose PDF (or extracted
+    # text) hashes the same skips the affiliation check (or the LLM call).
+    pdf_sha256 = Column(String(64))
+    text_sha256 = Column(String(64))
     title = Column(Text, nullable=False)
     abstract = Column(Text)
     publish_date = Column(Date)
@@ -56,4 +71,166 @@ class Institution(Base):
         "Paper",
         secondary=paper_institution_association,
         back_populates="institutions"
-    )
\ No newline at end of file
+    )
+
+class LLMCacheEntry(Base):
+    """
+    Represents the 'llm_cache' table: one cached LLM decision per extracted text.
+    The key is a hash of the text, the model name and the prompt version, so the
+    same text is only ever sent to the LLM once per model/prompt combination.
+    """
+    __tablename__ = 'llm_cache'
+
+    key = Column(String(64), primary_key=True)
+    model_name = Column(String, nullable=False)
+    prompt_version = Column(String, nullable=False, index=True)
+    is_match = Column(Boolean, nullable=False)
+    summary = Column(Text)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Used for LRU eviction once the cache grows past its size limit.
+    last_accessed_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class BackfillShard(Base):
+    """
+    Represents the 'backfill_shards' table: the progress of one time slice of a
+    multi-day backfill. A crashed backfill resumes by re-running only the
+    shards that are not 'done'.
+    """
+    __tablename__ = 'backfill_shards'
+    __table_args__ = (
+        UniqueConstraint('backfill_id', 'shard_start', name='uq_backfill_shard'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    backfill_id = Column(String, nullable=False, index=True)
+    shard_start = Column(String(14), nullable=False)  # 'YYYYMMDDHHMMSS', as used in arXiv queries
+    shard_end = Column(String(14), nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending | running | done | failed
+    candidates = Column(Integer, default=0)
+    downloads = Column(Integer, default=0)
+    llm_calls = Column(Integer, default=0)
+    saved = Column(Integer, default=0)
+    error = Column(Text)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class HarvestState(Base):
+    """
+    Represents the 'harvest_state' table: the high-water mark of the
+    incremental harvester, i.e. the newest (updated, arxiv_id) it has processed.
+    The next run only asks arXiv for papers updated from that point on.
+    """
+    __tablename__ = 'harvest_state'
+
+    name = Column(String, primary_key=True)  # One row per harvest stream, e.g. 'cs'
+    last_updated = Column(DateTime, nullable=False)  # naive UTC, as in arxiv.Result.updated
+    last_arxiv_id = Column(String, nullable=False)
+    last_run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class Job(Base):
+    """
+    Represents the 'jobs' table: a durable queue of processing runs. The API
+    only enqueues jobs; a separate worker process (jobs.py) claims and runs
+    them, so a run survives API restarts and reports its progress.
+    """
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # At most one queued or running job per dedup_key, even when two
+        # triggers race (see jobs.enqueue_job).
+        Index('ux_jobs_active_dedup_key', 'dedup_key', unique=True,
+              sqlite_where=text("status IN ('queued', 'running')"),
+              postgresql_where=text("status IN ('queued', 'running')")),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # date | incremental | backfill
+    # Identifies "the same work": a second trigger while a job with this key
+    # is queued or running returns that job instead of enqueuing another.
+    dedup_key = Column(String, nullable=False, index=True)
+    params = Column(Text, nullable=False, default="{}")  # JSON
+    status = Column(String, nullable=False, default="queued", index=True)  # queued | running | done | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String)
+    harvested = Column(Boolean, nullable=False, default=False)  # All work items of a date job are recorded
+    candidates = Column(Integer, default=0)
+    downloads = Column(Integer, default=0)
+    llm_calls = Column(Integer, default=0)
+    saved = Column(Integer, default=0)
+    error = Column(Text)
+    summary = Column(Text)  # JSON run summary of the last attempt (see metrics.run_summary)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class JobItem(Base):
+    """
+    Represents the 'job_items' table: one paper of a job. Papers fail and are
+    retried independently; the stored metadata lets a retry (or a restarted
+    worker) process the paper again without querying arXiv.
+    """
+    __tablename__ = 'job_items'
+    __table_args__ = (
+        UniqueConstraint('job_id', 'arxiv_id', name='uq_job_item'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey('jobs.id'), nullable=False, index=True)
+    arxiv_id = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending | done | dropped | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    paper = Column(Text, nullable=False)  # JSON: the arXiv metadata the pipeline needs
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class PdfStoreEntry(Base):
+    """
+    Represents the 'pdf_store' table: the index of the local PDF store. Each
+    arXiv version points at a content-addressed file (by SHA-256), so versions
+    with identical PDFs share one file.
+    """
+    __tablename__ = 'pdf_store'
+
+    arxiv_id = Column(String, primary_key=True)  # Base ID plus version, e.g. '2506.01234v2'
+    sha256 = Column(String(64), nullable=False, index=True)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Used for LRU eviction once the store grows past its size limit.
+    last_accessed_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class MetricsSnapshot(Base):
+    """
+    Represents the 'metrics_snapshots' table: the latest metrics of each job
+    worker process (see metrics.publish_snapshot), served by the API's /metrics.
+    """
+    __tablename__ = 'metrics_snapshots'
+
+    process = Column(String, primary_key=True)  # The worker ID, e.g. 'host-1234'
+    snapshot = Column(Text, nullable=False)  # JSON, see metrics.Registry.snapshot()
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class Digest(Base):
+    """
+    Represents the 'digests' table: the materialized digest of one day, i.e.
+    the papers published that day grouped by institution (see digests.py).
+    Rebuilt whenever a run saves papers of that day, and served as is by
+    /api/digests/{date}.
+    """
+    __tablename__ = 'digests'
+
+    day = Column(Date, primary_key=True)
+    paper_count = Column(Integer, nullable=False, default=0)
+    content = Column(Text, nullable=False)  # JSON
+    markdown = Column(Text, nullable=False)
+    html = Column(Text, nullable=False)
+    # SHA-256 of `content`; the ETag of all renderings. Only a changed digest
+    # gets a new etag and updated_at, so unchanged rebuilds keep client caches valid.
+    etag = Column(String(64), nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -1,7 +1,41 @@
+import hashlib
+import json
 import os
+import threading
 import fitz  # PyMuPDF
 import re
-from typing import Optional
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
+
+from matcher import get_matchers
+import metrics
+
+# A PDF given either as a file path or as its raw bytes.
+PdfSource = Union[str, bytes, bytearray, memoryview]
+
+# Section headings and cues used to build the LLM input in "sections" mode.
+_ABSTRACT_HEADING = re.compile(r"^\s*abstract\b", re.IGNORECASE)
+_INTRO_HEADING = re.compile(r"^\s*(?:(?:\d+|[IVX]+)\.?\s*)?introduction\b", re.IGNORECASE)
+_NUMBERED_HEADING = re.compile(r"^\s*(?:\d+(?:\.\d+)*|[IVX]+\.)\s+[A-Z]")
+_REFERENCES_HEADING = re.compile(r"^\s*(?:references|bibliography)\s*$", re.IGNORECASE)
+_ARXIV_STAMP = re.compile(r"^\s*arXiv:\d{4}\.\d{4,5}")
+_AFFILIATION_CUES = re.compile(
+    r"universit|institut|laborator|\blab\b|college|school of|department|academy|research|\binc\b|corporation|@",
+    re.IGNORECASE)
+_CONTRIBUTION_CUES = re.compile(
+    r"contribution|\bwe (?:propose|introduce|present|show|develop|demonstrate)|in this (?:paper|work)|our (?:main|key)",
+    re.IGNORECASE)
+
+# Ranks of the spans in "sections" mode: lower ranks are taken first.
+_RANK_HEADER, _RANK_ABSTRACT, _RANK_CONTRIBUTIONS, _RANK_INTRO, _RANK_OTHER = range(5)
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """A rough token count for Gemini input: about 4 characters per token."""
+    return len(text) // 4 + 1 if text else 0
+
 
 class PdfProcessor:
     """
@@ -12,6 +46,24 @@ class PdfProcessor:
         Initializes the PdfProcessor with a configuration object.
         """
         self.config = config
+        self.matchers = get_matchers(config)
+        self._email_regex = re.compile(config.EMAIL_REGEX)
+
+    def open_document(self, source: PdfSource) -> Optional[fitz.Document]:
+        """
+        Opens a PDF from a file path or from an in-memory buffer.
+
+        Args:
+            source: A file path, or the raw PDF bytes (bytes, bytearray or memoryview).
+
+        Returns:
+            An open fitz.Document (the caller must close it), or None if the path does not exist.
+        """
+        if isinstance(source, str):
+            if not os.path.isfile(source):
+                return None
+            return fitz.open(source)
+        return fitz.open(stream=source, filetype="pdf")
 
     def check_affiliation_single_pdf(self, pdf_path: str) -> Optional[str]:
         """
@@ -28,40 +80,8 @@ class PdfProcessor:
 
         doc = None
         try:
-            doc = fitz.open(pdf_path)
-            if doc.page_count == 0:
-                return None
-            
-            page = doc.load_page(0)
-            
-            # 1. Check for matching email domains first (more reliable)
-            full_page_text = page.get_text("text")
-            emails = re.findall(self.config.EMAIL_REGEX, full_page_text)
-            for email in emails:
-                try:
-                    domain = email.split('@')[1].lower()
-                    if any(target_domain in domain for target_domain in self.config.TARGET_DOMAINS):
-                        # Find the actual institution name from the email domain if possible
-                        matched_inst = next((inst for inst in self.config.TARGET_INSTITUTIONS if inst.lower() in domain or domain in inst.lower()), domain)
-                        return f"Email Domain Match: {matched_inst}"
-                except IndexError:
-                    continue
-
-            # 2. If no email match, check for keywords in the header
-            header_limit_y = page.rect.height * self.config.HEADER_RATIO
-            blocks = page.get_text("blocks")
-            for block in blocks:
-                # y1 is the bottom coordinate of the text block
-                if block[3] < header_limit_y:
-                    block_text_lower = block[4].lower()
-                    for institution in self.config.TARGET_INSTITUTIONS_LOWER:
-                        if institution in block_text_lower:
-                            # Find the properly cased institution name to return
-                            original_case_inst = self.config.TARGET_INSTITUTIONS[self.config.TARGET_INSTITUTIONS_LOWER.index(institution)]
-                            return f"Header Keyword Match: {original_case_inst}"
-                            
-            return None  # No match found
-
+            doc = self.open_document(pdf_path)
+            return self.check_affiliation_document(doc)
         except Exception as e:
             print(f"  -> [Error] Could not process PDF {os.path.basename(pdf_path)}: {e}")
             return None
@@ -69,6 +89,22 @@ class PdfProcessor:
             if doc:
                 doc.close()
 
+    def check_affiliation_document(self, doc: fitz.Document) -> Optional[str]:
+        """
+        Checks the first page of an already opened document for target institutions
+        or email domains.
+
+        Returns:
+            A string with the match reason if found, otherwise None.
+        """
+        if doc.page_count == 0:
+            return None
+
+        page = doc.load_page(0)
+        analysis = PdfAnalysis(page_count=doc.page_count)
+        self._collect_affiliation_hits(analysis, page.get_text("text"), page.get_text("blocks"), page.rect.height)
+        return analysis.match_reason
+
     def extract_text(self, pdf_path: str, max_pages: int = 3) -> Optional[str]:
         """
         Utility method to extract text from the first few pages of a PDF.
@@ -77,19 +113,339 @@ class PdfProcessor:
         if not os.path.isfile(pdf_path):
             return None
         try:
-            doc = fitz.open(pdf_path)
-            num_pages_to_read = min(doc.page_count, max_pages)
-            if num_pages_to_read == 0:
+            doc = self.open_document(pdf_path)
+            try:
+                return self.extract_text_document(doc, max_pages)
+            finally:
                 doc.close()
-                return None
-            
-            text = "".join(doc.load_page(i).get_text("text") for i in range(num_pages_to_read))
-            doc.close()
-            
-            # A simple way to clean up excessive newlines
-            cleaned_text = re.sub(r'\n\s*\n', '\n\n', text).strip()
-            # Limit text length for LLM processing
-            return cleaned_text[:8000] 
         except Exception as e:
             print(f"  -> [Warning] Failed to extract text from {os.path.basename(pdf_path)}: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def extract_text_document(self, doc: fitz.Document, max_pages: int = 3) -> Optional[str]:
+        """
+        Extracts text from the first few pages of an already opened document.
+        """
+        num_pages_to_read = min(doc.page_count, max_pages)
+        if num_pages_to_read == 0:
+            return None
+
+        text = "".join(doc.load_page(i).get_text("text") for i in range(num_pages_to_read))
+
+        # A simple way to clean up excessive newlines
+        cleaned_text = re.sub(r'\n\s*\n', '\n\n', text).strip()
+        # Limit text length for LLM processing
+        return cleaned_text[:8000]
+
+    def analyze(self, source: PdfSource, label: str = "<memory>", max_pages: int = 3) -> Optional["PdfAnalysis"]:
+        """
+        Single-pass analysis of a PDF: the text blocks of each of the first
+        `max_pages` pages are extracted exactly once, and the flat text, email
+        hits, header-region hits and the truncated LLM text are all derived
+        from that one extraction.
+
+        Args:
+            source: A file path or the raw PDF bytes.
+            label (str): A name for the PDF used in log messages.
+            max_pages (int): How many pages to read for the LLM text.
+
+        Returns:
+            PdfAnalysis, or None if the PDF could not be opened or parsed.
+        """
+        doc = None
+        try:
+            doc = self.open_document(source)
+            if doc is None:
+                return None
+            analysis = PdfAnalysis(page_count=doc.page_count)
+            page_texts = []
+            page_blocks = []
+            for page_number in range(min(doc.page_count, max_pages)):
+                page = doc.load_page(page_number)
+                # Text blocks only (type 0); image blocks carry placeholder text.
+                blocks = [b for b in page.get_text("blocks") if b[6] == 0]
+                page_blocks.append(blocks)
+                page_texts.append("".join(b[4] if b[4].endswith("\n") else b[4] + "\n" for b in blocks))
+                if page_number == 0:
+                    header_limit_y = page.rect.height * self.config.HEADER_RATIO
+                    self._collect_affiliation_hits(analysis, page_texts[0], blocks, page.rect.height)
+
+            if self.config.LLM_TEXT_MODE == "sections" and page_blocks:
+                analysis.llm_text = self._select_sections(page_blocks, header_limit_y)
+            text = "".join(page_texts)
+            if text and not analysis.llm_text:
+                # A simple way to clean up excessive newlines, then limit length for LLM processing
+                analysis.llm_text = re.sub(r'\n\s*\n', '\n\n', text).strip()[:8000] or None
+            analysis.llm_tokens = estimate_tokens(analysis.llm_text)
+            return analysis
+        except Exception as e:
+            print(f"  -> [Error] Could not process PDF {label}: {e}")
+            return None
+        finally:
+            if doc:
+                doc.close()
+
+    def _collect_affiliation_hits(self, analysis: "PdfAnalysis", page_text: str, blocks: list, page_height: float):
+        """
+        Fills in the email and header-region hits of the first page, and how
+        confident the match is (see PdfAnalysis.affiliation_confidence):
+
+          - an email on a target domain that maps to a target institution: 0.9,
+            on a target domain without a known institution: 0.8;
+          - an institution name in a header block: 0.7 in an affiliation line
+            (a block with an email or words like "University" / "Lab"), 0.5 in
+            another block, 0.3 in the first block (usually the title, where
+            names like "Google" often refer to a product, not an affiliation),
+            each 0.1 less when the block starts below a quarter of the page;
+          - +0.1 when an email and a header block name the same institution.
+        """
+        confidence = 0.0
+        # 1. Email domains (more reliable): one pass over all target domains per email.
+        for email in self._email_regex.findall(page_text):
+            analysis.emails.append(email)
+            domain = email.split('@')[1].lower()
+            if self.matchers.domains.contains_any(domain):
+                # Find the actual institution name from the email domain if possible
+                institution = self.matchers.institution_for_domain(domain)
+                analysis.email_hits.append(institution or domain)
+                confidence = max(confidence, 0.9 if institution else 0.8)
+
+        # 2. Institution names in the header region of the page.
+        header_limit_y = page_height * self.config.HEADER_RATIO
+        text_blocks_seen = 0
+        for block in blocks:
+            if not block[4].strip():
+                continue
+            text_blocks_seen += 1
+            # y1 is the bottom coordinate of the text block
+            if block[3] < header_limit_y:
+                # All institutions in the block, in Config (priority) order.
+                names = self.matchers.institutions.matched_names(block[4])
+                if not names:
+                    continue
+                analysis.header_hits.extend(names)
+                if text_blocks_seen == 1:
+                    block_confidence = 0.3
+                elif _AFFILIATION_CUES.search(block[4]) or self._email_regex.search(block[4]):
+                    block_confidence = 0.7
+                else:
+                    block_confidence = 0.5
+                if block[1] > page_height * 0.25:
+                    block_confidence -= 0.1
+                confidence = max(confidence, block_confidence)
+
+        if set(analysis.email_hits) & set(analysis.header_hits):
+            confidence += 0.1
+        analysis.affiliation_confidence = round(min(confidence, 1.0), 2)
+
+    def _select_sections(self, page_blocks: List[list], header_limit_y: float) -> Optional[str]:
+        """
+        Builds the LLM input from ranked spans of the first pages, within
+        Config.LLM_INPUT_TOKEN_BUDGET: the title/author/affiliation blocks
+        first, then the abstract, then the introduction paragraphs that state
+        the contributions, then the other introduction paragraphs. Everything
+        after the introduction (related work, method, references) is left out.
+        The chosen spans are joined in document order.
+
+        Returns:
+            str, or None if no abstract was found (the caller then falls back
+            to the page text).
+        """
+        spans = []  # (rank, -score, position, text)
+        section = "front"
+        found_abstract = False
+        position = 0
+        for page_number, blocks in enumerate(page_blocks):
+            for block in blocks:
+                text = re.sub(r"\s*\n\s*", " ", block[4]).strip()
+                if len(text) < 3 or text.isdigit() or _ARXIV_STAMP.match(text):
+                    continue
+                if _REFERENCES_HEADING.match(text):
+                    section = "end"
+                elif _ABSTRACT_HEADING.match(text):
+                    section, found_abstract = "abstract", True
+                elif _INTRO_HEADING.match(text):
+                    section = "intro"
+                elif section in ("abstract", "intro") and len(text) < 80 and _NUMBERED_HEADING.match(text):
+                    # The next numbered section ("2 Related Work") ends the introduction.
+                    # Without an "Introduction" heading, the first section after the abstract stands in for it.
+                    section = "end" if section == "intro" else "intro"
+                if section == "end":
+                    break
+                position += 1
+
+                affiliation = page_number == 0 and len(text) < 600 and (
+                    _AFFILIATION_CUES.search(text) or self._email_regex.search(text)
+                    or self.matchers.institutions.contains_any(text))
+                if section == "front":
+                    header = page_number == 0 and (block[3] < header_limit_y or affiliation)
+                    spans.append((_RANK_HEADER if header else _RANK_OTHER, 0, position, text))
+                elif affiliation:
+                    # Affiliation footnotes at the bottom of the first page.
+                    spans.append((_RANK_HEADER, 0, position, text))
+                elif section == "abstract":
+                    spans.append((_RANK_ABSTRACT, 0, position, text))
+                elif section == "intro":
+                    score = len(_CONTRIBUTION_CUES.findall(text))
+                    spans.append((_RANK_CONTRIBUTIONS if score else _RANK_INTRO, -score, position, text))
+            if section == "end":
+                break
+        if not found_abstract:
+            return None
+
+        budget_chars = self.config.LLM_INPUT_TOKEN_BUDGET * 4
+        # Long author lists may not crowd out the abstract.
+        header_chars = budget_chars // 2
+        chosen = []
+        for rank, _, position, text in sorted(spans):
+            remaining = budget_chars if rank != _RANK_HEADER else min(budget_chars, header_chars)
+            if len(text) > remaining:
+                if rank > _RANK_ABSTRACT or remaining < 200:
+                    continue  # Smaller spans further down the ranking may still fit.
+                text = text[:remaining - 4].rsplit(" ", 1)[0] + " ..."
+            chosen.append((position, text))
+            budget_chars -= len(text) + 2
+            if rank == _RANK_HEADER:
+                header_chars -= len(text) + 2
+        return "\n\n".join(text for _, text in sorted(chosen)) or None
+
+
+@dataclass
+class PdfAnalysis:
+    """
+    The compact result of PdfProcessor.analyze(). Small enough to send back
+    from a worker process.
+    """
+    page_count: int = 0
+    emails: List[str] = field(default_factory=list)
+    # Institution names (or raw domains) matched through email addresses on page 1.
+    email_hits: List[str] = field(default_factory=list)
+    # Institution names found in the header region of page 1, in block order.
+    header_hits: List[str] = field(default_factory=list)
+    llm_text: Optional[str] = None
+    # Estimated input tokens of llm_text (see estimate_tokens()).
+    llm_tokens: int = 0
+    # How certain the affiliation match is, from 0 (no match) to 1. Matches at or
+    # above Config.AFFILIATION_CONFIDENCE_THRESHOLD skip the LLM's affiliation check.
+    affiliation_confidence: float = 0.0
+
+    @property
+    def match_reason(self) -> Optional[str]:
+        """
+        The same match reason string that check_affiliation_single_pdf() returns:
+        email domain hits take priority over header hits.
+        """
+        if self.email_hits:
+            return f"Email Domain Match: {self.email_hits[0]}"
+        if self.header_hits:
+            return f"Header Keyword Match: {self.header_hits[0]}"
+        return None
+
+
+# Bump when analyze() changes in a way that makes stored results stale.
+ANALYSIS_VERSION = 3
+
+def analysis_fingerprint(config, max_pages: int = 3) -> str:
+    """
+    Identifies everything besides the PDF itself that a PdfAnalysis depends on,
+    so stored analyses (see pdf_store.py) are only reused under the same settings.
+    """
+    parts = [ANALYSIS_VERSION, max_pages, list(config.TARGET_INSTITUTIONS), list(config.TARGET_DOMAINS),
+             config.EMAIL_REGEX, config.HEADER_RATIO, config.LLM_TEXT_MODE, config.LLM_INPUT_TOKEN_BUDGET]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()[:16]
+
+
+# --- Process-pool helpers ---
+# PyMuPDF parsing is CPU-bound, so the pipeline runs it in a ProcessPoolExecutor.
+# Each worker process builds its own PdfProcessor once in the initializer.
+_worker_processor: Optional[PdfProcessor] = None
+
+def init_parse_worker(config):
+    """
+    Initializer for parse worker processes. Builds the per-process PdfProcessor.
+    """
+    global _worker_processor
+    _worker_processor = PdfProcessor(config)
+
+def parse_pdf(source: PdfSource, label: str = "<memory>") -> Optional[PdfAnalysis]:
+    """
+    Runs PdfProcessor.analyze() in a worker process. Only the path or bytes go
+    in and a small PdfAnalysis comes out, so it is cheap to call across a
+    process boundary.
+    """
+    return _worker_processor.analyze(source, label)
+
+
+class ParseService:
+    """
+    Runs PdfProcessor.analyze() for many threads on a pool of worker
+    processes, one per core by default (Config.PARSE_WORKERS).
+
+    Every worker builds its PdfProcessor (compiled regexes, matcher tables)
+    once, in init_parse_worker. Only the PDF path or bytes cross the process
+    boundary, and only a small PdfAnalysis comes back.
+
+    A document that takes longer than Config.PARSE_TIMEOUT_SECONDS is given up.
+    A running task can't be cancelled, so the pool is replaced: its processes
+    are terminated and a fresh pool takes over. Documents that were in flight
+    on the old pool are retried once on the new one.
+    """
+    def __init__(self, config, workers: Optional[int] = None, timeout: Optional[float] = None):
+        self.config = config
+        self.workers = workers or config.PARSE_WORKERS
+        self.timeout = timeout if timeout is not None else config.PARSE_TIMEOUT_SECONDS
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._pool = self._new_pool()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=init_parse_worker, initargs=(self.config,))
+
+    def _replace_pool(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is not broken:
+                return  # Another thread already replaced it.
+            self._pool = self._new_pool()
+            self.restarts += 1
+        # Kill the stuck worker(s); the executor offers no public way to do this.
+        for process in list((getattr(broken, "_processes", None) or {}).values()):
+            process.terminate()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def parse(self, source: PdfSource, label: str = "<memory>") -> Optional[PdfAnalysis]:
+        """
+        Analyzes one PDF in a worker process.
+
+        Returns:
+            PdfAnalysis: The result, or None if the PDF could not be opened,
+            timed out, or crashed its worker.
+        """
+        for attempt in range(2):
+            with self._lock:
+                pool = self._pool
+            try:
+                future = pool.submit(parse_pdf, source, label)
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                print(f"  -> [Warning] Parsing '{label}' took longer than {self.timeout:g}s. "
+                      f"Giving up on it and restarting the parse workers.")
+                metrics.PARSE_TIMEOUTS.inc()
+                self._replace_pool(pool)
+                return None
+            except (BrokenProcessPool, CancelledError, RuntimeError) as e:
+                # The pool was replaced under us (its queued tasks are cancelled, new
+                # submits fail) or a worker died: try once more on the current pool.
+                self._replace_pool(pool)
+                if attempt == 1:
+                    print(f"  -> [Error] Could not parse '{label}': {e}")
+        return None
+
+    def close(self):
+        with self._lock:
+            self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
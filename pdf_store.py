@@ -0,0 +1,346 @@
+import argparse
+import dataclasses
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Optional, Tuple, Union
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import SessionLocal, engine, write_lock
+import models
+from pdf_processor import PdfAnalysis
+
+# Access times are written in batches of this many lookups (and before an eviction).
+_TOUCH_BATCH = 50
+# put() keeps a running total of the stored bytes and recounts it from the
+# table every this many puts, since other processes may share the store.
+_RECOUNT_EVERY = 200
+
+
+class PdfStore:
+    """
+    A local, content-addressed store of downloaded PDFs.
+
+    PDF files are named by the SHA-256 of their content, under
+    Config.PDF_STORE_DIR, and the 'pdf_store' table maps each arXiv version
+    (e.g. '2506.01234v2') to its file. Next to each PDF, the store keeps the
+    PdfAnalysis of that PDF (one per analysis fingerprint), so reprocessing a
+    stored paper needs neither a download nor a parse.
+
+    Once the PDFs take more than Config.PDF_STORE_MAX_BYTES, the least recently
+    used versions are evicted, and their files are deleted when no other
+    version points at them. Files handed out with acquire=True are in use
+    until release() and are never evicted by this process meanwhile.
+    """
+    def __init__(self, config, session_factory=SessionLocal):
+        self.root = config.PDF_STORE_DIR
+        self.max_bytes = config.PDF_STORE_MAX_BYTES
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._in_use = Counter()  # sha256 -> files handed out and not yet released
+        self._touched = {}  # arxiv_id -> last access not yet written
+        self._total = None
+        self._puts = 0
+        os.makedirs(self.root, exist_ok=True)
+        # Make sure the table exists, also for databases created before the store was added.
+        models.PdfStoreEntry.__table__.create(bind=engine, checkfirst=True)
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], f"{sha256}.pdf")
+
+    def analysis_path(self, sha256: str, fingerprint: str) -> str:
+        return os.path.join(self.root, sha256[:2], f"{sha256}.{fingerprint}.analysis.json")
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _acquire(self, sha256: str) -> bool:
+        # Checked under the lock that evict() holds while deleting files.
+        with self._lock:
+            if not os.path.isfile(self.blob_path(sha256)):
+                return False
+            self._in_use[sha256] += 1
+            return True
+
+    def release(self, sha256: str):
+        """Marks a file handed out with acquire=True as no longer used."""
+        with self._lock:
+            self._in_use[sha256] -= 1
+            if self._in_use[sha256] <= 0:
+                del self._in_use[sha256]
+
+    def get(self, arxiv_id: str, acquire: bool = False) -> Optional[Tuple[str, str]]:
+        """
+        Looks up a stored PDF by versioned arXiv ID. The access time used for
+        eviction is recorded in memory and written in batches.
+
+        Args:
+            acquire (bool): Keep the file from being evicted until release(sha256).
+
+        Returns:
+            tuple: (file path, sha256), or None if the version is not stored.
+        """
+        db = self._session_factory()
+        try:
+            entry = db.get(models.PdfStoreEntry, arxiv_id)
+            if entry is None:
+                self._count(hit=False)
+                return None
+            sha256 = entry.sha256
+            path = self.blob_path(sha256)
+            if not (self._acquire(sha256) if acquire else os.path.isfile(path)):
+                # The file was removed behind our back: forget the entry.
+                with write_lock:
+                    db.delete(entry)
+                    db.commit()
+                self._count(hit=False)
+                return None
+            self._count(hit=True)
+            self._touch(arxiv_id)
+            return path, sha256
+        except SQLAlchemyError as e:
+            # The store must never break processing: treat errors as a miss.
+            print(f"  -> [Warning] PDF store lookup failed: {e}")
+            db.rollback()
+            self._count(hit=False)
+            return None
+        finally:
+            db.close()
+
+    def put(self, arxiv_id: str, source: Union[bytes, str], move: bool = False,
+            acquire: bool = False) -> Optional[Tuple[str, str]]:
+        """
+        Stores a PDF given as bytes or as a file path. With move=True a file
+        source is moved into the store instead of copied; with acquire=True the
+        stored file is kept from eviction until release(sha256).
+
+        Returns:
+            tuple: (file path in the store, sha256), or None if it could not be stored.
+        """
+        try:
+            sha256, size = _hash_source(source)
+        except OSError as e:
+            print(f"  -> [Warning] Could not store PDF {arxiv_id}: {e}")
+            return None
+        path = self.blob_path(sha256)
+        if acquire:
+            # Counted before the file is written or the source removed, so a
+            # concurrent evict() can't delete the blob in between.
+            with self._lock:
+                self._in_use[sha256] += 1
+        try:
+            if not os.path.isfile(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write under a temporary name and rename, so readers never see a partial file.
+                fd, partial_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+                with os.fdopen(fd, "wb") as f:
+                    if isinstance(source, str):
+                        with open(source, "rb") as src:
+                            shutil.copyfileobj(src, f)
+                    else:
+                        f.write(source)
+                os.replace(partial_path, path)
+            if move and isinstance(source, str) and os.path.abspath(source) != path:
+                os.remove(source)
+        except OSError as e:
+            print(f"  -> [Warning] Could not store PDF {arxiv_id}: {e}")
+            if acquire:
+                self.release(sha256)
+            return None
+
+        now = datetime.utcnow()
+        added = 0
+        db = self._session_factory()
+        try:
+            with write_lock:
+                Entry = models.PdfStoreEntry
+                if db.query(Entry.arxiv_id).filter(Entry.sha256 == sha256).first() is None:
+                    added = size  # The first version pointing at this file.
+                db.merge(Entry(arxiv_id=arxiv_id, sha256=sha256, size_bytes=size, created_at=now, last_accessed_at=now))
+                db.commit()
+        except SQLAlchemyError as e:
+            print(f"  -> [Warning] Could not index stored PDF {arxiv_id}: {e}")
+            db.rollback()
+            added = 0
+        finally:
+            db.close()
+
+        if self._stored_bytes(added) > self.max_bytes:
+            self.evict()
+        return path, sha256
+
+    def _stored_bytes(self, added: int) -> int:
+        """Adds to the running total of stored bytes and returns it."""
+        with self._lock:
+            self._puts += 1
+            if self._total is not None and self._puts % _RECOUNT_EVERY:
+                self._total += added
+                return self._total
+        total = self.total_bytes()
+        with self._lock:
+            self._total = total
+        return total
+
+    def _touch(self, arxiv_id: str):
+        with self._lock:
+            self._touched[arxiv_id] = datetime.utcnow()
+            full = len(self._touched) >= _TOUCH_BATCH
+        if full:
+            self.flush_access_times()
+
+    def flush_access_times(self):
+        """Writes the access times recorded by get() since the last flush, in one transaction."""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return
+        db = self._session_factory()
+        try:
+            with write_lock:
+                Entry = models.PdfStoreEntry
+                for arxiv_id, accessed_at in touched.items():
+                    db.query(Entry).filter(Entry.arxiv_id == arxiv_id).update(
+                        {Entry.last_accessed_at: accessed_at}, synchronize_session=False)
+                db.commit()
+        except SQLAlchemyError as e:
+            print(f"  -> [Warning] Could not record PDF store access times: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    def get_analysis(self, sha256: str, fingerprint: str) -> Optional[PdfAnalysis]:
+        """Returns the stored PdfAnalysis of a PDF, or None."""
+        try:
+            with open(self.analysis_path(sha256, fingerprint), encoding="utf-8") as f:
+                return PdfAnalysis(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def put_analysis(self, sha256: str, fingerprint: str, analysis: PdfAnalysis):
+        """Stores the PdfAnalysis of a stored PDF next to it."""
+        path = self.analysis_path(sha256, fingerprint)
+        if not os.path.isfile(self.blob_path(sha256)):
+            return  # Only keep analyses of PDFs that are in the store.
+        try:
+            fd, partial_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(dataclasses.asdict(analysis), f)
+            os.replace(partial_path, path)
+        except OSError as e:
+            print(f"  -> [Warning] Could not store the analysis of {sha256[:12]}: {e}")
+
+    def total_bytes(self) -> int:
+        """The size of all stored PDF files (each file counted once)."""
+        db = self._session_factory()
+        try:
+            files = (
+                db.query(models.PdfStoreEntry.sha256, func.max(models.PdfStoreEntry.size_bytes).label("size"))
+                .group_by(models.PdfStoreEntry.sha256)
+                .subquery()
+            )
+            return db.query(func.coalesce(func.sum(files.c.size), 0)).scalar()
+        finally:
+            db.close()
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """
+        Removes least recently used versions until the store is within
+        max_bytes (defaults to Config.PDF_STORE_MAX_BYTES). Versions whose
+        file is in use (see acquire) are skipped.
+
+        Returns:
+            int: The number of evicted versions.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        self.flush_access_times()
+        evicted = 0
+        db = self._session_factory()
+        try:
+            with write_lock:
+                Entry = models.PdfStoreEntry
+                total = self.total_bytes()
+                oldest = []
+                if total > max_bytes:
+                    oldest = (db.query(Entry.arxiv_id, Entry.sha256, Entry.size_bytes)
+                              .order_by(Entry.last_accessed_at.asc()).all())
+                for arxiv_id, sha256, size_bytes in oldest:
+                    if total <= max_bytes:
+                        break
+                    with self._lock:
+                        if self._in_use[sha256]:
+                            continue
+                        db.query(Entry).filter(Entry.arxiv_id == arxiv_id).delete(synchronize_session=False)
+                        evicted += 1
+                        if db.query(Entry.arxiv_id).filter(Entry.sha256 == sha256).first() is None:
+                            total -= size_bytes
+                            self._delete_files(sha256)
+                db.commit()
+                with self._lock:
+                    self._total = total
+        finally:
+            db.close()
+        return evicted
+
+    def _delete_files(self, sha256: str):
+        directory = os.path.dirname(self.blob_path(sha256))
+        for name in os.listdir(directory) if os.path.isdir(directory) else []:
+            if name.startswith(sha256):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    def stats_line(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = (self.hits / total * 100) if total else 0.0
+        return f"PDF store: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate)"
+
+
+def _hash_source(source: Union[bytes, str]) -> Tuple[str, int]:
+    digest = hashlib.sha256()
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest(), os.path.getsize(source)
+    digest.update(source)
+    return digest.hexdigest(), len(source)
+
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Manage the local PDF store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Show the number of stored versions and the total size.")
+    evict_parser = subparsers.add_parser("evict", help="Evict least recently used PDFs down to the size limit.")
+    evict_parser.add_argument("--max-gb", type=float, default=None, help="Evict down to this size instead of PDF_STORE_MAX_GB.")
+    args = parser.parse_args()
+
+    store = PdfStore(Config())
+    if args.command == "evict":
+        max_bytes = int(args.max_gb * 1024 ** 3) if args.max_gb is not None else None
+        print(f"Evicted {store.evict(max_bytes)} stored PDF versions.")
+    db = SessionLocal()
+    try:
+        versions = db.query(models.PdfStoreEntry).count()
+    finally:
+        db.close()
+    print(f"{versions} versions, {store.total_bytes() / 1024 ** 2:.1f} MB in {store.root}")
+
+
+if __name__ == "__main__":
+    main()
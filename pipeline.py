@@ -0,0 +1,235 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+import metrics
+
+# A unique marker object that tells a stage worker there is no more input.
+_SENTINEL = object()
+
+
+class StageStats:
+    """
+    Thread-safe counters for a single pipeline stage.
+    Tracks how many items went in and out, how many failed, and how much
+    worker time was spent, so a run can report per-stage throughput.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.processed = 0
+        self.passed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, duration: float, passed: bool, failed: bool = False):
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = time.monotonic() - duration
+            self.processed += 1
+            self.busy_seconds += duration
+            if passed:
+                self.passed += 1
+            if failed:
+                self.failed += 1
+        metrics.STAGE_SECONDS.observe(duration, stage=self.name)
+        metrics.STAGE_ITEMS.inc(stage=self.name, outcome="failed" if failed else "passed" if passed else "dropped")
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = time.monotonic()
+
+    @property
+    def wall_seconds(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return max(self.finished_at - self.started_at, 0.0)
+
+    def summary_line(self) -> str:
+        """
+        Returns a one-line, human-readable throughput report for this stage.
+        """
+        wall = self.wall_seconds
+        rate = (self.processed / wall * 60) if wall > 0 else 0.0
+        avg = (self.busy_seconds / self.processed) if self.processed else 0.0
+        return (f"{self.name:<10} in={self.processed:<5} out={self.passed:<5} failed={self.failed:<4} "
+                f"wall={wall:7.1f}s avg={avg:6.2f}s/item throughput={rate:7.1f} items/min")
+
+
+class Stage:
+    """
+    One step of the processing pipeline, backed by a bounded input queue and
+    a fixed number of worker threads.
+
+    The handler receives one item and returns the item to hand to the next
+    stage, or None to drop it (e.g. a paper that failed a filter). Exceptions
+    raised by the handler are logged and counted as failures; they never stop
+    the other workers.
+
+    With batch_size > 1 the handler instead receives a list of up to
+    batch_size items (waiting at most batch_wait seconds to fill it) and
+    returns the list of items to pass on.
+
+    If on_item_done is set, it is called as on_item_done(item, outcome, error)
+    when an item leaves the pipeline here: outcome is 'dropped', 'failed', or
+    (in the last stage) 'done'.
+    """
+    def __init__(self, name: str, handler: Callable[[Any], Any], workers: int, queue_size: int = 0,
+                 batch_size: int = 1, batch_wait: float = 0.0):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.batch_wait = batch_wait
+        self.stats = StageStats(name)
+        self.next_stage: Optional["Stage"] = None
+        self.on_item_done: Optional[Callable[[Any, str, Optional[str]], None]] = None
+        self._inbox: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, item: Any):
+        # Blocks when the queue is full, which applies back-pressure upstream.
+        self._inbox.put(item)
+
+    def close(self):
+        """
+        Signals that no more input will arrive, waits for all workers to drain
+        the queue, and then closes the downstream stage.
+        """
+        for _ in self._threads:
+            self._inbox.put(_SENTINEL)
+        for thread in self._threads:
+            thread.join()
+        self.stats.finish()
+        if self.next_stage:
+            self.next_stage.close()
+
+    def _item_done(self, item: Any, outcome: str, error: Optional[str] = None):
+        if self.on_item_done is None:
+            return
+        try:
+            self.on_item_done(item, outcome, error)
+        except Exception as e:
+            print(f"  -> [Error] Stage '{self.name}' could not report an item as {outcome}: {e}")
+
+    def _forward(self, result: Any):
+        if self.next_stage:
+            self.next_stage.put(result)
+        else:
+            self._item_done(result, "done")
+
+    def _run(self):
+        if self.batch_size > 1:
+            self._run_batched()
+            return
+        while True:
+            item = self._inbox.get()
+            if item is _SENTINEL:
+                return
+            started = time.monotonic()
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                print(f"  -> [Error] Stage '{self.name}' failed on an item: {e}")
+                self.stats.record(time.monotonic() - started, passed=False, failed=True)
+                self._item_done(item, "failed", str(e))
+                continue
+            self.stats.record(time.monotonic() - started, passed=result is not None)
+            if result is None:
+                self._item_done(item, "dropped")
+            else:
+                self._forward(result)
+
+    def _next_batch(self) -> Tuple[List[Any], bool]:
+        """
+        Collects up to batch_size items. Returns (batch, finished), where
+        finished is True once this worker's sentinel has been received.
+        """
+        first = self._inbox.get()
+        if first is _SENTINEL:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                item = self._inbox.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is _SENTINEL:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run_batched(self):
+        finished = False
+        while not finished:
+            batch, finished = self._next_batch()
+            if not batch:
+                continue
+            started = time.monotonic()
+            try:
+                results = self.handler(batch) or []
+            except Exception as e:
+                print(f"  -> [Error] Stage '{self.name}' failed on a batch of {len(batch)}: {e}")
+                per_item = (time.monotonic() - started) / len(batch)
+                for item in batch:
+                    self.stats.record(per_item, passed=False, failed=True)
+                    self._item_done(item, "failed", str(e))
+                continue
+            per_item = (time.monotonic() - started) / len(batch)
+            for i in range(len(batch)):
+                self.stats.record(per_item, passed=i < len(results))
+            passed_ids = {id(result) for result in results}
+            for item in batch:
+                if id(item) not in passed_ids:
+                    self._item_done(item, "dropped")
+            for result in results:
+                self._forward(result)
+
+
+class Pipeline:
+    """
+    Chains several Stages together. Items fed into the pipeline flow through
+    every stage in order; each stage runs with its own bounded worker pool.
+    The optional on_item_done callback is told how each item left the
+    pipeline (see Stage).
+    """
+    def __init__(self, stages: List[Stage], on_item_done: Optional[Callable[[Any, str, Optional[str]], None]] = None):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage.")
+        self.stages = stages
+        for upstream, downstream in zip(stages, stages[1:]):
+            upstream.next_stage = downstream
+        for stage in stages:
+            stage.on_item_done = on_item_done
+
+    def run(self, items) -> List[StageStats]:
+        """
+        Feeds all items through the pipeline and blocks until every stage has finished.
+
+        Returns:
+            List[StageStats]: The statistics for each stage, in pipeline order.
+        """
+        for stage in self.stages:
+            stage.start()
+        try:
+            for item in items:
+                self.stages[0].put(item)
+        finally:
+            self.stages[0].close()
+        return [stage.stats for stage in self.stages]
+
+    @staticmethod
+    def print_report(stats: List[StageStats]):
+        print("\n--- Pipeline stage throughput ---")
+        for stage_stats in stats:
+            print(stage_stats.summary_line())
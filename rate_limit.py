@@ -0,0 +1,299 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+import metrics
+
+
+class AsyncTokenBucket:
+    """
+    A token-bucket rate limiter for asyncio code.
+
+    Tokens are refilled continuously at `rate` per second, up to `capacity`.
+    Each request takes one token; when the bucket is empty, callers wait
+    (in FIFO order) until enough tokens have been refilled. This paces
+    requests evenly instead of sleeping a fixed amount before each one.
+    """
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive.")
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """
+        Waits until `tokens` tokens are available and takes them.
+        """
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def penalize(self, seconds: float):
+        """
+        Drains the bucket so that no request is let through for `seconds`.
+        Used when the server asks us to slow down (e.g. HTTP 429 with Retry-After).
+        """
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+# Kinds of failed LLM calls, see classify_error().
+THROTTLED = "throttled"  # 429: the quota is exhausted, everybody should slow down
+TRANSIENT = "transient"  # 5xx or a network error: worth retrying this call
+FATAL = "fatal"          # Anything else (bad request, bad key, ...): retrying won't help
+
+_TRANSIENT_CODES = {500, 502, 503, 504}
+_WINDOW_SECONDS = 60.0
+
+
+class LLMRateController:
+    """
+    A limiter shared by all Gemini calls of the process.
+
+    Every call must hold a slot (see slot()) while it is in flight. Slots are
+    handed out within three limits:
+      - requests per minute (Config.LLM_RPM_LIMIT) and estimated tokens per
+        minute (Config.LLM_TPM_LIMIT), over a sliding 60 second window;
+      - a concurrency limit that adapts AIMD-style: it grows by about one
+        slot per limit's worth of successful calls, up to
+        Config.LLM_MAX_CONCURRENCY, and is halved on a 429.
+    A 429 also pauses all callers until its retry-after (or a jittered
+    exponential backoff) has passed, so concurrent jobs back off together
+    instead of each hammering the quota on their own schedule.
+    """
+    def __init__(self, config):
+        self.rpm_limit = config.LLM_RPM_LIMIT
+        self.tpm_limit = config.LLM_TPM_LIMIT
+        self.max_concurrency = max(config.LLM_MAX_CONCURRENCY, 1)
+        self.backoff_base = config.LLM_BACKOFF_BASE_SECONDS
+        self.backoff_max = config.LLM_BACKOFF_MAX_SECONDS
+        self.concurrency_limit = float(self.max_concurrency)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._window = deque()  # [started_at, tokens] of the calls of the last minute
+        self._window_tokens = 0
+        self._paused_until = 0.0
+        self._last_decrease = float("-inf")
+        # Metrics
+        self.calls = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.throttle_events = 0
+        self.transient_errors = 0
+
+    @contextmanager
+    def slot(self, estimated_tokens: int = 0):
+        """
+        Waits for a free slot and holds it for the duration of the with-block.
+        The yielded ticket is passed back to on_success() / on_throttle().
+        """
+        ticket = self.acquire(estimated_tokens)
+        try:
+            yield ticket
+        finally:
+            self.release()
+
+    def acquire(self, estimated_tokens: int = 0) -> list:
+        requested = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._prune(now)
+                wait = self._wait_time(now, estimated_tokens)
+                if wait <= 0:
+                    break
+                self._cond.wait(timeout=min(wait, 1.0))
+            ticket = [now, estimated_tokens]
+            self._window.append(ticket)
+            self._window_tokens += estimated_tokens
+            self._in_flight += 1
+            waited = time.monotonic() - requested
+            self.calls += 1
+            self.queue_wait_total += waited
+            self.queue_wait_max = max(self.queue_wait_max, waited)
+        metrics.LLM_QUEUE_WAIT.observe(waited)
+        return ticket
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _prune(self, now: float):
+        while self._window and self._window[0][0] <= now - _WINDOW_SECONDS:
+            _, tokens = self._window.popleft()
+            self._window_tokens -= tokens
+
+    def _wait_time(self, now: float, estimated_tokens: int) -> float:
+        """Seconds until a new call may start (0 if it may start now)."""
+        if self._paused_until > now:
+            return self._paused_until - now
+        if self._in_flight >= int(self.concurrency_limit):
+            return 1.0  # Woken up by release()
+        if self.rpm_limit and len(self._window) >= self.rpm_limit:
+            return self._window[0][0] + _WINDOW_SECONDS - now
+        if (self.tpm_limit and self._window and
+                self._window_tokens + estimated_tokens > self.tpm_limit):
+            return self._window[0][0] + _WINDOW_SECONDS - now
+        return 0.0
+
+    def on_success(self, ticket: list, tokens_used: Optional[int] = None):
+        """
+        Additive increase after a successful call. tokens_used, when the
+        response reports it, replaces the estimate in the TPM window.
+        """
+        with self._cond:
+            if tokens_used is not None:
+                self._window_tokens += tokens_used - ticket[1]
+                ticket[1] = tokens_used
+            self.concurrency_limit = min(self.concurrency_limit + 1.0 / self.concurrency_limit,
+                                         float(self.max_concurrency))
+            self._cond.notify_all()
+
+    def on_throttle(self, ticket: list, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Multiplicative decrease after a 429, and a pause for all callers.
+
+        Only calls started after the last decrease lower the limit again, so a
+        burst of 429s from calls that were already in flight counts once.
+
+        Returns:
+            float: The number of seconds all callers are paused.
+        """
+        delay = self.backoff_delay(attempt, retry_after)
+        with self._cond:
+            now = time.monotonic()
+            self.throttle_events += 1
+            if ticket[0] > self._last_decrease:
+                self.concurrency_limit = max(self.concurrency_limit / 2, 1.0)
+                self._last_decrease = now
+            self._paused_until = max(self._paused_until, now + delay)
+        return delay
+
+    def on_transient_error(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Returns the backoff before retrying a call that failed with a 5xx or network error."""
+        with self._cond:
+            self.transient_errors += 1
+        return self.backoff_delay(attempt, retry_after)
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Exponential backoff with jitter: half of base * 2^attempt (capped at
+        LLM_BACKOFF_MAX_SECONDS) plus a random part up to the other half. A
+        retry-after from the server is honored, with up to a second of jitter
+        so the paused callers don't all resume at once.
+        """
+        if retry_after is not None:
+            return retry_after + random.uniform(0, 1.0)
+        ceiling = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "calls": self.calls,
+                "in_flight": self._in_flight,
+                "concurrency_limit": self.concurrency_limit,
+                "queue_wait_seconds_total": self.queue_wait_total,
+                "queue_wait_seconds_max": self.queue_wait_max,
+                "throttle_events": self.throttle_events,
+                "transient_errors": self.transient_errors,
+            }
+
+    def stats_line(self) -> str:
+        s = self.snapshot()
+        avg_wait = s["queue_wait_seconds_total"] / s["calls"] if s["calls"] else 0.0
+        return (f"LLM rate limiter: {s['calls']} calls, queue wait avg {avg_wait:.2f}s / max "
+                f"{s['queue_wait_seconds_max']:.2f}s, {s['throttle_events']} throttled (429), "
+                f"{s['transient_errors']} transient errors, concurrency limit {s['concurrency_limit']:.1f}")
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_rate_controller(config) -> LLMRateController:
+    """Returns the process-wide LLMRateController, creating it on first use."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = LLMRateController(config)
+        return _shared
+
+
+def classify_error(error: Exception) -> Tuple[str, Optional[float]]:
+    """
+    Sorts a failed Gemini call into THROTTLED, TRANSIENT or FATAL, using the
+    HTTP status code of google.genai.errors.APIError.
+
+    Returns:
+        tuple: (kind, retry_after in seconds or None).
+    """
+    code = getattr(error, "code", None)
+    if not isinstance(code, int):
+        code = getattr(error, "status_code", None)
+    if code == 429 or getattr(error, "status", None) == "RESOURCE_EXHAUSTED":
+        return THROTTLED, _retry_after(error)
+    if code in _TRANSIENT_CODES:
+        return TRANSIENT, _retry_after(error)
+    if isinstance(error, (ConnectionError, TimeoutError)) or _is_transport_error(error):
+        return TRANSIENT, None
+    return FATAL, None
+
+
+def _is_transport_error(error: Exception) -> bool:
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(error, httpx.TransportError)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """
+    The server's retry-after: the Retry-After header if there is one,
+    otherwise the RetryInfo.retryDelay (e.g. "27s") of the error details.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after")
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                pass  # An HTTP date; fall back to the details.
+    return _find_retry_delay(getattr(error, "details", None))
+
+
+def _find_retry_delay(details) -> Optional[float]:
+    if isinstance(details, dict):
+        value = details.get("retryDelay")
+        if isinstance(value, str):
+            match = re.fullmatch(r"(\d+(?:\.\d+)?)s", value.strip())
+            if match:
+                return float(match.group(1))
+        details = list(details.values())
+    if isinstance(details, list):
+        for value in details:
+            delay = _find_retry_delay(value)
+            if delay is not None:
+                return delay
+    return None
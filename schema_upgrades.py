@@ -0,0 +1,91 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+import models
+
+# Columns added to the papers table after it was first created, with their SQL types.
+# create_all() never alters existing tables, so they are added here.
+_PAPER_COLUMNS = {
+    "base_id": "VARCHAR",
+    "version": "INTEGER",
+    "pdf_sha256": "VARCHAR(64)",
+    "text_sha256": "VARCHAR(64)",
+}
+_JOB_COLUMNS = {
+    "summary": "TEXT",
+}
+
+
+def upgrade_papers_table(engine: Engine):
+    """
+    Brings an existing papers table up to date with the version-aware schema:
+    adds the base_id/version/hash columns, fills base_id and version from the
+    versioned arxiv_id, keeps only the newest version when several versions of
+    a paper were stored as separate rows, and adds the unique base_id index.
+    Safe to run repeatedly.
+    """
+    from arxiv_client import split_arxiv_id
+
+    if not _add_missing_columns(engine, models.Paper.__tablename__, _PAPER_COLUMNS):
+        return
+
+    with engine.begin() as conn:
+        rows = conn.execute(text("SELECT id, arxiv_id FROM papers WHERE base_id IS NULL OR version IS NULL")).fetchall()
+        if rows:
+            _label_versions(conn, rows, split_arxiv_id)
+
+    for index in models.Paper.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
+def upgrade_jobs_table(engine: Engine):
+    """
+    Adds the columns and the unique active-job index introduced after the jobs
+    table was first created. Safe to run repeatedly.
+    """
+    if not _add_missing_columns(engine, models.Job.__tablename__, _JOB_COLUMNS):
+        return
+    for index in models.Job.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
+def _add_missing_columns(engine: Engine, table_name: str, columns: dict) -> bool:
+    """
+    Adds the given columns to the table where they are missing.
+
+    Returns:
+        bool: False if the table does not exist (create_all() will create it in full).
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(table_name):
+        return False
+    existing_columns = {column["name"] for column in inspector.get_columns(table_name)}
+    with engine.begin() as conn:
+        for name, sql_type in columns.items():
+            if name not in existing_columns:
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {sql_type}"))
+    return True
+
+
+def _label_versions(conn, rows, split_arxiv_id):
+    # The newest stored version of every base ID.
+    newest = {}
+    for row in conn.execute(text("SELECT id, arxiv_id, base_id, version FROM papers")):
+        base_id, version = (row.base_id, row.version) if row.base_id and row.version else split_arxiv_id(row.arxiv_id)
+        if base_id not in newest or version > newest[base_id][1]:
+            newest[base_id] = (row.id, version)
+
+    duplicate_ids = []
+    for row in rows:
+        base_id, version = split_arxiv_id(row.arxiv_id)
+        if newest[base_id][0] != row.id:
+            duplicate_ids.append(row.id)
+            continue
+        conn.execute(text("UPDATE papers SET base_id = :base_id, version = :version WHERE id = :id"),
+                     {"base_id": base_id, "version": version, "id": row.id})
+
+    for paper_id in duplicate_ids:
+        conn.execute(text("DELETE FROM paper_institution_association WHERE paper_id = :id"), {"id": paper_id})
+        conn.execute(text("DELETE FROM papers WHERE id = :id"), {"id": paper_id})
+    if duplicate_ids:
+        print(f"Removed {len(duplicate_ids)} rows of older versions of papers that were stored twice.")
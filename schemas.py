@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from datetime import date
+from datetime import date, datetime
 from typing import List, Optional 
 
 # --- Schema for creating/representing an Institution ---
@@ -20,9 +20,113 @@ class PaperBase(BaseModel):
     publish_date: Optional[date] = None
     llm_summary: Optional[str] = None
 
+class PaperCreate(PaperBase):
+    # Version bookkeeping, written by the pipeline but not exposed by the API.
+    base_id: str
+    version: int
+    pdf_sha256: Optional[str] = None
+    text_sha256: Optional[str] = None
+
 class Paper(PaperBase):
     id: int
     institutions: List[Institution] = []
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# --- Schemas for the paginated paper list ---
+class PaperListItem(BaseModel):
+    id: int
+    arxiv_id: str
+    title: str
+    publish_date: Optional[date] = None
+    institutions: List[Institution] = []
+    # Left out of compact list views.
+    abstract: Optional[str] = None
+    llm_summary: Optional[str] = None
+
+class PaperPage(BaseModel):
+    items: List[PaperListItem]
+    # Pass this back as `cursor` to fetch the next page; None on the last page.
+    next_cursor: Optional[str] = None
+
+
+# --- Schemas for full-text search results ---
+class PaperSearchHit(BaseModel):
+    id: int
+    arxiv_id: str
+    title: str
+    publish_date: Optional[date] = None
+    rank: float  # BM25 score; lower is a better match
+    # Matched terms are wrapped in <mark>...</mark>.
+    title_highlight: str
+    abstract_snippet: Optional[str] = None
+    summary_snippet: Optional[str] = None
+
+class PaperSearchPage(BaseModel):
+    items: List[PaperSearchHit]
+    # Pass this back as `offset` to fetch the next page; None on the last page.
+    next_offset: Optional[int] = None
+
+
+# --- Schemas for backfills ---
+class BackfillRequest(BaseModel):
+    start_date: str  # 'YYYYMMDD'
+    end_date: str    # 'YYYYMMDD', inclusive
+    granularity: str = "day"  # 'day' or 'hour'
+
+class BackfillShard(BaseModel):
+    shard_start: str
+    shard_end: str
+    status: str
+    candidates: int = 0
+    downloads: int = 0
+    llm_calls: int = 0
+    saved: int = 0
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class BackfillStatus(BaseModel):
+    backfill_id: str
+    shards: List[BackfillShard]
+    # The queued job running the backfill (see /api/jobs/{id}); set when triggering.
+    job_id: Optional[int] = None
+
+
+# --- Schemas for the job queue ---
+class JobTriggered(BaseModel):
+    job_id: int
+    status: str
+    # False when an identical job was already queued or running and is returned instead.
+    created: bool
+    message: str
+    processing_date: Optional[str] = None
+
+class JobItemCounts(BaseModel):
+    pending: int = 0
+    done: int = 0
+    dropped: int = 0   # Filtered out (no affiliation match, LLM said no, ...)
+    failed: int = 0
+
+class JobStatus(BaseModel):
+    id: int
+    kind: str
+    params: dict
+    status: str
+    attempts: int
+    candidates: int = 0
+    downloads: int = 0
+    llm_calls: int = 0
+    saved: int = 0
+    items: JobItemCounts
+    error: Optional[str] = None
+    # Durations and counts of the last attempt (see metrics.run_summary).
+    summary: Optional[dict] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,145 @@
+import argparse
+import re
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# --- SQLite FTS5 full-text index over papers ---
+# papers_fts is an "external content" FTS5 table: it stores only the inverted
+# index and reads the text from the papers table. Triggers keep it in sync on
+# every INSERT, UPDATE and DELETE, including the bulk upserts in crud.py.
+
+FTS_TABLE = "papers_fts"
+
+# bm25() column weights: a hit in the title counts more than one in the summary or abstract.
+# They are stored as the table's default ranking so that "ORDER BY rank" can
+# use FTS5's built-in, faster rank column instead of calling bm25() per row.
+_BM25_WEIGHTS = "10.0, 2.0, 4.0"
+
+_CREATE_STATEMENTS = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, abstract, llm_summary,
+        content='papers', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS papers_fts_after_insert AFTER INSERT ON papers BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, abstract, llm_summary)
+        VALUES (new.id, new.title, new.abstract, new.llm_summary);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS papers_fts_after_delete AFTER DELETE ON papers BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, abstract, llm_summary)
+        VALUES ('delete', old.id, old.title, old.abstract, old.llm_summary);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS papers_fts_after_update AFTER UPDATE ON papers BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, abstract, llm_summary)
+        VALUES ('delete', old.id, old.title, old.abstract, old.llm_summary);
+        INSERT INTO {FTS_TABLE}(rowid, title, abstract, llm_summary)
+        VALUES (new.id, new.title, new.abstract, new.llm_summary);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25({_BM25_WEIGHTS})')",
+]
+
+_SEARCH_SQL = text(f"""
+    SELECT p.id, p.arxiv_id, p.title, p.publish_date,
+           {FTS_TABLE}.rank AS rank,
+           highlight({FTS_TABLE}, 0, '<mark>', '</mark>') AS title_highlight,
+           snippet({FTS_TABLE}, 1, '<mark>', '</mark>', '…', 32) AS abstract_snippet,
+           snippet({FTS_TABLE}, 2, '<mark>', '</mark>', '…', 32) AS summary_snippet
+    FROM {FTS_TABLE}
+    JOIN papers AS p ON p.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH :query
+    ORDER BY {FTS_TABLE}.rank
+    LIMIT :limit OFFSET :offset
+""")
+
+
+def is_supported(engine: Engine) -> bool:
+    """FTS5 is SQLite-only."""
+    return engine.dialect.name == "sqlite"
+
+
+def ensure_fts_index(engine: Engine):
+    """
+    Creates the FTS table and its sync triggers if they are missing. When the
+    table is created for the first time, it is filled from existing papers.
+    """
+    if not is_supported(engine):
+        return
+    with engine.begin() as conn:
+        existed = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+        ).first() is not None
+        for statement in _CREATE_STATEMENTS:
+            conn.execute(text(statement))
+        if not existed:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def rebuild_fts_index(engine: Engine):
+    """
+    Rebuilds the whole index from the papers table (e.g. for an existing papers.db).
+    """
+    ensure_fts_index(engine)
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+
+
+def to_match_query(user_query: str) -> str:
+    """
+    Turns free text into a safe FTS5 query: every word becomes a quoted term,
+    and all terms must match. A trailing '*' on a word keeps prefix matching.
+    """
+    terms = []
+    for word in re.findall(r"[\w\-']+\*?", user_query):
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def search_papers(db: Session, user_query: str, limit: int, offset: int = 0) -> List[dict]:
+    """
+    Runs a BM25-ranked full-text search over title, abstract and llm_summary.
+
+    Returns:
+        list: One dict per hit with the paper fields, its rank and the highlighted snippets.
+    """
+    match_query = to_match_query(user_query)
+    if not match_query:
+        return []
+    rows = db.execute(_SEARCH_SQL, {"query": match_query, "limit": limit, "offset": offset}).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def main():
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Manage the SQLite FTS5 full-text index over papers.")
+    parser.add_argument("command", choices=["create", "rebuild"],
+                        help="'create' adds the index and triggers if missing; 'rebuild' re-indexes every paper.")
+    args = parser.parse_args()
+
+    if not is_supported(engine):
+        print("Full-text search requires SQLite (FTS5). Nothing to do.")
+        return
+    if args.command == "create":
+        ensure_fts_index(engine)
+    else:
+        rebuild_fts_index(engine)
+    print(f"Full-text index '{FTS_TABLE}' is ready.")
+
+
+if __name__ == "__main__":
+    main()
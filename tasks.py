@@ -1,134 +1,430 @@
+import hashlib
 import os
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 # Import our new CRUD tools and database session provider
 import crud
-from database import SessionLocal
+from database import SessionLocal, engine, write_lock
+import search_index
+import schema_upgrades
+import digests
 
 # Import schemas for data validation
 import schemas
 
 # --- IMPORTANT: Import your original classes ---
 # We assume these files are in the same directory.
-from arxiv_client import ArxivClient
-from pdf_downloader import PdfDownloader
-from pdf_processor import PdfProcessor
-from llm_summarizer import LLMSummarizer
+from arxiv_client import ArxivClient, split_arxiv_id
+from async_downloader import BackgroundPdfDownloader, DownloadedPdf
+from pdf_processor import ParseService, analysis_fingerprint
+from llm_summarizer import LLMSummarizer, SUMMARIZE, VERIFY_AND_SUMMARIZE
+from decision_log import AffiliationDecisionLog
+import metrics
+from llm_cache import LLMResponseCache
 from config import Config
+from pipeline import Pipeline, Stage
 
-def process_and_save_papers(date_str: str):
+
+@dataclass
+class PaperWorkItem:
     """
-    The main background task that orchestrates the entire workflow.
-    It fetches, filters, processes, and saves papers to the database.
+    The unit of work that flows through the pipeline stages. Each stage fills
+    in the fields it is responsible for.
+    """
+    paper: "arxiv.Result"
+    short_id: str
+    base_id: str
+    version: int
+    # The stored row of an earlier version of this paper (see crud.get_known_versions), if any.
+    previous: Optional[object] = None
+    pdf: Optional[DownloadedPdf] = None
+    pdf_sha256: Optional[str] = None
+    match_reason: Optional[str] = None
+    affiliation_confidence: float = 0.0
+    extracted_text: Optional[str] = None
+    text_sha256: Optional[str] = None
+    summary: Optional[str] = None
+    # Set when the PDF or the extracted text is identical to the stored version's:
+    # the remaining stages are skipped and the stored summary and institutions are kept.
+    unchanged: Optional[str] = None  # 'pdf' or 'text'
+    # Why a dropped paper failed (as opposed to being filtered out), e.g. a failed download.
+    error: Optional[str] = None
+    # The job_items row tracking this paper, when it runs as part of a queued job (see jobs.py).
+    job_item_id: Optional[int] = None
 
-    Args:
-        date_str (str): The target date in 'YYYYMMDD' format.
+
+@dataclass
+class RunStats:
     """
-    print(f"--- Starting background task for date: {date_str} ---")
+    Counts reported at the end of a processing run.
+    """
+    candidates: int = 0   # Keyword-matching papers returned by arXiv
+    downloads: int = 0
+    llm_calls: int = 0    # Gemini requests actually sent (cache hits excluded)
+    saved: int = 0
+    # The newest (updated, arxiv_id) position among all fetched results, matching or not.
+    # Incremental harvests store it as their next high-water mark.
+    newest_seen: Optional[Tuple[datetime, str]] = None
+    # The (updated, arxiv_id) positions of papers that failed (download, parse or LLM
+    # errors, as opposed to being filtered out) and did not succeed on a retry.
+    failed: Dict[str, Tuple[datetime, str]] = field(default_factory=dict)
 
-    # Each background task should get its own database session.
-    db: Session = SessionLocal()
 
-    try:
-        # --- Instantiate your original components ---
-        # Note: We create a new Config object here. Since it's now static,
-        # it doesn't matter if it's created multiple times.
-        config_instance = Config()
-        
-        # We need to make a small temporary adjustment to your original classes
-        # to accept the date parameter instead of calculating it internally.
-        
-        # --- Step 1: arXiv Search and Keyword Filtering ---
-        arxiv_client = ArxivClient(config_instance)
-        # We'll need to slightly modify ArxivClient to accept a date.
-        # For now, let's assume a hypothetical `search_by_date` method.
-        # This is a placeholder for now, we will fix it in the next step.
-        print("Step 1: Searching arXiv...")
-        target_date_start = f"{date_str}000000"
-        target_date_end = f"{date_str}235959"
-        
-        # This is a mock implementation. We will modify the actual class later.
-        initial_papers = arxiv_client.search_and_filter_papers(
-            date_start_str=target_date_start,
-            date_end_str=target_date_end
-        )
-        if not initial_papers:
-            print("No papers found matching keywords on arXiv. Task finished.")
-            return
-
-        print(f"Found {len(initial_papers)} initial papers.")
-
-        # --- Instantiate other components ---
-        downloader = PdfDownloader(config_instance)
-        pdf_processor = PdfProcessor(config_instance)
-        summarizer = LLMSummarizer(config_instance)
-        
-        # We need a temporary download directory for PDFs
-        os.makedirs(Config.TEMP_DOWNLOAD_DIR, exist_ok=True)
-
-        # --- Step 2 & 3: Download, Process, and Save each paper ---
-        print("\nStep 2 & 3: Processing each paper individually...")
-        for i, paper_from_arxiv in enumerate(initial_papers):
-            short_id = paper_from_arxiv.get_short_id()
-            print(f"[{i+1}/{len(initial_papers)}] Processing: {short_id} - {paper_from_arxiv.title[:50]}...")
+def _build_stages(db: Session, downloader: BackgroundPdfDownloader, parse_service: ParseService,
+                  summarizer: LLMSummarizer, download_dir: str, saved_dates: Set[date]) -> List[Stage]:
+    """
+    Builds the four pipeline stages: download -> parse -> llm -> persist.
+    Each stage returns the work item to pass it on, or None to drop the paper
+    (setting item.error when the paper failed rather than being filtered out).
+    The persist stage adds the publish dates of the papers it saves to saved_dates.
+    """
+    def download(item: PaperWorkItem) -> Optional[PaperWorkItem]:
+        print(f"[download] {item.short_id} - {item.paper.title[:50]}...")
+        pdf = downloader.fetch(item.paper, download_dir)
+        if not pdf:
+            print(f"  -> Failed to download PDF for {item.short_id}. Skipping.")
+            metrics.SKIPS.inc(reason="download_failed")
+            item.error = "PDF download failed"
+            return None
+        item.pdf = pdf
+        item.pdf_sha256 = pdf.sha256()
+        if item.previous is not None and item.previous.pdf_sha256 == item.pdf_sha256:
+            print(f"  -> {item.short_id}: PDF identical to stored {item.previous.arxiv_id}. Keeping its affiliation and summary.")
+            metrics.SKIPS.inc(reason="unchanged_pdf")
+            pdf.cleanup()
+            item.pdf = None
+            item.unchanged = "pdf"
+        return item
 
-            # Check if paper already exists in DB
-            if crud.get_paper_by_arxiv_id(db, arxiv_id=short_id):
-                print(f"  -> Paper {short_id} already exists in the database. Skipping.")
-                continue
+    pdf_store = downloader.store
+    fingerprint = analysis_fingerprint(Config)
 
-            # Download the PDF to a temporary location
-            filepath, filename = downloader.download_single_paper(paper_from_arxiv, Config.TEMP_DOWNLOAD_DIR)
-            if not filepath:
-                print(f"  -> Failed to download PDF for {short_id}. Skipping.")
-                continue
+    def parse(item: PaperWorkItem) -> Optional[PaperWorkItem]:
+        if item.unchanged:
+            return item
+        try:
+            # Filter by affiliation from the PDF content, then extract the text for the LLM.
+            # A PDF from the local store may already have a stored analysis.
+            analysis = pdf_store.get_analysis(item.pdf_sha256, fingerprint) if pdf_store else None
+            if analysis is None:
+                analysis = parse_service.parse(item.pdf.source, item.pdf.filename)
+                if analysis is not None and pdf_store:
+                    pdf_store.put_analysis(item.pdf_sha256, fingerprint, analysis)
+        finally:
+            # Clean up the downloaded file (if it was spilled to disk) and drop the buffer.
+            item.pdf.cleanup()
+            item.pdf = None
+        if analysis is None or not analysis.match_reason:
+            if analysis is None:
+                print(f"  -> {item.short_id}: Could not parse the PDF. Skipping.")
+                metrics.SKIPS.inc(reason="parse_failed")
+                item.error = "PDF parsing failed"
+                return None
+            print(f"  -> {item.short_id}: No affiliation match found in PDF. Skipping.")
+            metrics.SKIPS.inc(reason="no_affiliation")
+            return None
+        item.match_reason = analysis.match_reason
+        item.affiliation_confidence = analysis.affiliation_confidence
+        item.extracted_text = analysis.llm_text
+        print(f"  -> {item.short_id}: Affiliation match found: {item.match_reason} "
+              f"(confidence {item.affiliation_confidence:.2f}, LLM input: ~{analysis.llm_tokens} tokens, {Config.LLM_TEXT_MODE} mode)")
+        if not item.extracted_text:
+            print(f"  -> {item.short_id}: Could not extract text. Skipping.")
+            metrics.SKIPS.inc(reason="no_text")
+            return None
+        item.text_sha256 = hashlib.sha256(item.extracted_text.encode("utf-8")).hexdigest()
+        if item.previous is not None and item.previous.text_sha256 == item.text_sha256:
+            print(f"  -> {item.short_id}: Extracted text identical to stored {item.previous.arxiv_id}. Keeping its summary.")
+            metrics.SKIPS.inc(reason="unchanged_text")
+            item.unchanged = "text"
+        return item
 
-            # Filter by affiliation from the PDF content
-            # This logic needs to be extracted from your old PdfProcessor
-            match_reason = pdf_processor.check_affiliation_single_pdf(filepath)
-            if not match_reason:
-                print(f"  -> No affiliation match found in PDF. Skipping.")
-                os.remove(filepath)  # Clean up the downloaded file
-                continue
-            
-            print(f"  -> Affiliation match found: {match_reason}")
-
-            # Use LLM to get summary and final confirmation
-            extracted_text = pdf_processor.extract_text(filepath)
-            if not extracted_text:
-                print("  -> Could not extract text. Skipping.")
-                os.remove(filepath)
-                continue
+    decision_log = AffiliationDecisionLog(Config.AFFILIATION_DECISION_LOG)
+    threshold = Config.AFFILIATION_CONFIDENCE_THRESHOLD
 
-            is_match, summary = summarizer.process_text(extracted_text)
-            
-            # Clean up the downloaded file immediately after use
-            os.remove(filepath)
+    def summarize(items: List[PaperWorkItem]) -> List[PaperWorkItem]:
+        # Use LLM to get summary and final confirmation, several papers per request.
+        # Confident matches (e.g. an email on a target domain) only need the summary.
+        confirmed = [item for item in items if item.unchanged]
+        to_summarize = [item for item in items if not item.unchanged]
+        if not to_summarize:
+            return confirmed
+        to_verify = [item for item in to_summarize if item.affiliation_confidence < threshold]
+        summary_only = [item for item in to_summarize if item.affiliation_confidence >= threshold]
+        results = {}
+        for group, prompt_kind in ((summary_only, SUMMARIZE), (to_verify, VERIFY_AND_SUMMARIZE)):
+            if group:
+                results.update(summarizer.process_batch(
+                    [(item.short_id, item.extracted_text) for item in group], prompt_kind=prompt_kind))
 
+        for item in to_summarize:
+            result = results.get(item.short_id)
+            decision = None if result is None else ("MATCH" if result[0] else "NO_MATCH")
+            decision_log.record(item.short_id, item.match_reason, item.affiliation_confidence, threshold,
+                                verified=item.affiliation_confidence < threshold, decision=decision)
+            if result is None:
+                print(f"  -> {item.short_id}: LLM call failed. Skipping.")
+                metrics.SKIPS.inc(reason="llm_failed")
+                item.error = "LLM call failed"
+                continue
+            is_match, summary = result
             if not is_match or not summary:
-                print(f"  -> LLM did not confirm match or summary failed. Skipping.")
+                print(f"  -> {item.short_id}: LLM did not confirm match or summary failed. Skipping.")
+                metrics.SKIPS.inc(reason="llm_rejected")
                 continue
+            print(f"  -> {item.short_id}: LLM confirmed match and generated summary.")
+            item.summary = summary
+            confirmed.append(item)
+        return confirmed
 
-            print(f"  -> LLM confirmed match and generated summary.")
-
-            # --- Step 4: Save to Database using CRUD operations ---
-            paper_data = schemas.PaperBase(
-                arxiv_id=short_id,
-                title=paper_from_arxiv.title,
-                abstract=paper_from_arxiv.summary,
-                publish_date=paper_from_arxiv.published.date(),
-                llm_summary=summary
+    def persist(items: List[PaperWorkItem]) -> List[PaperWorkItem]:
+        # --- Step 4: Save to Database, one transaction per batch ---
+        rows = []
+        version_updates = []
+        for item in items:
+            if item.unchanged:
+                # Same inputs as the stored version: only move the row to the new version.
+                fields = dict(base_id=item.base_id, arxiv_id=item.short_id, version=item.version,
+                              title=item.paper.title, abstract=item.paper.summary, pdf_sha256=item.pdf_sha256)
+                if item.text_sha256:
+                    fields["text_sha256"] = item.text_sha256
+                version_updates.append(fields)
+                continue
+            paper_data = schemas.PaperCreate(
+                arxiv_id=item.short_id,
+                base_id=item.base_id,
+                version=item.version,
+                title=item.paper.title,
+                abstract=item.paper.summary,
+                publish_date=item.paper.published.date(),
+                llm_summary=item.summary,
+                pdf_sha256=item.pdf_sha256,
+                text_sha256=item.text_sha256,
             )
-            
+
             # For now, let's use the match_reason as the institution name.
             # A more robust solution would parse the name properly.
+            match_reason = item.match_reason
             institution_names = [match_reason.split(':')[1].strip()] if ':' in match_reason else [match_reason]
+            rows.append((paper_data, institution_names))
 
-            crud.create_paper(db=db, paper=paper_data, institution_names=institution_names)
-            print(f"  -> Successfully saved paper {short_id} to the database!")
+        # Concurrent runs in this process (backfill shards) write one at a time.
+        with write_lock, metrics.DB_COMMIT_SECONDS.time():
+            crud.bulk_create_papers(db, rows)
+            crud.update_paper_versions(db, version_updates)
+        metrics.SAVES.inc(len(rows), kind="new")
+        metrics.SAVES.inc(len(version_updates), kind="version_only")
+        saved_dates.update(item.paper.published.date() for item in items)
+        for item in items:
+            if item.unchanged:
+                print(f"  -> Updated paper {item.base_id} to {item.short_id} without reprocessing.")
+            else:
+                print(f"  -> Successfully saved paper {item.short_id} to the database!")
+        return items
+
+    return [
+        Stage("download", download, Config.DOWNLOAD_WORKERS, Config.STAGE_QUEUE_SIZE),
+        Stage("parse", parse, parse_service.workers, Config.STAGE_QUEUE_SIZE),
+        Stage("llm", summarize, Config.LLM_WORKERS, Config.STAGE_QUEUE_SIZE,
+              batch_size=Config.LLM_BATCH_MAX_PAPERS, batch_wait=Config.LLM_BATCH_WAIT_SECONDS),
+        # The session is only ever used by this single writer thread from here on.
+        Stage("persist", persist, Config.PERSIST_WORKERS, Config.STAGE_QUEUE_SIZE,
+              batch_size=Config.PERSIST_BATCH_SIZE, batch_wait=Config.PERSIST_BATCH_WAIT_SECONDS),
+    ]
+
+
+def harvest_work_items(arxiv_client: ArxivClient, date_start_str: str, date_end_str: str, run_stats: RunStats,
+                       strict: bool = False, after: Optional[Tuple[datetime, str]] = None) -> Iterator[PaperWorkItem]:
+    """
+    Step 1: arXiv search and keyword filtering, page by page. Yields a work
+    item for every paper that is new (or a newer version of a stored paper) as
+    soon as its page arrives, so downloads and parsing overlap with fetching
+    the next page. Fills in run_stats.candidates and run_stats.newest_seen.
+    """
+    def track_newest(page):
+        for result in page:
+            position = ArxivClient.harvest_position(result)
+            if run_stats.newest_seen is None or position > run_stats.newest_seen:
+                run_stats.newest_seen = position
+
+    print("Step 1: Searching arXiv...")
+    pages = arxiv_client.iter_filtered_pages(
+        date_start_str=date_start_str,
+        date_end_str=date_end_str,
+        raise_on_error=strict,
+        after=after,
+        on_page=track_newest,
+    )
+    for page in pages:
+        run_stats.candidates += len(page)
+        metrics.CANDIDATES.inc(len(page))
+        if not page:
+            continue
+        # Look up the stored versions (one query per page) before any download starts.
+        # The persist stage owns its own session, so this lookup uses a short-lived one.
+        ids = {p.get_short_id(): split_arxiv_id(p.get_short_id()) for p in page}
+        lookup_db = SessionLocal()
+        try:
+            known = crud.get_known_versions(lookup_db, (base_id for base_id, _ in ids.values()))
+        finally:
+            lookup_db.close()
+        for paper_from_arxiv in page:
+            short_id = paper_from_arxiv.get_short_id()
+            base_id, version = ids[short_id]
+            previous = known.get(base_id)
+            if previous is not None and (previous.version or 0) >= version:
+                print(f"  -> Paper {short_id} already exists in the database. Skipping.")
+                metrics.SKIPS.inc(reason="already_stored")
+                continue
+            if previous is not None:
+                print(f"  -> Paper {base_id}: new version v{version} (stored: {previous.arxiv_id}).")
+            yield PaperWorkItem(paper=paper_from_arxiv, short_id=short_id, base_id=base_id,
+                                version=version, previous=previous)
+
+
+def run_work_items(work_items: Iterable[PaperWorkItem], run_stats: RunStats,
+                   downloader: Optional[BackgroundPdfDownloader] = None,
+                   download_dir: Optional[str] = None,
+                   on_item_done: Optional[Callable[[PaperWorkItem, str, Optional[str]], None]] = None,
+                   parse_workers: Optional[int] = None) -> RunStats:
+    """
+    Steps 2 & 3: downloads, parses, summarizes and saves papers through the
+    staged pipeline, and adds the downloads, LLM calls and saved papers to run_stats.
+    Papers that fail are recorded in run_stats.failed (and removed again when a retry succeeds).
+    Finally rebuilds the daily digests (digests.py) of the days it saved papers for.
 
+    Args:
+        work_items (iterable): The papers to process; may be a generator that is still harvesting.
+        run_stats (RunStats): The counts to update.
+        downloader (optional): A shared downloader (see process_date_range).
+        download_dir (str, optional): Where PDFs too large for memory are written.
+            Defaults to Config.TEMP_DOWNLOAD_DIR.
+        on_item_done (callable, optional): Told how each paper left the pipeline (see pipeline.Stage).
+        parse_workers (int, optional): Parse processes of this run (default: Config.PARSE_WORKERS).
+            Concurrent runs split the cores between them (see process_date_range).
+    """
+    config_instance = Config()
+    download_dir = download_dir or Config.TEMP_DOWNLOAD_DIR
+    # We need a temporary download directory for PDFs
+    os.makedirs(download_dir, exist_ok=True)
+
+    llm_cache = LLMResponseCache(config_instance) if Config.LLM_CACHE_ENABLED else None
+    summarizer = LLMSummarizer(config_instance, cache=llm_cache)
+
+    # Each run should get its own database session; only the persist stage uses it.
+    db: Session = SessionLocal()
+    saved_dates: Set[date] = set()
+    owns_downloader = downloader is None
+    downloader = downloader or BackgroundPdfDownloader(config_instance)
+
+    def track_item(item: PaperWorkItem, outcome: str, error: Optional[str]):
+        if outcome == "failed" or (outcome == "dropped" and item.error):
+            run_stats.failed[item.short_id] = ArxivClient.harvest_position(item.paper)
+        else:
+            run_stats.failed.pop(item.short_id, None)
+        if on_item_done is not None:
+            on_item_done(item, outcome, error)
+
+    try:
+        print("\nStep 2 & 3: Processing papers through the pipeline as they are found...")
+        # The parse stage has as many threads as the service has processes, so a
+        # document never waits in the pool's queue while its timeout runs.
+        with ParseService(config_instance, workers=parse_workers) as parse_service:
+            stages = _build_stages(db, downloader, parse_service, summarizer, download_dir, saved_dates)
+            stats = Pipeline(stages, on_item_done=track_item).run(work_items)
+        # --- Step 5: Rebuild the digests of the days that got new or updated papers ---
+        if saved_dates:
+            try:
+                changed = digests.refresh_digests(db, saved_dates)
+                print(f"Rebuilt {changed} of {len(saved_dates)} daily digests.")
+            except Exception as e:
+                # The papers are saved; `python digests.py <date>` rebuilds a digest later.
+                db.rollback()
+                print(f"  -> [Warning] Could not rebuild the daily digests: {e}")
     finally:
+        if owns_downloader:
+            downloader.close()
+        if llm_cache:
+            llm_cache.flush_access_times()
         # Always close the database session in the end
         db.close()
-        print(f"--- Background task for date: {date_str} finished ---")
\ No newline at end of file
+
+    Pipeline.print_report(stats)
+    if llm_cache:
+        print(llm_cache.stats_line())
+    print(summarizer.rate_controller.stats_line())
+    if summarizer.llm_calls:
+        print(f"LLM input: ~{summarizer.input_tokens} tokens in {summarizer.llm_calls} calls "
+              f"(~{summarizer.input_tokens // summarizer.llm_calls} per call)")
+    if downloader.store:
+        print(downloader.store.stats_line())
+
+    stage_stats = {s.name: s for s in stats}
+    run_stats.downloads += stage_stats["download"].passed
+    run_stats.llm_calls += summarizer.llm_calls
+    run_stats.saved += stage_stats["persist"].passed
+    return run_stats
+
+
+def prepare_database():
+    """
+    Makes sure the version columns and the full-text index triggers exist
+    before any paper is written.
+    """
+    schema_upgrades.upgrade_papers_table(engine)
+    search_index.ensure_fts_index(engine)
+
+
+def process_date_range(date_start_str: str, date_end_str: str,
+                       arxiv_client: Optional[ArxivClient] = None,
+                       downloader: Optional[BackgroundPdfDownloader] = None,
+                       strict: bool = False,
+                       after: Optional[Tuple[datetime, str]] = None,
+                       parse_workers: Optional[int] = None) -> RunStats:
+    """
+    Fetches, filters, processes, and saves the papers updated in a time range.
+
+    Args:
+        date_start_str (str): The start of the range in 'YYYYMMDDHHMMSS' format.
+        date_end_str (str): The end of the range in 'YYYYMMDDHHMMSS' format.
+        arxiv_client, downloader (optional): Shared components. Concurrent runs
+            (e.g. backfill shards) pass the same instances so that arXiv sees
+            one rate-limited client instead of one per run.
+        strict (bool): Raise if the arXiv query fails instead of treating it as "no papers".
+        after (tuple, optional): An (updated, arxiv_id) high-water mark; results at or
+            before it are skipped without any database lookup.
+        parse_workers (int, optional): Parse processes of this run. Every run has its own
+            pool, so concurrent runs pass a share of Config.PARSE_WORKERS.
+
+    Returns:
+        RunStats: The counts of candidates, downloads, LLM calls and saved papers.
+    """
+    run_stats = RunStats()
+    prepare_database()
+
+    # --- Instantiate your original components ---
+    # Note: We create a new Config object here. Since it's now static,
+    # it doesn't matter if it's created multiple times.
+    arxiv_client = arxiv_client or ArxivClient(Config())
+    work_items = harvest_work_items(arxiv_client, date_start_str, date_end_str, run_stats, strict=strict, after=after)
+    run_work_items(work_items, run_stats, downloader=downloader, parse_workers=parse_workers)
+    print(f"Found {run_stats.candidates} papers matching keywords on arXiv.")
+    return run_stats
+
+
+def process_and_save_papers(date_str: str) -> RunStats:
+    """
+    The main background task that orchestrates the entire workflow for one day.
+    It fetches, filters, processes, and saves papers to the database.
+
+    Args:
+        date_str (str): The target date in 'YYYYMMDD' format.
+    """
+    print(f"--- Starting background task for date: {date_str} ---")
+    try:
+        return process_date_range(f"{date_str}000000", f"{date_str}235959")
+    finally:
+        print(f"--- Background task for date: {date_str} finished ---")
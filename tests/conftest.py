@@ -0,0 +1,34 @@
+import os
+import sys
+import tempfile
+
+# Every test session gets its own SQLite database and no decision log. The
+# project's modules read these settings when config.py is first imported.
+_TEST_DIR = tempfile.mkdtemp(prefix="digest-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DIR, 'papers.db')}"
+os.environ["AFFILIATION_DECISION_LOG"] = ""
+os.environ["PDF_STORE_DIR"] = os.path.join(_TEST_DIR, "pdf_store")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def tables():
+    """Creates the schema of the test database (once per session)."""
+    import create_db  # noqa: F401
+
+
+@pytest.fixture
+def db(tables):
+    from database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
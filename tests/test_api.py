@@ -0,0 +1,32 @@
+from unittest import mock
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Table
+from sqlalchemy.exc import OperationalError
+
+import main
+import search_index
+
+
+@pytest.fixture(scope="module")
+def client(tables):
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.mark.parametrize("path", ["/api/jobs/999999", "/api/backfill/missing", "/api/digests/2001-01-01", "/metrics"])
+def test_read_endpoints_run_no_ddl(client, path):
+    with mock.patch.object(Table, "create") as create:
+        response = client.get(path)
+
+    assert response.status_code in (200, 404)
+    create.assert_not_called()
+
+
+def test_search_without_the_index_is_unavailable(client):
+    missing = OperationalError("SELECT ...", {}, Exception("no such table: papers_fts"))
+    with mock.patch.object(search_index, "search_papers", side_effect=missing):
+        response = client.get("/api/papers/search", params={"q": "scaling"})
+
+    assert response.status_code == 503
@@ -0,0 +1,135 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from unittest import mock
+
+import pytest
+
+from async_downloader import AsyncPdfDownloader, BackgroundPdfDownloader
+from benchmarks.fakes import PdfServer, make_results
+from config import Config
+
+DAY = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+class DownloadConfig(Config):
+    DOWNLOAD_RATE_PER_SECOND = 1000.0
+    DOWNLOAD_BURST = 100
+    PDF_STORE_ENABLED = False
+
+
+@pytest.fixture(scope="module")
+def server():
+    with PdfServer() as pdf_server:
+        yield pdf_server
+
+
+@pytest.fixture
+def config(server, tmp_path):
+    config = DownloadConfig()
+    config.ARXIV_PDF_BASE_URL = server.url
+    config.PDF_STORE_DIR = str(tmp_path / "store")
+    return config
+
+
+def test_fetch_keeps_a_small_pdf_in_memory(config, tmp_path):
+    paper = make_results(1, DAY)[0]
+
+    async def fetch():
+        downloader = AsyncPdfDownloader(config)
+        try:
+            return await downloader.fetch(paper, str(tmp_path))
+        finally:
+            await downloader.aclose()
+
+    pdf = asyncio.run(fetch())
+
+    assert pdf.path is None and pdf.data.startswith(b"%PDF")
+    assert not os.listdir(tmp_path)
+
+
+def test_fetch_spills_a_large_pdf_to_disk(config, tmp_path):
+    paper = make_results(1, DAY)[0]
+
+    async def fetch():
+        downloader = AsyncPdfDownloader(config)
+        try:
+            return await downloader.fetch(paper, str(tmp_path), max_memory_bytes=1024)
+        finally:
+            await downloader.aclose()
+
+    pdf = asyncio.run(fetch())
+
+    assert pdf.data is None and os.path.isfile(pdf.path)
+    with open(pdf.path, "rb") as f:
+        assert f.read(4) == b"%PDF"
+    pdf.cleanup()
+    assert not os.path.exists(pdf.path)
+
+
+def test_fetch_returns_none_on_an_http_error(config, server, tmp_path):
+    config.ARXIV_PDF_BASE_URL = server.url + "/missing"
+    paper = make_results(1, DAY)[0]
+
+    async def fetch():
+        downloader = AsyncPdfDownloader(config)
+        try:
+            return await downloader.fetch(paper, str(tmp_path))
+        finally:
+            await downloader.aclose()
+
+    assert asyncio.run(fetch()) is None
+
+
+def test_background_downloader_serves_threads_and_the_store(config, tables, tmp_path):
+    config.PDF_STORE_ENABLED = True
+    papers = make_results(6, DAY)
+    downloader = BackgroundPdfDownloader(config)
+    try:
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            downloaded = list(pool.map(lambda paper: downloader.fetch(paper, str(tmp_path)), papers))
+        again = downloader.fetch(papers[0], str(tmp_path))
+    finally:
+        downloader.close()
+
+    assert all(pdf is not None for pdf in downloaded)
+    assert len({pdf.sha256() for pdf in downloaded}) == len(papers)
+    assert again.keep and again.sha256() == downloaded[0].sha256()
+    assert downloader.store.hits == 1
+    again.cleanup()
+    assert os.path.isfile(again.path)
+
+
+def test_fetch_never_returns_a_moved_away_file(config, tables, tmp_path):
+    config.PDF_STORE_ENABLED = True
+    paper = make_results(1, DAY)[0]
+
+    def put_that_lost_the_file(arxiv_id, source, move=False, acquire=False):
+        os.remove(source)
+        return None
+
+    async def fetch():
+        downloader = AsyncPdfDownloader(config, store=mock.Mock(get=lambda *args: None, put=put_that_lost_the_file))
+        try:
+            return await downloader.fetch(paper, str(tmp_path), max_memory_bytes=0)
+        finally:
+            await downloader.aclose()
+
+    assert asyncio.run(fetch()) is None
+
+
+def test_fetch_batch_returns_one_pdf_per_paper_in_order(config, tmp_path):
+    papers = make_results(5, DAY)
+
+    async def fetch_batch():
+        downloader = AsyncPdfDownloader(config)
+        try:
+            return await downloader.fetch_batch(papers, str(tmp_path))
+        finally:
+            await downloader.aclose()
+
+    pdfs = asyncio.run(fetch_batch())
+
+    assert [pdf.filename for pdf in pdfs] == [f"{paper.get_short_id()}.pdf" for paper in papers]
+    assert all(pdf.data.startswith(b"%PDF") for pdf in pdfs)
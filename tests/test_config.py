@@ -0,0 +1,19 @@
+import pytest
+
+from config import _env_bool
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1", True), ("true", True), ("YES", True), (" True ", True),
+    ("0", False), ("false", False), ("no", False), ("", False),
+])
+def test_env_bool(monkeypatch, value, expected):
+    monkeypatch.setenv("DIGEST_TEST_FLAG", value)
+
+    assert _env_bool("DIGEST_TEST_FLAG", default=not expected) is expected
+
+
+def test_env_bool_default(monkeypatch):
+    monkeypatch.delenv("DIGEST_TEST_FLAG", raising=False)
+
+    assert _env_bool("DIGEST_TEST_FLAG", True) is True
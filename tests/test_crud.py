@@ -0,0 +1,22 @@
+from datetime import date
+
+import crud
+import models
+import schemas
+
+
+def _paper(version: int) -> schemas.PaperCreate:
+    return schemas.PaperCreate(
+        arxiv_id=f"2507.00001v{version}", base_id="2507.00001", version=version, title="A paper",
+        abstract="An abstract.", publish_date=date(2025, 7, 1), llm_summary=f"Summary of v{version}.",
+    )
+
+
+def test_upsert_replaces_the_institution_links(db):
+    crud.bulk_create_papers(db, [(_paper(1), ["MIT", "CMU"])])
+    crud.bulk_create_papers(db, [(_paper(2), ["Stanford", "MIT"])])
+
+    db.expire_all()
+    paper = db.query(models.Paper).filter(models.Paper.base_id == "2507.00001").one()
+    assert paper.arxiv_id == "2507.00001v2"
+    assert sorted(inst.name for inst in paper.institutions) == ["MIT", "Stanford"]
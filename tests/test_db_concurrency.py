@@ -0,0 +1,59 @@
+import json
+import subprocess
+import sys
+import threading
+from datetime import datetime
+
+from benchmarks import db_concurrency
+from conftest import PROJECT_ROOT
+
+
+def _repeat(write, times: int, errors: list):
+    for i in range(times):
+        try:
+            write(i)
+        except Exception as e:
+            errors.append(str(e).splitlines()[0])
+
+
+def test_writers_and_readers_never_hit_the_database_lock(db, tmp_path, capsys):
+    """
+    The check of benchmarks/db_concurrency.py at test size: a writer process
+    ingests papers while this process's writers (persist batches, the LLM
+    cache, the PDF store, job heartbeats and metrics snapshots) and API-style
+    readers run at the same time.
+    """
+    import jobs
+    import metrics
+    from config import Config
+    from llm_cache import LLMResponseCache
+    from pdf_store import PdfStore
+
+    config = Config()
+    config.PDF_STORE_DIR = str(tmp_path)
+    cache, store = LLMResponseCache(config), PdfStore(config)
+    job, _ = jobs.enqueue_job(db, "date", {}, dedup_key="date:concurrency")
+
+    writer = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.db_concurrency", "--ingest", "--papers", "600",
+         "--seed-papers", "100000", "--batch-size", "25"],
+        stdout=subprocess.PIPE, text=True, cwd=PROJECT_ROOT)
+    errors = []
+    threads = [threading.Thread(target=_repeat, args=(write, times, errors)) for write, times in (
+        (lambda i: errors.extend(db_concurrency.ingest(200000 + i * 20, 20, 10)), 15),
+        (lambda i: cache.put(f"concurrency text {i}", (True, "summary")), 150),
+        (lambda i: store.put(f"2506.{i:05d}v1", b"%PDF-" + str(i).encode() * 100), 60),
+        (lambda i: jobs._update_job(job.id, heartbeat_at=datetime.utcnow()), 150),
+        (lambda i: metrics.publish_snapshot("concurrency-test"), 150),
+    )]
+    for thread in threads:
+        thread.start()
+    done = threading.Event()
+    threading.Thread(target=lambda: (writer.wait(), [t.join() for t in threads], done.set()), daemon=True).start()
+    latencies, read_errors = db_concurrency.measure_reads(readers=4, until=done)
+
+    assert writer.returncode == 0
+    write_errors = json.loads(writer.stdout.read().strip().splitlines()[-1])["errors"]
+    assert not write_errors and not errors and not read_errors
+    assert latencies
+    assert "database is locked" not in capsys.readouterr().out
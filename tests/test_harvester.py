@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta
+
+import harvester
+from tasks import RunStats
+
+NOW = datetime(2025, 6, 2, 12, 0)
+
+
+def test_mark_moves_to_the_newest_paper_when_nothing_failed():
+    stats = RunStats(newest_seen=(NOW - timedelta(minutes=5), "2506.00009v1"))
+    assert harvester.next_mark(stats, NOW) == stats.newest_seen
+
+
+def test_mark_is_held_before_the_oldest_failed_paper():
+    failed_at = NOW - timedelta(hours=2)
+    stats = RunStats(newest_seen=(NOW - timedelta(minutes=5), "2506.00009v1"),
+                     failed={"2506.00003v1": (failed_at, "2506.00003v1"),
+                             "2506.00007v1": (NOW - timedelta(hours=1), "2506.00007v1")})
+    mark = harvester.next_mark(stats, NOW)
+    assert mark < (failed_at, "2506.00003v1")  # The next run's `after` filter keeps the failed paper
+    assert mark > (failed_at - timedelta(seconds=1), "9999.99999v9")
+
+
+def test_papers_failing_for_too_long_no_longer_hold_the_mark():
+    stats = RunStats(newest_seen=(NOW - timedelta(minutes=5), "2506.00009v1"),
+                     failed={"2506.00001v1": (NOW - timedelta(hours=harvester.Config.HARVEST_FAILED_RETRY_HOURS + 1),
+                                              "2506.00001v1")})
+    assert harvester.next_mark(stats, NOW) == stats.newest_seen
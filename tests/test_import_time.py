@@ -0,0 +1,11 @@
+from benchmarks import import_time
+
+
+def test_api_import_leaves_out_the_pipeline_stack():
+    # python -X importtime -c "import main" in a fresh interpreter.
+    _, modules = import_time.measure("main")
+
+    assert "main" in modules
+    for name in ("fitz", "arxiv", "google.genai"):
+        assert name not in modules
+    assert [name for name in import_time.FORBIDDEN_MODULES if name in modules] == []
@@ -0,0 +1,53 @@
+from unittest import mock
+
+import pytest
+
+import backfill
+import jobs
+import models
+
+
+def test_enqueue_job_returns_the_active_job(db):
+    first, created = jobs.enqueue_job(db, "date", {}, dedup_key="date:dedup")
+    second, created_again = jobs.enqueue_job(db, "date", {}, dedup_key="date:dedup")
+
+    assert created and not created_again
+    assert second.id == first.id
+
+
+def test_enqueue_job_race_returns_the_winner(db):
+    winner, _ = jobs.enqueue_job(db, "date", {}, dedup_key="date:race")
+    # The loser checked for an active job before the winner committed.
+    real_active_job = jobs._active_job
+    with mock.patch.object(jobs, "_active_job", side_effect=[None, real_active_job(db, "date:race")]):
+        job, created = jobs.enqueue_job(db, "date", {}, dedup_key="date:race")
+
+    assert not created
+    assert job.id == winner.id
+    assert db.query(models.Job).filter(models.Job.dedup_key == "date:race").count() == 1
+
+
+def test_finished_job_does_not_block_a_new_one(db):
+    job, _ = jobs.enqueue_job(db, "date", {}, dedup_key="date:finished")
+    job.status = "done"
+    db.commit()
+
+    new_job, created = jobs.enqueue_job(db, "date", {}, dedup_key="date:finished")
+
+    assert created and new_job.id != job.id
+
+
+def test_run_backfill_raises_when_a_shard_failed(tables):
+    workers = []
+
+    def run_shard(shard_id, shard_start, shard_end, arxiv_client, downloader, parse_workers):
+        workers.append(parse_workers)
+        status = "failed" if shard_start.startswith("20250102") else "done"
+        backfill._update_shard(shard_id, status=status)
+
+    with mock.patch.object(backfill, "_run_shard", run_shard), mock.patch.object(backfill.Config, "PARSE_WORKERS", 4):
+        with pytest.raises(RuntimeError, match="1 of 2 shards"):
+            backfill.run_backfill("20250101", "20250102", concurrency=2, backfill_id="test-failed-shard")
+
+    # The two concurrent shards share the parse processes.
+    assert workers == [2, 2]
@@ -0,0 +1,28 @@
+import models
+from config import Config
+from llm_cache import LLMResponseCache
+
+
+class OtherInstitutionsConfig(Config):
+    TARGET_INSTITUTIONS = Config.TARGET_INSTITUTIONS + ["Example University"]
+
+
+def test_key_depends_on_the_institution_list(tables):
+    text = "We train a model."
+
+    assert LLMResponseCache(Config()).make_key(text) != LLMResponseCache(OtherInstitutionsConfig()).make_key(text)
+
+
+def test_hits_write_their_access_time_in_batches(db):
+    cache = LLMResponseCache(Config())
+    cache.put("A cached paper.", (True, "A summary."))
+    key = cache.make_key("A cached paper.")
+    stored_at = db.get(models.LLMCacheEntry, key).last_accessed_at
+
+    assert cache.get("A cached paper.") == (True, "A summary.")
+    db.expire_all()
+    assert db.get(models.LLMCacheEntry, key).last_accessed_at == stored_at
+
+    cache.flush_access_times()
+    db.expire_all()
+    assert db.get(models.LLMCacheEntry, key).last_accessed_at > stored_at
@@ -0,0 +1,51 @@
+import json
+import re
+
+from benchmarks.fakes import FakeGenaiClient, _FakeResponse
+from config import Config
+from llm_summarizer import LLMSummarizer
+from rate_limit import LLMRateController
+
+PAPERS = [(f"2506.0000{i}v1", f"Paper {i}. We train a large language model at Stanford University.") for i in range(3)]
+
+
+class FastConfig(Config):
+    LLM_RPM_LIMIT = 0
+    LLM_TPM_LIMIT = 0
+    LLM_BACKOFF_BASE_SECONDS = 0.01
+    LLM_BACKOFF_MAX_SECONDS = 0.02
+
+
+class _DroppingModels:
+    """Answers batches without the last paper's entry; single-paper calls normally."""
+    def __init__(self):
+        self.batch_calls = 0
+        self.single_calls = 0
+
+    def generate_content(self, model, contents, config=None):
+        if config:
+            self.batch_calls += 1
+            ids = re.findall(r"--- Paper (\S+) ---", contents)[:-1]
+            return _FakeResponse(json.dumps([{"arxiv_id": i, "decision": "MATCH", "summary": "S."} for i in ids]), contents)
+        self.single_calls += 1
+        return _FakeResponse("MATCH\nSingle summary.", contents)
+
+
+def _summarizer(client) -> LLMSummarizer:
+    return LLMSummarizer(FastConfig(), llm_client=client, rate_controller=LLMRateController(FastConfig()))
+
+
+def test_a_failed_batch_call_is_not_retried_paper_by_paper():
+    client = FakeGenaiClient(latency=0, throttle_rate=1.0, retry_delay=0.01)
+    results = _summarizer(client).process_batch(PAPERS, max_retries=2)
+    assert results == {}
+    assert client.calls == 2  # The batch's own attempts, no single-paper calls
+
+
+def test_papers_missing_from_a_successful_batch_fall_back_to_single_calls():
+    client = FakeGenaiClient(latency=0)
+    client.models = models = _DroppingModels()
+    results = _summarizer(client).process_batch(PAPERS, max_retries=2)
+    assert set(results) == {arxiv_id for arxiv_id, _ in PAPERS}
+    assert results[PAPERS[-1][0]] == (True, "Single summary.")
+    assert (models.batch_calls, models.single_calls) == (1, 1)
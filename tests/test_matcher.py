@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from config import Config
+from matcher import ConfigMatchers, MultiPatternMatcher, get_matchers
+
+
+# The substring checks the matchers replaced.
+def _baseline_contains_any(patterns, text):
+    return any(pattern.lower() in text.lower() for pattern in patterns)
+
+
+def _baseline_matched_names(patterns, text):
+    return [pattern for pattern in patterns if pattern.lower() in text.lower()]
+
+
+def _baseline_institution_for_domain(institutions, domain):
+    return next((inst for inst in institutions if inst.lower() in domain or domain in inst.lower()), None)
+
+
+TEXTS = [
+    "Google DeepMind, London",
+    "Work done while at Google.",
+    "GOOGLE DEEPMIND",
+    "Deepmind and google deepmind",
+    "Carnegie Mellon University; CMU Robotics Institute",
+    "University of California, Berkeley and UC Berkeley",
+    "uiuc.edu / University of Illinois Urbana-Champaign",
+    "Stanford",
+    "Stanfor",
+    "NVIDIA Research and nvidia",
+    "Allen Institute for AI (AI2)",
+    "A large language model is a generative AI foundation model",
+    "pretrained LANGUAGE MODELS and Transformers",
+    "",
+    "No institution here at all.",
+]
+
+
+def _random_texts(count: int = 200):
+    rng = random.Random(0)
+    vocabulary = Config.TARGET_INSTITUTIONS + Config.KEYWORDS + ["of", "and", "the", "Lab", "Inc", "deep", "mind"]
+    texts = []
+    for _ in range(count):
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(1, 8))]
+        text = " ".join(word.upper() if rng.random() < 0.2 else word for word in words)
+        texts.append(text.replace(" ", "") if rng.random() < 0.1 else text)
+    return texts
+
+
+@pytest.mark.parametrize("patterns", [Config.KEYWORDS, Config.TARGET_INSTITUTIONS, Config.TARGET_DOMAINS])
+def test_matches_agree_with_substring_checks(patterns):
+    matcher = MultiPatternMatcher(patterns)
+    for text in TEXTS + _random_texts():
+        assert matcher.contains_any(text) == _baseline_contains_any(patterns, text), text
+        assert matcher.matched_names(text) == _baseline_matched_names(patterns, text), text
+
+
+def test_overlapping_names_are_all_reported_in_priority_order():
+    matcher = MultiPatternMatcher(Config.TARGET_INSTITUTIONS)
+
+    assert matcher.matched_names("google deepmind") == ["Google Deepmind", "Deepmind", "Google"]
+    assert matcher.matched_names("Google Brain") == ["Google"]
+
+
+def test_matching_is_case_insensitive_and_keeps_the_config_spelling():
+    matcher = MultiPatternMatcher(["Google Deepmind", "UC Berkeley"])
+
+    assert matcher.matched_names("GOOGLE DEEPMIND and uc berkeley") == ["Google Deepmind", "UC Berkeley"]
+    assert [(m.canonical, m.start, m.end) for m in matcher.find_all("at GOOGLE DEEPMIND")] == [
+        ("Google Deepmind", 3, 18)]
+
+
+def test_priority_follows_the_pattern_order_not_the_text_order():
+    matcher = MultiPatternMatcher(["Stanford", "OpenAI"])
+
+    assert matcher.matched_names("OpenAI and Stanford") == ["Stanford", "OpenAI"]
+    assert MultiPatternMatcher(["OpenAI", "Stanford"]).matched_names("OpenAI and Stanford") == ["OpenAI", "Stanford"]
+
+
+@pytest.mark.parametrize("domain", Config.TARGET_DOMAINS + ["stanford.edu", "cs.stanford.edu", "deepmind.com",
+                                                              "ai2", "nowhere.edu", "nvidia"])
+def test_institution_for_domain_agrees_with_substring_checks(domain):
+    matchers = get_matchers(Config)
+
+    assert matchers.institution_for_domain(domain) == _baseline_institution_for_domain(Config.TARGET_INSTITUTIONS, domain)
+
+
+def test_institution_for_domain_prefers_the_first_institution():
+    matchers = ConfigMatchers((), ("Deepmind", "Google Deepmind", "Google"), ())
+
+    assert matchers.institution_for_domain("google.com") == "Google"
+    assert matchers.institution_for_domain("deepmind.google.com") == "Deepmind"
+    # A domain contained in an institution name also counts.
+    assert matchers.institution_for_domain("google deepmind") == "Deepmind"
@@ -0,0 +1,172 @@
+from concurrent.futures import Future
+from unittest import mock
+
+import fitz
+import pytest
+
+from benchmarks.fakes import make_pdf
+from config import Config
+from pdf_processor import ParseService, PdfProcessor
+
+
+class _FakePool:
+    """Answers submits with prepared futures: a cancelled one, then results."""
+    def __init__(self, cancelled: int):
+        self.cancelled = cancelled
+        self.submits = 0
+
+    def submit(self, fn, *args):
+        self.submits += 1
+        future = Future()
+        if self.submits <= self.cancelled:
+            future.cancel()
+        else:
+            future.set_result(f"analysis of {args[1]}")
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_parse_retries_a_task_cancelled_by_a_pool_restart():
+    pool = _FakePool(cancelled=1)
+    with mock.patch.object(ParseService, "_new_pool", lambda self: pool):
+        service = ParseService(Config(), workers=1)
+        assert service.parse(b"%PDF", "paper.pdf") == "analysis of paper.pdf"
+
+    assert pool.submits == 2
+    assert service.restarts == 1
+
+
+def test_parse_gives_up_after_the_retry():
+    pool = _FakePool(cancelled=2)
+    with mock.patch.object(ParseService, "_new_pool", lambda self: pool):
+        service = ParseService(Config(), workers=1)
+        assert service.parse(b"%PDF", "paper.pdf") is None
+
+    assert pool.submits == 2
+
+
+WORDS = "We study how large language models scale with data and compute budgets. "
+
+
+class SectionsConfig(Config):
+    LLM_TEXT_MODE = "sections"
+    LLM_INPUT_TOKEN_BUDGET = 200  # 800 characters
+
+
+def _block(y0: float, text: str) -> tuple:
+    return (60.0, y0, 540.0, y0 + 20.0, text, 0, 0)
+
+
+def _select(blocks, header_limit_y: float = 300.0, config=SectionsConfig):
+    return PdfProcessor(config())._select_sections([blocks], header_limit_y)
+
+
+def _paper(header_blocks=1, abstract_sentences=4, intro_sentences=4):
+    blocks = [_block(40, "Scaling Laws for Everything")]
+    blocks += [_block(60 + 10 * i, f"Author {i}, Department of Physics, Example University {i}")
+               for i in range(header_blocks)]
+    blocks += [_block(400, "Abstract"), _block(420, WORDS * abstract_sentences),
+               _block(500, "1 Introduction"), _block(520, "In this paper we propose a method. " + WORDS * intro_sentences),
+               _block(600, "References"), _block(620, "[1] A. Author. A referenced paper on scaling. 2020.")]
+    return blocks
+
+
+def test_budget_is_honoured():
+    text = _select(_paper(abstract_sentences=40, intro_sentences=40))
+
+    assert len(text) <= SectionsConfig.LLM_INPUT_TOKEN_BUDGET * 4
+    assert text.endswith(" ...")  # The abstract was cut to fit.
+
+
+def test_header_is_capped_at_half_the_budget():
+    text = _select(_paper(header_blocks=40))
+    header = [part for part in text.split("\n\n") if part.startswith(("Author", "Scaling Laws"))]
+
+    assert header
+    assert sum(len(part) + 2 for part in header) <= SectionsConfig.LLM_INPUT_TOKEN_BUDGET * 4 // 2
+    assert WORDS.strip()[:30] in text  # The abstract still fits.
+
+
+def test_references_are_left_out():
+    class LargeBudgetConfig(SectionsConfig):
+        LLM_INPUT_TOKEN_BUDGET = 10000
+
+    text = _select(_paper(), config=LargeBudgetConfig)
+
+    assert "In this paper we propose a method." in text
+    assert "referenced paper" not in text and "References" not in text
+
+
+def test_no_abstract_heading_gives_none():
+    blocks = [block for block in _paper() if block[4] != "Abstract"]
+
+    assert _select(blocks) is None
+
+
+def _page(*lines) -> bytes:
+    """A one-page PDF with each (y, text) line in its own text block."""
+    doc = fitz.open()
+    page = doc.new_page()  # 612 x 792: the header region ends at 316.8, a quarter of the page at 198
+    for y, text in lines:
+        page.insert_textbox(fitz.Rect(60, y, 540, y + 30), text, fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+TITLE = (60, "Scaling Laws for Sparse Mixtures of Experts")
+BODY_Y = 500  # Below the header region
+
+
+@pytest.mark.parametrize("lines, confidence", [
+    # An email on a target domain that maps to a target institution.
+    ([TITLE, (BODY_Y, "alice@stanford.edu")], 0.9),
+    # An email on a target domain without a known institution.
+    ([TITLE, (BODY_Y, "alice@mit.edu")], 0.8),
+    # An affiliation line in the header.
+    ([TITLE, (120, "Stanford University, Department of Computer Science")], 0.7),
+    # Another header block.
+    ([TITLE, (120, "Alice Smith and Bob Jones (OpenAI)")], 0.5),
+    # The first block only (the title).
+    ([(60, "Evaluating Google Search with Language Models")], 0.3),
+    # Each header tier loses 0.1 below a quarter of the page.
+    ([TITLE, (220, "Stanford University, Department of Computer Science")], 0.6),
+    ([TITLE, (220, "Alice Smith and Bob Jones (OpenAI)")], 0.4),
+    # An email and a header block agreeing on the institution.
+    ([TITLE, (120, "Alice Smith and Bob Jones (OpenAI)"), (BODY_Y, "alice@openai.com")], 1.0),
+    # ... and disagreeing.
+    ([TITLE, (120, "Alice Smith and Bob Jones (OpenAI)"), (BODY_Y, "alice@stanford.edu")], 0.9),
+    ([TITLE, (BODY_Y, "alice@nowhere.edu")], 0.0),
+])
+def test_affiliation_confidence_tiers(lines, confidence):
+    analysis = PdfProcessor(Config()).analyze(_page(*lines))
+
+    assert analysis.affiliation_confidence == confidence
+
+
+@pytest.mark.parametrize("short_id, email_hits, confidence", [
+    ("2401.00000", ["Google"], 1.0),   # Affiliation line plus an email on its domain
+    ("2401.00001", [], 0.7),           # Affiliation line only
+    ("2401.00002", [], 0.0),           # No target institution
+])
+def test_affiliation_confidence_of_generated_papers(short_id, email_hits, confidence):
+    analysis = PdfProcessor(Config()).analyze(make_pdf(short_id, seed=0))
+
+    assert analysis.email_hits == email_hits
+    assert analysis.affiliation_confidence == confidence
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_analyze_agrees_with_the_separate_checks(tmp_path, seed):
+    processor = PdfProcessor(Config())  # "pages" mode
+    assert processor.config.LLM_TEXT_MODE == "pages"
+    for n in range(20):
+        pdf_path = tmp_path / f"{seed}-{n}.pdf"
+        pdf_path.write_bytes(make_pdf(f"2401.{n:05d}", match_ratio=0.7, seed=seed))
+
+        analysis = processor.analyze(str(pdf_path))
+
+        assert analysis.match_reason == processor.check_affiliation_single_pdf(str(pdf_path))
+        assert analysis.llm_text == processor.extract_text(str(pdf_path))
@@ -0,0 +1,83 @@
+import os
+from unittest import mock
+
+import pytest
+
+import models
+import pdf_store
+from config import Config
+
+
+class StoreConfig(Config):
+    PDF_STORE_MAX_BYTES = 10 ** 9
+
+
+@pytest.fixture
+def store(tables, tmp_path):
+    from database import SessionLocal
+
+    db = SessionLocal()
+    db.query(models.PdfStoreEntry).delete()
+    db.commit()
+    db.close()
+    config = StoreConfig()
+    config.PDF_STORE_DIR = str(tmp_path)
+    return pdf_store.PdfStore(config)
+
+
+def _pdf(n: int, size: int = 1000) -> bytes:
+    return b"%PDF-" + bytes([n]) * size
+
+
+def test_get_batches_the_access_time_writes(store, db):
+    store.put("2506.00001v1", _pdf(1))
+    stored_at = db.get(models.PdfStoreEntry, "2506.00001v1").last_accessed_at
+
+    assert store.get("2506.00001v1") is not None
+    db.expire_all()
+    assert db.get(models.PdfStoreEntry, "2506.00001v1").last_accessed_at == stored_at
+
+    store.flush_access_times()
+    db.expire_all()
+    assert db.get(models.PdfStoreEntry, "2506.00001v1").last_accessed_at > stored_at
+
+
+def test_put_keeps_a_running_total(store):
+    with mock.patch.object(store, "total_bytes", wraps=store.total_bytes) as total_bytes:
+        for n in range(5):
+            store.put(f"2506.0000{n}v1", _pdf(n))
+        store.put("2506.00000v2", _pdf(0))  # Same file as v1
+
+    assert total_bytes.call_count == 1
+    assert store._total == store.total_bytes() == 5 * len(_pdf(0))
+
+
+def test_evict_skips_files_in_use(store):
+    in_use_path, in_use_sha = store.put("2506.00001v1", _pdf(1), acquire=True)
+    free_path, _ = store.put("2506.00002v1", _pdf(2))
+
+    assert store.evict(max_bytes=0) == 1
+    assert os.path.isfile(in_use_path)
+    assert not os.path.isfile(free_path)
+
+    store.release(in_use_sha)
+    assert store.evict(max_bytes=0) == 1
+    assert not os.path.isfile(in_use_path)
+
+
+def test_put_pins_the_file_before_an_eviction_can_remove_it(store, tmp_path):
+    source = tmp_path / "download.pdf"
+    source.write_bytes(_pdf(3))
+    real_replace = os.replace
+
+    def replace_then_evict(src, dst):
+        real_replace(src, dst)
+        store.evict(max_bytes=0)  # Another thread evicts right after the file lands.
+
+    with mock.patch.object(pdf_store.os, "replace", replace_then_evict), \
+            mock.patch.object(store, "_acquire", return_value=False):
+        stored = store.put("2506.00003v1", str(source), move=True, acquire=True)
+
+    assert stored is not None and os.path.isfile(stored[0])
+    assert not source.exists()
+    assert store._in_use[stored[1]] == 1
@@ -0,0 +1,36 @@
+import json
+
+import httpx
+from google.genai import errors
+
+from rate_limit import THROTTLED, TRANSIENT, FATAL, classify_error
+
+_RETRY_BODY = {"error": {
+    "code": 429, "status": "RESOURCE_EXHAUSTED", "message": "Quota exceeded.",
+    "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "27s"}],
+}}
+
+
+def _http_error(status: int, body: dict, headers: dict = None) -> errors.APIError:
+    """An APIError the way google-genai raises it: with the httpx.Response attached."""
+    request = httpx.Request("POST", "https://generativelanguage.googleapis.com/v1beta/models/m:generateContent")
+    response = httpx.Response(status, headers=headers or {}, content=json.dumps(body).encode(), request=request)
+    return errors.ClientError(status, response.json(), response)
+
+
+def test_retry_delay_is_read_from_details_when_the_response_has_no_retry_after_header():
+    assert classify_error(_http_error(429, _RETRY_BODY)) == (THROTTLED, 27.0)
+
+
+def test_retry_after_header_wins_over_details():
+    assert classify_error(_http_error(429, _RETRY_BODY, {"Retry-After": "5"})) == (THROTTLED, 5.0)
+
+
+def test_retry_after_http_date_falls_back_to_details():
+    error = _http_error(429, _RETRY_BODY, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+    assert classify_error(error) == (THROTTLED, 27.0)
+
+
+def test_server_errors_are_transient_and_bad_requests_fatal():
+    assert classify_error(errors.ServerError(503, {"error": {"code": 503, "status": "UNAVAILABLE"}})) == (TRANSIENT, None)
+    assert classify_error(errors.ClientError(400, {"error": {"code": 400, "status": "INVALID_ARGUMENT"}}))[0] == FATAL
@@ -0,0 +1,78 @@
+from datetime import datetime
+from unittest import mock
+
+import pytest
+
+import metrics
+import tasks
+from llm_summarizer import SUMMARIZE, VERIFY_AND_SUMMARIZE
+
+
+class _RecordingSummarizer:
+    """Confirms every paper and records which prompt each one was sent with."""
+    def __init__(self):
+        self.prompt_kinds = {}
+
+    def process_batch(self, papers, prompt_kind):
+        results = {}
+        for arxiv_id, _ in papers:
+            self.prompt_kinds[arxiv_id] = prompt_kind
+            results[arxiv_id] = (True, f"summary of {arxiv_id}")
+        return results
+
+
+def _stage(name: str, summarizer=None, db=None, threshold: float = 0.8):
+    with mock.patch.object(tasks.Config, "AFFILIATION_CONFIDENCE_THRESHOLD", threshold):
+        stages = tasks._build_stages(db, mock.Mock(store=None), mock.Mock(workers=1), summarizer, "/tmp", set())
+    return next(stage for stage in stages if stage.name == name).handler
+
+
+def _item(short_id: str, confidence: float) -> tasks.PaperWorkItem:
+    paper = mock.Mock(title="A paper", summary="An abstract.", published=datetime(2025, 1, 1))
+    return tasks.PaperWorkItem(paper=paper, short_id=short_id, base_id=short_id[:-2], version=1,
+                               match_reason="Header Match: Stanford", affiliation_confidence=confidence,
+                               extracted_text=f"text of {short_id}")
+
+
+@pytest.mark.parametrize("confidence, prompt_kind", [
+    (0.7, VERIFY_AND_SUMMARIZE),
+    (0.8, SUMMARIZE),     # Exactly at the threshold: confident enough
+    (0.9, SUMMARIZE),
+])
+def test_summarize_skips_the_affiliation_check_at_the_threshold(confidence, prompt_kind):
+    summarizer = _RecordingSummarizer()
+    summarize = _stage("llm", summarizer, threshold=0.8)
+
+    confirmed = summarize([_item("2501.00001v1", confidence)])
+
+    assert summarizer.prompt_kinds == {"2501.00001v1": prompt_kind}
+    assert [item.summary for item in confirmed] == ["summary of 2501.00001v1"]
+
+
+def test_summarize_splits_a_batch_by_confidence():
+    summarizer = _RecordingSummarizer()
+    summarize = _stage("llm", summarizer, threshold=0.8)
+
+    items = [_item("2501.00001v1", 0.5), _item("2501.00002v1", 1.0), _item("2501.00003v1", 0.79)]
+    confirmed = summarize(items)
+
+    assert summarizer.prompt_kinds == {"2501.00001v1": VERIFY_AND_SUMMARIZE, "2501.00002v1": SUMMARIZE,
+                                       "2501.00003v1": VERIFY_AND_SUMMARIZE}
+    assert len(confirmed) == 3
+
+
+def test_persist_counts_new_papers_and_version_updates_separately(db):
+    persist = _stage("persist", db=db)
+    before = metrics.SAVES.samples()
+    new = _item("2501.00011v1", 0.9)
+    new.summary = "A summary."
+    unchanged = _item("2501.00012v2", 0.9)
+    unchanged.unchanged = "pdf"
+    identical = _item("2501.00013v3", 0.9)
+    identical.unchanged = "text"
+
+    assert persist([new, unchanged, identical]) == [new, unchanged, identical]
+
+    after = metrics.SAVES.samples()
+    assert after[("new",)] - before.get(("new",), 0) == 1
+    assert after[("version_only",)] - before.get(("version_only",), 0) == 2